@@ -1,21 +1,45 @@
 from django.contrib import admin
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
 from django.urls import reverse
 
-from auddy_backend.extraction.models import Extraction
+from auddy_backend.extraction.models import Extraction, ExtractionBatch, TaskProfile
+
+
+class TaskProfileInline(admin.TabularInline):
+    model = TaskProfile
+    fields = ('profile_link', 'trigger', 'state', 'retries', 'wall_time', 'cpu_time', 'subprocess_time')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    show_change_link = False
+
+    def profile_link(self, obj):
+        url = reverse('admin:extraction_taskprofile_change', args=[obj.id])
+        return format_html('<a href="{}">{}</a>', url, obj.created)
+
+    profile_link.short_description = 'Profile'
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 class ExtractionAdmin(admin.ModelAdmin):
     list_display = ('id', 'title_display', 'source_url', 'audio_format', 'status', 'created', 'completed_at', 'user')
     list_filter = ('status', 'audio_format', 'created')
-    search_fields = ('title', 'source_url', 'id')
-    readonly_fields = ('id', 'created', 'completed_at', 'file_size', 'duration', 'task_id')
+    search_fields = ('title', 'source_url', 'source_key', 'id')
+    raw_id_fields = ('batch',)
+    readonly_fields = (
+        'id', 'created', 'completed_at', 'last_accessed_at', 'file_size', 'duration', 'task_id', 'source_key', 'attempts',
+        'profile',
+    )
     fieldsets = (
-        (None, {'fields': ('id', 'user', 'source_url', 'title', 'audio_format')}),
+        (None, {'fields': ('id', 'user', 'batch', 'source_url', 'title', 'audio_format', 'clip_start', 'clip_end')}),
         ('Status', {'fields': ('status', 'error_message', 'task_id')}),
         ('File Information', {'fields': ('file_path', 'file_size', 'duration')}),
-        ('Timestamps', {'fields': ('created', 'completed_at')}),
+        ('Timestamps', {'fields': ('created', 'completed_at', 'last_accessed_at')}),
+        ('Execution', {'fields': ('source_key', 'attempts', 'profile', 'profile_requested')}),
     )
+    inlines = (TaskProfileInline,)
     
     def title_display(self, obj):
         if obj.status == Extraction.Status.COMPLETED and obj.file_path:
@@ -27,4 +51,45 @@ class ExtractionAdmin(admin.ModelAdmin):
     title_display.admin_order_field = 'title'
 
 
-admin.site.register(Extraction, ExtractionAdmin) 
\ No newline at end of file
+admin.site.register(Extraction, ExtractionAdmin)
+
+
+class ExtractionBatchAdmin(admin.ModelAdmin):
+    list_display = ('public_id', 'title', 'source_url', 'max_concurrency', 'user', 'created', 'expanded_at')
+    search_fields = ('public_id', 'title', 'source_url')
+    readonly_fields = ('public_id', 'created', 'expanded_at')
+
+
+admin.site.register(ExtractionBatch, ExtractionBatchAdmin)
+
+
+class TaskProfileAdmin(admin.ModelAdmin):
+    list_display = ('extraction', 'trigger', 'state', 'wall_time', 'cpu_time', 'subprocess_time', 'created')
+    list_filter = ('trigger', 'state', 'created')
+    search_fields = ('extraction__id', 'extraction__source_key', 'task_id')
+    raw_id_fields = ('extraction',)
+    readonly_fields = (
+        'extraction', 'task_id', 'retries', 'state', 'trigger', 'created', 'wall_time', 'cpu_time',
+        'subprocess_time', 'subprocess_cpu_time', 'subprocesses', 'sample_count', 'sample_interval',
+        'hot_functions_display', 'stacks',
+    )
+    fieldsets = (
+        (None, {'fields': ('extraction', 'task_id', 'retries', 'state', 'trigger', 'created')}),
+        ('Time', {'fields': ('wall_time', 'cpu_time', 'subprocess_time', 'subprocess_cpu_time', 'subprocesses')}),
+        ('Samples', {'fields': ('sample_count', 'sample_interval', 'hot_functions_display', 'stacks')}),
+    )
+
+    def hot_functions_display(self, obj):
+        total = obj.sample_count or 1
+        rows = format_html_join(
+            '\n', '{}  {}', ((f"{samples / total:6.1%}", function) for function, samples in obj.hot_functions())
+        )
+        return format_html('<pre>{}</pre>', rows)
+
+    hot_functions_display.short_description = 'Hot functions'
+
+    def has_add_permission(self, request):
+        return False
+
+
+admin.site.register(TaskProfile, TaskProfileAdmin)
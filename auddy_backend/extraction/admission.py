@@ -0,0 +1,115 @@
+import math
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from auddy_backend.extraction.models import Extraction
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_CACHE_KEY = 'extraction:admission:snapshot'
+ANONYMOUS_LANE = 'anonymous'
+ACTIVE_STATUSES = [Extraction.Status.PENDING, Extraction.Status.PROCESSING]
+
+
+class AdmissionRejected(Exception):
+    """A new extraction was refused because the backlog is too large."""
+
+    def __init__(self, message, status_code, retry_after):
+        super().__init__(message)
+        self.status_code = status_code
+        # Whole seconds, as sent in the Retry-After header; None when retrying can't help
+        self.retry_after = max(1, math.ceil(retry_after)) if retry_after is not None else None
+
+
+def get_backlog_snapshot():
+    """
+    Return ``(depth, throughput)``: dispatched queued or running extractions and completions per second.
+
+    Throughput is measured over ``EXTRACTION_ADMISSION_THROUGHPUT_WINDOW`` and
+    never reported below ``EXTRACTION_ADMISSION_MIN_THROUGHPUT`` per minute,
+    so an idle or freshly started cluster still admits work. The snapshot is
+    cached for ``EXTRACTION_ADMISSION_SNAPSHOT_TTL`` seconds to keep the two
+    counts off the hot path.
+    """
+    snapshot = cache.get(SNAPSHOT_CACHE_KEY)
+    if snapshot is None:
+        window = settings.EXTRACTION_ADMISSION_THROUGHPUT_WINDOW
+        # Playlist entries waiting for a slot in their batch aren't dispatched, so they don't count
+        depth = (
+            Extraction.objects.filter(status__in=ACTIVE_STATUSES)
+            .exclude(status=Extraction.Status.PENDING, task_id='')
+            .count()
+        )
+        finished = Extraction.objects.filter(completed_at__gte=timezone.now() - timedelta(seconds=window)).count()
+        throughput = max(finished / window, settings.EXTRACTION_ADMISSION_MIN_THROUGHPUT / 60)
+        snapshot = (depth, throughput)
+        cache.set(SNAPSHOT_CACHE_KEY, snapshot, settings.EXTRACTION_ADMISSION_SNAPSHOT_TTL)
+    return snapshot
+
+
+def get_lane(user):
+    """Return the admission lane of ``user``: their plan, or the anonymous lane."""
+    if user is None or not user.is_authenticated:
+        return ANONYMOUS_LANE
+    return getattr(user, 'plan', None) or ANONYMOUS_LANE
+
+
+def check_admission(user=None, count=1):
+    """
+    Raise :class:`AdmissionRejected` unless ``count`` new extractions may be queued for ``user``.
+
+    Each lane may only join a backlog that drains within its limit in
+    ``EXTRACTION_ADMISSION_LANES``, so anonymous and free traffic is turned
+    away first as the queue grows while paid plans are still admitted. The
+    limit applies to the backlog already queued, not to the request itself,
+    so a large batch is admitted whenever the cluster is quiet. Past
+    ``EXTRACTION_ADMISSION_MAX_DEPTH`` nobody is admitted. Both answer 503.
+    A user already holding ``EXTRACTION_ADMISSION_MAX_PER_USER`` queued or
+    running extractions gets 429. ``retry_after`` estimates when the request
+    would pass from the measured throughput. A request larger than either
+    limit could never pass, so it gets 413 and no ``retry_after``.
+    """
+    if not settings.EXTRACTION_ADMISSION_ENABLED:
+        return
+
+    authenticated = user is not None and user.is_authenticated
+    limit = settings.EXTRACTION_ADMISSION_MAX_DEPTH
+    if authenticated:
+        limit = min(limit, settings.EXTRACTION_ADMISSION_MAX_PER_USER)
+    if count > limit:
+        raise AdmissionRejected(f"At most {limit} extractions can be requested at once.", 413, None)
+
+    depth, throughput = get_backlog_snapshot()
+    lane = get_lane(user)
+
+    if depth + count > settings.EXTRACTION_ADMISSION_MAX_DEPTH:
+        logger.warning(f"Admission: rejecting {count} extractions, backlog of {depth} at capacity")
+        raise AdmissionRejected(
+            "Extraction service is at capacity, please retry later.",
+            503,
+            (depth + count - settings.EXTRACTION_ADMISSION_MAX_DEPTH) / throughput,
+        )
+
+    drain_time = depth / throughput
+    max_drain = settings.EXTRACTION_ADMISSION_LANES.get(lane, settings.EXTRACTION_ADMISSION_LANES[ANONYMOUS_LANE])
+    if drain_time > max_drain:
+        logger.warning(f"Admission: rejecting {count} {lane} extractions, backlog drains in {drain_time:.0f}s")
+        raise AdmissionRejected(
+            "Extraction queue is too long right now, please retry later.",
+            503,
+            drain_time - max_drain,
+        )
+
+    if authenticated:
+        active = Extraction.objects.filter(user=user, status__in=ACTIVE_STATUSES).count()
+        excess = active + count - settings.EXTRACTION_ADMISSION_MAX_PER_USER
+        if excess > 0:
+            raise AdmissionRejected(
+                f"You already have {active} extractions in progress, please wait for some to finish.",
+                429,
+                excess / throughput,
+            )
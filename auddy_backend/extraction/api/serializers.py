@@ -1,8 +1,18 @@
+import logging
+
 from rest_framework import serializers
+from django.conf import settings
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
 
 from auddy_backend.extraction.models import Extraction
+from auddy_backend.extraction.eta import estimate_eta
+from auddy_backend.extraction.exceptions import ExtractionError, PermanentSourceError
+from auddy_backend.extraction.negative_cache import known_bad_source, remember_bad_source
+from auddy_backend.extraction.preflight import preflight
+from auddy_backend.extraction.sources import is_youtube_playlist_url
+
+logger = logging.getLogger(__name__)
 
 
 class URLValidator(URLValidator):
@@ -16,10 +26,51 @@ class URLValidator(URLValidator):
 
 class ExtractionCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating extraction requests."""
+    start = serializers.FloatField(source="clip_start", required=False, allow_null=True, min_value=0)
+    end = serializers.FloatField(source="clip_end", required=False, allow_null=True, min_value=0)
+    debug_profile = serializers.BooleanField(source="profile_requested", required=False, write_only=True)
 
     class Meta:
         model = Extraction
-        fields = ["source_url", "audio_format"]
+        fields = ["source_url", "audio_format", "start", "end", "debug_profile"]
+
+    def validate(self, attrs):
+        start = attrs.get("clip_start")
+        end = attrs.get("clip_end")
+        if start is not None and end is not None and end <= start:
+            raise serializers.ValidationError({"end": "End must be after start"})
+
+        source_url = attrs.get("source_url")
+        if is_youtube_playlist_url(source_url):
+            return attrs
+
+        # Sources that recently failed for good are refused without queuing anything
+        known_failure = known_bad_source(source_url)
+        if known_failure:
+            raise serializers.ValidationError({"source_url": known_failure["reason"]})
+
+        # Batch items are checked by the worker instead, to keep the request fast
+        if self.parent is None and settings.EXTRACTION_PREFLIGHT_ON_CREATE:
+            try:
+                source = preflight(source_url, start, end)
+            except PermanentSourceError as e:
+                remember_bad_source(source_url, e)
+                raise serializers.ValidationError({"source_url": str(e)})
+            except ExtractionError as e:
+                # The worker checks again before downloading
+                logger.info(f"Pre-flight check inconclusive for {source_url}: {str(e)}")
+            else:
+                if source['title']:
+                    attrs['title'] = source['title'][:255]
+                if source['duration']:
+                    attrs['duration'] = int(source['duration'])
+        return attrs
+
+    def validate_debug_profile(self, value):
+        request = self.context.get("request")
+        if value and not (request and request.user.is_staff):
+            raise serializers.ValidationError("Only staff can request profiling")
+        return value
 
     def validate_source_url(self, value):
         validator = URLValidator()
@@ -30,8 +81,24 @@ class ExtractionCreateSerializer(serializers.ModelSerializer):
         return value
 
 
+class ExtractionBatchCreateSerializer(serializers.Serializer):
+    """Serializer for creating a batch of extraction requests."""
+
+    items = ExtractionCreateSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, value):
+        if len(value) > settings.EXTRACTION_BATCH_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"A batch can contain at most {settings.EXTRACTION_BATCH_MAX_ITEMS} items"
+            )
+        return value
+
+
 class ExtractionStatusSerializer(serializers.ModelSerializer):
     """Serializer for extraction status."""
+    start = serializers.FloatField(source="clip_start", read_only=True)
+    end = serializers.FloatField(source="clip_end", read_only=True)
+    eta_seconds = serializers.SerializerMethodField()
 
     class Meta:
         model = Extraction
@@ -45,14 +112,23 @@ class ExtractionStatusSerializer(serializers.ModelSerializer):
             "completed_at",
             "file_size",
             "duration",
+            "start",
+            "end",
             "error_message",
             "task_id",
+            "eta_seconds",
         ]
         read_only_fields = fields
 
+    def get_eta_seconds(self, obj):
+        # Lists pass an eta_context, so serializing a batch doesn't cost lookups per row
+        return estimate_eta(obj, self.context.get("eta"))
+
 
 class ExtractionDetailSerializer(serializers.ModelSerializer):
     """Serializer for extraction details."""
+    start = serializers.FloatField(source="clip_start", read_only=True)
+    end = serializers.FloatField(source="clip_end", read_only=True)
     download_url = serializers.SerializerMethodField()
 
     class Meta:
@@ -67,6 +143,8 @@ class ExtractionDetailSerializer(serializers.ModelSerializer):
             "completed_at",
             "file_size",
             "duration",
+            "start",
+            "end",
             "error_message",
             "download_url",
         ]
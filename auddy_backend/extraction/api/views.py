@@ -1,5 +1,7 @@
 import os
 from django.http import FileResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
 from rest_framework import viewsets, status, mixins
 from rest_framework.decorators import action
@@ -8,13 +10,18 @@ from rest_framework.views import APIView
 from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
 
 from auddy_backend.extraction.models import Extraction
+from auddy_backend.extraction.admission import AdmissionRejected, check_admission
 from auddy_backend.extraction.api.serializers import (
+    ExtractionBatchCreateSerializer,
     ExtractionCreateSerializer,
     ExtractionStatusSerializer,
     ExtractionDetailSerializer,
     FormatSerializer,
 )
+from auddy_backend.extraction.eta import eta_context
 from auddy_backend.extraction.services import ExtractionService
+from auddy_backend.extraction.sources import is_youtube_playlist_url
+from auddy_backend.extraction.tracing import traced
 from auddy_backend.contrib.responses import build_response
 
 
@@ -37,14 +44,37 @@ class ExtractionViewSet(mixins.CreateModelMixin,
         """Return appropriate serializer based on action."""
         if self.action == 'create':
             return ExtractionCreateSerializer
+        if self.action == 'batch':
+            return ExtractionBatchCreateSerializer
         return ExtractionDetailSerializer
     
+    @traced('api create extraction')
     def create(self, request, *args, **kwargs):
         """Create an extraction request and start Celery task."""
+        # Admission comes first so an overloaded server doesn't pre-flight sources it will turn away
+        user = request.user if request.user.is_authenticated else None
+        try:
+            check_admission(user)
+        except AdmissionRejected as rejection:
+            return self.reject(rejection)
+
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+
+        # Playlists and channels fan out into one extraction per entry
+        if is_youtube_playlist_url(serializer.validated_data['source_url']):
+            batch = self.service.initialize_playlist(serializer.validated_data, user=user)
+            return build_response(
+                status_code=status.HTTP_202_ACCEPTED,
+                message="Playlist extraction request created successfully",
+                data={'batch_id': str(batch.public_id)}
+            )
         
-        extraction_process = self.service.initialize_extraction(serializer.validated_data)
+        extraction_process = self.service.initialize_extraction(
+            serializer.validated_data,
+            user=user,
+            address=AnonRateThrottle().get_ident(request),
+        )
         
         return build_response(
             status_code=status.HTTP_201_CREATED,
@@ -52,6 +82,77 @@ class ExtractionViewSet(mixins.CreateModelMixin,
             data=ExtractionStatusSerializer(extraction_process).data
         )
         
+    @action(detail=False, methods=['post'])
+    @traced('api create batch')
+    def batch(self, request):
+        """Create many extraction requests at once and dispatch them as one group."""
+        # Admitted on the raw item count, before any item is validated
+        items = request.data.get('items')
+        user = request.user if request.user.is_authenticated else None
+        try:
+            check_admission(user, count=len(items) if isinstance(items, list) else 1)
+        except AdmissionRejected as rejection:
+            return self.reject(rejection)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        batch, extractions = self.service.initialize_batch(serializer.validated_data['items'], user=user)
+
+        return build_response(
+            status_code=status.HTTP_201_CREATED,
+            message="Batch extraction request created successfully",
+            data={
+                'batch_id': str(batch.public_id),
+                'extractions': ExtractionStatusSerializer(
+                    extractions, many=True, context={'eta': eta_context(extractions)},
+                ).data,
+            }
+        )
+
+    @staticmethod
+    def reject(rejection):
+        """Turn an admission rejection into a 413/429/503 response telling the client when to retry."""
+        headers = {'Retry-After': str(rejection.retry_after)} if rejection.retry_after else None
+        return Response({"error": str(rejection)}, status=rejection.status_code, headers=headers)
+
+    @action(detail=False, methods=['post'], url_path=r'(?P<task_id>[0-9a-f-]{36})/cancel')
+    def cancel(self, request, task_id=None):
+        """
+        Cancel a queued or running extraction.
+
+        Extractions are looked up by their unguessable task ID, as on the
+        status endpoint, so only whoever created an anonymous extraction can
+        cancel it; owned ones can only be cancelled by their owner.
+        """
+        extraction = get_object_or_404(Extraction, task_id=task_id)
+        if extraction.user_id and extraction.user_id != request.user.id:
+            return Response(
+                {"error": "You can only cancel your own extractions"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        if not self.service.cancel_extraction(extraction):
+            return Response(
+                {"error": f"Extraction is already {extraction.status}"},
+                status=status.HTTP_409_CONFLICT
+            )
+        return build_response(
+            status_code=status.HTTP_200_OK,
+            message="Extraction cancelled",
+            data=ExtractionStatusSerializer(extraction).data
+        )
+
+    @action(detail=False, methods=['get'], url_path=r'batch/(?P<batch_id>[0-9a-f-]{36})')
+    def batch_status(self, request, batch_id=None):
+        """Return aggregate status counts for a batch."""
+        batch_status = self.service.get_batch_status(batch_id)
+        if batch_status is None:
+            return Response(
+                {"error": "Batch not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(batch_status)
+
     @action(detail=False, methods=['get'])
     def formats(self, request):
         """Return available audio formats."""
@@ -92,6 +193,13 @@ class ExtractionDownloadView(APIView):
         """Download the audio file."""
         try:
             extraction = Extraction.objects.get(id=extraction_id)
+
+            # Expired files have been reclaimed by the storage lifecycle job
+            if extraction.status == Extraction.Status.EXPIRED:
+                return Response(
+                    {"error": "Extraction file has expired"},
+                    status=status.HTTP_410_GONE
+                )
             
             # Check if file exists
             if not extraction.file_path or not os.path.exists(extraction.file_path):
@@ -107,6 +215,9 @@ class ExtractionDownloadView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
                 
+            # Record the access so LRU eviction keeps frequently downloaded files
+            Extraction.objects.filter(id=extraction.id).update(last_accessed_at=timezone.now())
+
             # Set the filename for download
             filename = os.path.basename(extraction.file_path)
             
@@ -0,0 +1,162 @@
+import time
+import logging
+from urllib.parse import urlparse
+
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from auddy_backend.extraction.connections import get_redis
+from auddy_backend.extraction.exceptions import InternalError, OriginBusyError, PlatformUnavailableError
+from auddy_backend.extraction.sources import is_google_drive_url, is_youtube_url
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'extraction:breaker'
+# Seconds of outcomes counted together; the rolling window is made of these
+BUCKET_SECONDS = 10
+
+
+def platform_of(url):
+    """Return the platform whose breaker ``url`` counts against: YouTube, Google Drive, or the host of a direct link."""
+    if is_youtube_url(url):
+        return 'youtube'
+    if is_google_drive_url(url):
+        return 'google_drive'
+    return f"host:{(urlparse(url).hostname or 'unknown').lower()}"
+
+
+def counts_against_platform(error):
+    """
+    Whether ``error`` says something about the platform rather than one source or our own side.
+
+    A private video or a corrupt file is the source's fault and a full disk
+    is ours, as is waiting on our own origin limits; repeated network,
+    rate-limit and unexplained yt-dlp failures are what a broken or
+    throttling platform looks like.
+    """
+    return error.retryable and not isinstance(error, (InternalError, OriginBusyError))
+
+
+class CircuitBreaker:
+    """
+    Rolling failure rate of one platform, shared by all workers through Redis.
+
+    Outcomes are counted in ``BUCKET_SECONDS`` buckets over the last
+    ``EXTRACTION_BREAKER_WINDOW`` seconds. Once at least
+    ``EXTRACTION_BREAKER_MIN_REQUESTS`` outcomes are in the window and the
+    share of failures reaches ``EXTRACTION_BREAKER_FAILURE_RATE``, the breaker
+    opens and jobs for the platform are turned away for
+    ``EXTRACTION_BREAKER_COOLDOWN`` seconds. After that it is half-open: a
+    single job is let through as a probe, and its outcome closes the breaker
+    or opens it for another cooldown.
+    """
+
+    def __init__(self, platform, connection=None, prefix=KEY_PREFIX):
+        self.platform = platform
+        self.redis = connection or get_redis()
+        self.key = f"{prefix}:{platform}"
+
+    def bucket_keys(self, now):
+        bucket = int(now // BUCKET_SECONDS)
+        count = max(1, settings.EXTRACTION_BREAKER_WINDOW // BUCKET_SECONDS)
+        return [f"{self.key}:stats:{bucket - offset}" for offset in range(count)]
+
+    def allow(self, job_id):
+        """
+        Raise ``PlatformUnavailableError`` unless job ``job_id`` may go to the platform now.
+
+        The probe is held by its job, so a probe that is rerouted or resumed
+        after a hand-over still gets through.
+        """
+        open_for = self.redis.pttl(f"{self.key}:open")
+        if open_for > 0:
+            raise PlatformUnavailableError(
+                f"{self.platform} is failing, extractions are paused", retry_after=open_for / 1000,
+            )
+        if not self.redis.exists(f"{self.key}:tripped"):
+            return
+        # Half-open: the first job through is the probe, the rest wait for its outcome
+        probe = f"{self.key}:probe"
+        if not self.redis.set(probe, job_id, nx=True, ex=settings.EXTRACTION_BREAKER_PROBE_TIMEOUT):
+            if self.redis.get(probe) == str(job_id).encode():
+                return
+            raise PlatformUnavailableError(
+                f"{self.platform} is recovering, waiting on a probe extraction",
+                retry_after=settings.EXTRACTION_BREAKER_COOLDOWN,
+            )
+        logger.info(f"Circuit breaker for {self.platform} is half-open, sending a probe")
+
+    def record(self, success):
+        now = time.time()
+        bucket = self.bucket_keys(now)[0]
+        with self.redis.pipeline() as pipe:
+            pipe.hincrby(bucket, 'ok' if success else 'fail', 1)
+            pipe.expire(bucket, settings.EXTRACTION_BREAKER_WINDOW + BUCKET_SECONDS)
+            pipe.exists(f"{self.key}:tripped")
+            tripped = pipe.execute()[-1]
+
+        if success:
+            if tripped:
+                self.close()
+            return
+        if tripped:
+            # The probe failed, or a job that was already running when the breaker opened
+            self.trip(f"{self.platform} is still failing")
+            return
+        total, failures = self.window(now)
+        if total < settings.EXTRACTION_BREAKER_MIN_REQUESTS:
+            return
+        if failures / total >= settings.EXTRACTION_BREAKER_FAILURE_RATE:
+            self.trip(f"{failures} of the last {total} extractions from {self.platform} failed")
+
+    def release_probe(self):
+        """Let another job probe, when the last one ended without telling us anything about the platform."""
+        self.redis.delete(f"{self.key}:probe")
+
+    def window(self, now):
+        """Return the number of outcomes and of failures in the rolling window."""
+        with self.redis.pipeline() as pipe:
+            for key in self.bucket_keys(now):
+                pipe.hmget(key, 'ok', 'fail')
+            counts = pipe.execute()
+        ok = sum(int(bucket_ok or 0) for bucket_ok, _ in counts)
+        failures = sum(int(bucket_fail or 0) for _, bucket_fail in counts)
+        return ok + failures, failures
+
+    def trip(self, reason):
+        cooldown = settings.EXTRACTION_BREAKER_COOLDOWN
+        logger.warning(f"Opening circuit breaker for {self.platform} for {cooldown}s: {reason}")
+        with self.redis.pipeline() as pipe:
+            pipe.set(f"{self.key}:open", 1, ex=cooldown)
+            pipe.set(f"{self.key}:tripped", 1)
+            pipe.delete(f"{self.key}:probe")
+            pipe.execute()
+
+    def close(self):
+        logger.info(f"Circuit breaker for {self.platform} closed")
+        # Failures from before the outage would trip it again straight away
+        self.redis.delete(f"{self.key}:tripped", f"{self.key}:probe", *self.bucket_keys(time.time()))
+
+
+def check_platform(url, job_id):
+    """Raise ``PlatformUnavailableError`` if the breaker for the platform of ``url`` is turning job ``job_id`` away."""
+    if not settings.EXTRACTION_BREAKER_ENABLED:
+        return
+    try:
+        CircuitBreaker(platform_of(url)).allow(job_id)
+    except RedisError as e:
+        logger.warning(f"Circuit breaker unavailable, letting extraction through: {str(e)}")
+
+
+def record_outcome(url, error=None):
+    """Count a finished extraction from ``url`` towards its platform's failure rate."""
+    if not settings.EXTRACTION_BREAKER_ENABLED:
+        return
+    try:
+        breaker = CircuitBreaker(platform_of(url))
+        if error is not None and not counts_against_platform(error):
+            breaker.release_probe()
+        else:
+            breaker.record(success=error is None)
+    except RedisError as e:
+        logger.warning(f"Unable to record extraction outcome for the circuit breaker: {str(e)}")
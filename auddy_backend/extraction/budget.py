@@ -0,0 +1,69 @@
+import subprocess
+import logging
+
+from django.conf import settings
+
+from auddy_backend.extraction.runner import run
+
+logger = logging.getLogger(__name__)
+
+
+def default_queue():
+    """Return the queue extractions run on unless they are routed elsewhere."""
+    return getattr(settings, 'CELERY_TASK_DEFAULT_QUEUE', 'celery')
+
+
+def compute_time_limits(duration):
+    """
+    Return ``(soft, hard)`` time limits in seconds for media of ``duration`` seconds.
+
+    The budget grows linearly with the media length and never drops below the
+    global Celery limits, so short jobs keep the defaults.
+    """
+    soft = settings.EXTRACTION_TIME_BUDGET_BASE + settings.EXTRACTION_TIME_BUDGET_PER_MEDIA_SECOND * duration
+    soft = int(min(max(soft, settings.CELERY_TASK_SOFT_TIME_LIMIT), settings.EXTRACTION_TIME_BUDGET_MAX))
+    hard = max(soft + settings.EXTRACTION_TIME_BUDGET_HARD_GRACE, settings.CELERY_TASK_TIME_LIMIT)
+    return soft, hard
+
+
+def dispatch_options(duration):
+    """
+    Return ``apply_async`` options routing and budgeting media of ``duration`` seconds.
+
+    Media at least ``EXTRACTION_HEAVY_DURATION_THRESHOLD`` long goes to the
+    heavy queue so it can't hold up short jobs. Returns an empty dict when
+    the duration is unknown, leaving the defaults in place.
+    """
+    if not duration:
+        return {}
+    soft, hard = compute_time_limits(duration)
+    heavy = duration >= settings.EXTRACTION_HEAVY_DURATION_THRESHOLD
+    return {
+        'queue': settings.EXTRACTION_HEAVY_QUEUE if heavy else default_queue(),
+        'soft_time_limit': soft,
+        'time_limit': hard,
+    }
+
+
+def fits_budget(request, options):
+    """Return True when the running task ``request`` already has the queue and limits in ``options``."""
+    _, soft = request.timelimit or (None, None)
+    soft = soft or settings.CELERY_TASK_SOFT_TIME_LIMIT
+    queue = (request.delivery_info or {}).get('routing_key') or default_queue()
+    return queue == options['queue'] and soft >= options['soft_time_limit']
+
+
+def probe_duration(source, timeout=30):
+    """Return the duration in seconds of a local file or URL as reported by ffprobe, or None."""
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        source,
+    ]
+    try:
+        return float(run(cmd, timeout=timeout).strip())
+    except (subprocess.SubprocessError, OSError, ValueError) as e:
+        logger.warning(f"Unable to probe duration of {source}: {str(e)}")
+        return None
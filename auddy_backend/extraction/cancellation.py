@@ -0,0 +1,100 @@
+import time
+import logging
+
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from auddy_backend.extraction.connections import get_redis
+from auddy_backend.extraction.exceptions import ExtractionCancelled
+from auddy_backend.extraction.models import Extraction
+
+logger = logging.getLogger(__name__)
+
+CANCEL_FLAG_KEY = 'extraction:cancel:{}'
+
+
+def request_cancel(extraction_id):
+    """
+    Raise the flag telling the worker running ``extraction_id`` to stop.
+
+    The flag lives in the extraction Redis, shared by the API, the workers and
+    the download engine. It only speeds the stop up: the row is already
+    CANCELLED, which workers fall back to when the flag is lost.
+    """
+    try:
+        get_redis().set(CANCEL_FLAG_KEY.format(extraction_id), 1, ex=settings.EXTRACTION_CANCEL_FLAG_TTL)
+    except RedisError as e:
+        logger.warning(f"Unable to raise the cancel flag of extraction {extraction_id}: {str(e)}")
+
+
+def is_cancelled(extraction_id, check_db=True):
+    """
+    Return True if cancellation of ``extraction_id`` has been requested.
+
+    The Redis flag is checked first. With ``check_db`` the row's status is
+    read when the flag is not raised, so a flag lost to a Redis outage still
+    stops the extraction.
+    """
+    try:
+        if get_redis().exists(CANCEL_FLAG_KEY.format(extraction_id)):
+            return True
+    except RedisError as e:
+        logger.warning(f"Unable to read the cancel flag of extraction {extraction_id}: {str(e)}")
+    return check_db and Extraction.objects.filter(id=extraction_id, status=Extraction.Status.CANCELLED).exists()
+
+
+def cancelled_ids(extraction_ids):
+    """Return those of ``extraction_ids`` whose cancellation was requested, with one Redis round trip and one query."""
+    extraction_ids = list(extraction_ids)
+    if not extraction_ids:
+        return set()
+    cancelled = set()
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for extraction_id in extraction_ids:
+            pipe.exists(CANCEL_FLAG_KEY.format(extraction_id))
+        cancelled = {extraction_id for extraction_id, flag in zip(extraction_ids, pipe.execute()) if flag}
+    except RedisError as e:
+        logger.warning(f"Unable to read cancel flags: {str(e)}")
+    cancelled.update(
+        Extraction.objects.filter(id__in=extraction_ids, status=Extraction.Status.CANCELLED)
+        .values_list('id', flat=True)
+    )
+    return cancelled
+
+
+def raise_if_cancelled(extraction_id):
+    """Raise ``ExtractionCancelled`` at a stage boundary if ``extraction_id`` was cancelled."""
+    if is_cancelled(extraction_id):
+        raise ExtractionCancelled(f"Extraction {extraction_id} was cancelled")
+
+
+def cancel_checker(extraction_id, min_interval=0.5, db_interval=None):
+    """
+    Return a callable answering whether ``extraction_id`` was cancelled.
+
+    The answer is reused for ``min_interval`` seconds, so the callable can be
+    polled from the process runner and progress hooks without a Redis round
+    trip each time. The row itself is only re-read every ``db_interval``
+    seconds (``EXTRACTION_CANCEL_DB_CHECK_INTERVAL`` by default). Once True it
+    stays True.
+    """
+    db_interval = settings.EXTRACTION_CANCEL_DB_CHECK_INTERVAL if db_interval is None else db_interval
+    state = {'checked': None, 'db_checked': None, 'cancelled': False}
+
+    def due(key, interval, current):
+        return state[key] is None or current - state[key] >= interval
+
+    def check():
+        current = time.monotonic()
+        if not state['cancelled'] and due('checked', min_interval, current):
+            state['checked'] = current
+            check_db = due('db_checked', db_interval, current)
+            if check_db:
+                state['db_checked'] = current
+            state['cancelled'] = is_cancelled(extraction_id, check_db=check_db)
+            if state['cancelled']:
+                logger.info(f"Extraction {extraction_id} was cancelled, stopping")
+        return state['cancelled']
+
+    return check
@@ -0,0 +1,11 @@
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+
+
+@lru_cache(maxsize=None)
+def get_redis():
+    """Return a Redis client for extraction bookkeeping, shared by the whole process."""
+    options = {'ssl_cert_reqs': None} if settings.REDIS_SSL else {}
+    return redis.Redis.from_url(settings.REDIS_URL, **options)
@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import uuid
+import random
+import signal
+import asyncio
+import logging
+
+import aiohttp
+import redis.asyncio as aioredis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from auddy_backend.extraction.cancellation import cancelled_ids
+from auddy_backend.extraction.exceptions import raise_for_status_code
+from auddy_backend.extraction.limiter import OriginLimiter, bandwidth_share, origin_of
+from auddy_backend.extraction.models import Extraction
+from auddy_backend.extraction.scratch import ScratchSpace, Stage
+from auddy_backend.extraction.tasks import DOWNLOAD_QUEUE_KEY, SCRATCH_DIR, extraction_signature
+from auddy_backend.extraction.tracing import parse_traceparent, span
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for cancelled transfers
+CANCEL_POLL_INTERVAL = 1.0
+
+
+def claim(job):
+    """Mark the extraction of ``job`` as being downloaded. Returns False if it was cancelled meanwhile."""
+    return bool(
+        Extraction.objects.filter(id=job['id'], status=Extraction.Status.PENDING).update(
+            status=Extraction.Status.PROCESSING,
+            heartbeat_at=timezone.now(),
+        )
+    )
+
+
+def hand_back(job, downloaded, offload=True):
+    """
+    Return an extraction to the Celery workers.
+
+    With ``downloaded`` the file is recorded as the download checkpoint, so
+    the worker goes straight to transcoding. A failed download is handed back
+    with ``offload=False`` so the worker retries it itself and classifies the
+    error as usual. Cancelled extractions are cleaned up instead.
+    """
+    scratch = ScratchSpace(SCRATCH_DIR, job['id']).open()
+    returned = Extraction.objects.filter(id=job['id'], status=Extraction.Status.PROCESSING).update(
+        status=Extraction.Status.PENDING,
+        heartbeat_at=None,
+    )
+    if not returned:
+        scratch.cleanup()
+        return
+    if downloaded:
+        scratch.mark(Stage.DOWNLOADED, job['path'])
+    extraction_signature(
+        job['id'], job['task_id'], job.get('duration'), offload=offload, traceparent=job.get('traceparent'),
+    ).apply_async()
+
+
+def file_size(path):
+    """Return the size of ``path``, or 0 if it doesn't exist yet."""
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def record_heartbeats(extraction_ids):
+    Extraction.objects.filter(id__in=extraction_ids, status=Extraction.Status.PROCESSING).update(
+        heartbeat_at=timezone.now(),
+    )
+
+
+class DownloadEngine:
+    """
+    Download sources for many extractions at once on one event loop.
+
+    Jobs are taken from the ``DOWNLOAD_QUEUE_KEY`` Redis list, where
+    ``extract_audio`` leaves them, only while fewer than ``concurrency``
+    transfers are running. Each transfer streams to its scratch file in
+    ``chunk_size`` pieces, resuming a partial file with a Range request, so
+    memory stays bounded however large the source. Finished sources are handed
+    back to the Celery workers for transcoding. Transfers take a lease on
+    their origin from the fleet-wide limiter first, waiting on the event loop
+    rather than failing, and are paced to the origin's bandwidth share.
+    """
+
+    def __init__(self, concurrency=None, chunk_size=None):
+        self.concurrency = concurrency or settings.EXTRACTION_DOWNLOAD_ENGINE_CONCURRENCY
+        self.chunk_size = chunk_size or settings.EXTRACTION_DOWNLOAD_ENGINE_CHUNK_SIZE
+        self.transfers = {}
+        self.leases = {}
+        self.cancelled = set()
+        self.limiter = None
+        self.stopping = asyncio.Event()
+
+    def stop(self):
+        logger.info("Download engine stopping, handing running transfers back")
+        self.stopping.set()
+
+    async def serve(self):
+        """Run until :meth:`stop` is called, then hand unfinished transfers back to the queue."""
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.stop)
+
+        options = {'ssl_cert_reqs': None} if settings.REDIS_SSL else {}
+        if settings.EXTRACTION_ORIGIN_LIMITS_ENABLED:
+            self.limiter = OriginLimiter()
+        connection = aioredis.Redis.from_url(settings.REDIS_URL, **options)
+        slots = asyncio.Semaphore(self.concurrency)
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=settings.EXTRACTION_DOWNLOAD_ENGINE_CONNECT_TIMEOUT,
+            sock_read=settings.EXTRACTION_DOWNLOAD_ENGINE_READ_TIMEOUT,
+        )
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        session = aiohttp.ClientSession(timeout=timeout, connector=connector, read_bufsize=self.chunk_size)
+        async with session:
+            self.session = session
+            watchers = [asyncio.create_task(self.watch_cancellations()), asyncio.create_task(self.heartbeat())]
+            logger.info(f"Download engine running with {self.concurrency} transfer slots")
+            try:
+                while not self.stopping.is_set():
+                    if slots.locked():
+                        await asyncio.sleep(CANCEL_POLL_INTERVAL)
+                        continue
+                    await slots.acquire()
+                    item = await connection.blpop([DOWNLOAD_QUEUE_KEY], timeout=1)
+                    if item is None:
+                        slots.release()
+                        continue
+                    job = json.loads(item[1])
+                    transfer = asyncio.create_task(self.transfer(job))
+                    self.transfers[job['id']] = transfer
+                    transfer.add_done_callback(lambda _, job_id=job['id']: self.finished(job_id, slots))
+            finally:
+                for watcher in watchers:
+                    watcher.cancel()
+                for transfer in list(self.transfers.values()):
+                    transfer.cancel()
+                await asyncio.gather(*self.transfers.values(), return_exceptions=True)
+                await connection.aclose()
+
+    def finished(self, job_id, slots):
+        self.transfers.pop(job_id, None)
+        self.cancelled.discard(job_id)
+        slots.release()
+
+    async def transfer(self, job):
+        if not await sync_to_async(claim)(job):
+            logger.info(f"Extraction {job['id']} was cancelled before its download started")
+            return
+        try:
+            origin = origin_of(job['url'])
+            # Each transfer runs in its own asyncio task, so its span doesn't leak into the others
+            with span('download engine transfer', parse_traceparent(job.get('traceparent')), origin=origin):
+                await self.take_lease(job['id'], origin)
+                await self.fetch(job, bandwidth_share(origin))
+        except asyncio.CancelledError:
+            # A cancelled extraction is cleaned up; on shutdown the job is queued
+            # again and the next engine resumes the partial file
+            reason = 'cancelled' if job['id'] in self.cancelled else 'interrupted'
+            logger.info(f"Download of extraction {job['id']} {reason}")
+            await sync_to_async(hand_back)(job, downloaded=False)
+            raise
+        except Exception as e:
+            logger.warning(f"Download engine failed to fetch extraction {job['id']}, worker will retry: {str(e)}")
+            await sync_to_async(hand_back)(job, downloaded=False, offload=False)
+            return
+        finally:
+            await self.release_lease(job['id'])
+        await sync_to_async(hand_back)(job, downloaded=True)
+
+    async def take_lease(self, job_id, origin):
+        """Wait for a connection slot on ``origin``. The engine runs unlimited if the limiter is unavailable."""
+        if not self.limiter:
+            return
+        lease_id = uuid.uuid4().hex
+        try:
+            while wait := await sync_to_async(self.limiter.try_acquire, thread_sensitive=False)(origin, lease_id):
+                await asyncio.sleep(wait * random.uniform(1, 1.5))  # noqa: S311
+        except RedisError as e:
+            logger.warning(f"Origin limiter unavailable, downloading {origin} without limits: {str(e)}")
+            return
+        self.leases[job_id] = (origin, lease_id)
+
+    async def release_lease(self, job_id):
+        lease = self.leases.pop(job_id, None)
+        if lease:
+            try:
+                await sync_to_async(self.limiter.release, thread_sensitive=False)(*lease)
+            except RedisError as e:
+                logger.warning(f"Unable to release {lease[0]} lease, it will expire: {str(e)}")
+
+    def renew_leases(self):
+        for origin, lease_id in list(self.leases.values()):
+            self.limiter.renew(origin, lease_id)
+
+    async def resolve_url(self, job):
+        """Return the URL to download, following Google Drive's large-file confirmation."""
+        if not job.get('drive_file_id'):
+            return job['url']
+        url = f"https://drive.google.com/uc?export=download&id={job['drive_file_id']}"
+        async with self.session.get(url) as response:
+            token = next(
+                (cookie.value for key, cookie in response.cookies.items() if key.startswith('download_warning')),
+                None,
+            )
+        if token:
+            url = f"https://drive.google.com/uc?export=download&confirm={token}&id={job['drive_file_id']}"
+        return url
+
+    async def fetch(self, job, bandwidth=None):
+        """
+        Stream the source of ``job`` to its scratch file.
+
+        Every filesystem call runs in a thread, so a slow disk stalls this
+        transfer only and never the event loop serving all the others.
+        """
+        url = await self.resolve_url(job)
+        path = job['path']
+        offset = await asyncio.to_thread(file_size, path)
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+
+        async with self.session.get(url, headers=headers) as response:
+            if offset and response.status == 416:
+                # The partial file is already complete
+                return
+            if response.status not in (200, 206):
+                raise_for_status_code(response.status, response.headers, "Source")
+            # Append when the server honoured the range, otherwise start over
+            f = await asyncio.to_thread(open, path, 'ab' if response.status == 206 else 'wb')
+            try:
+                started, received = time.monotonic(), 0
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    await asyncio.to_thread(f.write, chunk)
+                    received += len(chunk)
+                    if bandwidth:
+                        # Pace the transfer to its share of the origin's bandwidth
+                        ahead = received / bandwidth - (time.monotonic() - started)
+                        if ahead > 0:
+                            await asyncio.sleep(ahead)
+            finally:
+                await asyncio.to_thread(f.close)
+        size = await asyncio.to_thread(file_size, path)
+        logger.info(f"Downloaded source of extraction {job['id']} ({size} bytes)")
+
+    async def watch_cancellations(self):
+        while True:
+            await asyncio.sleep(CANCEL_POLL_INTERVAL)
+            if not self.transfers:
+                continue
+            for extraction_id in await sync_to_async(cancelled_ids)(list(self.transfers)):
+                self.cancelled.add(extraction_id)
+                self.transfers[extraction_id].cancel()
+
+    async def heartbeat(self):
+        while True:
+            await asyncio.sleep(settings.EXTRACTION_HEARTBEAT_INTERVAL)
+            if self.transfers:
+                await sync_to_async(record_heartbeats)(list(self.transfers))
+            if self.leases:
+                try:
+                    await sync_to_async(self.renew_leases, thread_sensitive=False)()
+                except RedisError as e:
+                    logger.warning(f"Unable to renew origin leases: {str(e)}")
@@ -0,0 +1,235 @@
+import time
+import bisect
+import logging
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from redis.exceptions import RedisError
+
+from auddy_backend.extraction.admission import get_backlog_snapshot
+from auddy_backend.extraction.connections import get_redis
+from auddy_backend.extraction.metrics import ETA_ERROR, platform_label
+from auddy_backend.extraction.models import Extraction
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'extraction:eta'
+RUN_STARTED_CACHE_KEY = 'extraction:started:{}'
+PROGRESS_CACHE_KEY = 'extraction:progress:{}'
+
+# Stages whose time grows with the length of the media; the rest are a fixed overhead
+WORK_STAGES = ('download', 'transcode')
+ACTIVE_STATUSES = (Extraction.Status.PENDING, Extraction.Status.PROCESSING)
+# Extractions handed to the workers and waiting for one; batch and playlist
+# entries held back by their concurrency cap have no task ID yet
+QUEUED = Q(status=Extraction.Status.PENDING) & ~Q(task_id='')
+
+# Fold one finished run into the moving averages of a platform and format.
+# KEYS: model hash
+# ARGV: overhead seconds, seconds per media second, relative error of the prediction, smoothing, ttl
+# The first samples are weighted 1/n so the averages settle quickly, then by the smoothing factor.
+RECORD_SCRIPT = """
+local samples = tonumber(redis.call('HGET', KEYS[1], 'samples') or '0') + 1
+local alpha = math.max(tonumber(ARGV[4]), 1 / samples)
+for i, field in ipairs({'overhead', 'rate', 'error'}) do
+    local value = tonumber(ARGV[i])
+    local current = tonumber(redis.call('HGET', KEYS[1], field) or ARGV[i])
+    redis.call('HSET', KEYS[1], field, current + alpha * (value - current))
+end
+redis.call('HSET', KEYS[1], 'samples', samples)
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return samples
+"""
+
+
+def media_seconds(extraction):
+    """Return the seconds of media ``extraction`` covers, or None while unknown."""
+    if extraction.clip_end is not None:
+        return extraction.clip_end - (extraction.clip_start or 0)
+    return extraction.duration or None
+
+
+def model_key(platform, audio_format):
+    return f"{KEY_PREFIX}:{platform}:{audio_format}"
+
+
+def prior_state():
+    return settings.EXTRACTION_ETA_PRIOR_OVERHEAD, settings.EXTRACTION_ETA_PRIOR_RATE, 0
+
+
+def parse_state(values):
+    """Turn the ``overhead``, ``rate`` and ``samples`` fields of a model hash into a state, or the priors."""
+    overhead, rate, samples = values
+    if not samples:
+        return prior_state()
+    return float(overhead), float(rate), int(samples)
+
+
+def predict_run_time(state, seconds):
+    """Return the run time ``state`` expects for ``seconds`` of media, or for the default cost when unknown."""
+    overhead, rate, _ = state
+    if seconds is None:
+        seconds = settings.EXTRACTION_SCHEDULER_DEFAULT_COST
+    return overhead + rate * seconds
+
+
+class ThroughputModel:
+    """
+    How fast extractions of one platform and format run, learnt from finished ones.
+
+    A run takes a fixed ``overhead`` (resolving, probing, finalizing) plus
+    ``rate`` seconds per second of media (downloading and transcoding), each
+    kept as an exponentially weighted moving average in Redis. Until the
+    first run is recorded, and whenever Redis is unavailable, the configured
+    priors are used instead. ``error`` tracks the relative error of past
+    predictions, so the estimates can be seen improving as samples accumulate.
+    """
+
+    def __init__(self, platform, audio_format, connection=None):
+        self.key = model_key(platform, audio_format)
+        self.redis = connection or get_redis()
+
+    def state(self):
+        """Return ``(overhead, rate, samples)``."""
+        if not settings.EXTRACTION_ETA_LEARNING:
+            return prior_state()
+        try:
+            return parse_state(self.redis.hmget(self.key, 'overhead', 'rate', 'samples'))
+        except RedisError as e:
+            logger.warning(f"ETA model unavailable, using priors: {str(e)}")
+            return prior_state()
+
+    def predict(self, seconds):
+        """Return the expected run time for ``seconds`` of media, or for the default cost when unknown."""
+        return predict_run_time(self.state(), seconds)
+
+    def record(self, overhead, work, seconds):
+        """Fold in a run that spent ``overhead`` plus ``work`` seconds on ``seconds`` of media."""
+        predicted = self.predict(seconds)
+        actual = overhead + work
+        error = abs(predicted - actual) / max(actual, 1)
+        self.redis.register_script(RECORD_SCRIPT)(keys=[self.key], args=[
+            overhead,
+            work / seconds,
+            error,
+            settings.EXTRACTION_ETA_SMOOTHING,
+            settings.EXTRACTION_ETA_MODEL_TTL,
+        ])
+        return error
+
+
+def load_states(pairs, connection=None):
+    """Return the state of the model of every ``(platform, format)`` in ``pairs``, read in one round trip."""
+    pairs = list(pairs)
+    if not settings.EXTRACTION_ETA_LEARNING or not pairs:
+        return {pair: prior_state() for pair in pairs}
+    pipe = (connection or get_redis()).pipeline(transaction=False)
+    for platform, audio_format in pairs:
+        pipe.hmget(model_key(platform, audio_format), 'overhead', 'rate', 'samples')
+    try:
+        results = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"ETA models unavailable, using priors: {str(e)}")
+        return {pair: prior_state() for pair in pairs}
+    return {pair: parse_state(values) for pair, values in zip(pairs, results)}
+
+
+def model_for(extraction):
+    return ThroughputModel(platform_label(extraction.source_url), extraction.audio_format)
+
+
+def mark_started(extraction_id):
+    """Note when the current run of ``extraction_id`` started, to tell how much of it is left."""
+    cache.set(RUN_STARTED_CACHE_KEY.format(extraction_id), time.time(), settings.EXTRACTION_PROGRESS_TTL)
+
+
+def record_run(extraction, timer):
+    """
+    Learn from a finished run of ``extraction`` timed by ``timer``.
+
+    Runs resumed from a checkpoint only did part of the work, and runs of
+    unknown length can't be scaled, so neither is recorded.
+    """
+    seconds = media_seconds(extraction)
+    if not settings.EXTRACTION_ETA_LEARNING or not seconds or 'resumed_from' in timer.details:
+        return
+    work = sum(timer.durations.get(stage, 0) for stage in WORK_STAGES)
+    overhead = sum(timer.durations.values()) - work
+    try:
+        error = model_for(extraction).record(overhead, work, seconds)
+    except RedisError as e:
+        logger.warning(f"Unable to update ETA model: {str(e)}")
+        return
+    ETA_ERROR.labels(timer.platform, extraction.audio_format).observe(error)
+
+
+class EtaContext(NamedTuple):
+    """What the ETAs of many extractions share, gathered once by :func:`eta_context`."""
+
+    # (platform, format) -> (overhead, rate, samples)
+    models: dict
+    # Creation times of queued extractions, oldest first
+    queued: list
+    # Completions per second
+    throughput: float
+    # Cached progress and start times of the running extractions
+    running: dict
+
+
+def eta_context(extractions):
+    """
+    Gather what the ETAs of ``extractions`` need in one query, one Redis round trip and one cache lookup.
+
+    Pass the result to :func:`estimate_eta`, through the serializer context when serializing a list.
+    """
+    active = [extraction for extraction in extractions if extraction.status in ACTIVE_STATUSES]
+    models = load_states({(platform_label(extraction.source_url), extraction.audio_format) for extraction in active})
+
+    queued, throughput = [], None
+    pending = [extraction for extraction in active if extraction.status == Extraction.Status.PENDING]
+    if pending:
+        _, throughput = get_backlog_snapshot()
+        queued = list(
+            Extraction.objects.filter(QUEUED, created__lt=max(extraction.created for extraction in pending))
+            .order_by('created')
+            .values_list('created', flat=True)
+        )
+
+    keys = [
+        key.format(extraction.id)
+        for extraction in active if extraction.status == Extraction.Status.PROCESSING
+        for key in (PROGRESS_CACHE_KEY, RUN_STARTED_CACHE_KEY)
+    ]
+    running = cache.get_many(keys) if keys else {}
+    return EtaContext(models, queued, throughput, running)
+
+
+def estimate_eta(extraction, context=None):
+    """
+    Return the seconds until ``extraction`` is expected to finish, or None once it has.
+
+    A queued extraction waits for the queued extractions submitted before it
+    to drain at the measured throughput, then runs for the time its model
+    predicts. A running one has what is left of that prediction: the share
+    of the transcode still to go when progress is reported, otherwise the
+    prediction less the time spent. ``context`` comes from
+    :func:`eta_context`; without it the lookups are made for this extraction alone.
+    """
+    if extraction.status not in ACTIVE_STATUSES:
+        return None
+    context = context or eta_context([extraction])
+    state = context.models[(platform_label(extraction.source_url), extraction.audio_format)]
+    run_time = predict_run_time(state, media_seconds(extraction))
+
+    if extraction.status == Extraction.Status.PENDING:
+        ahead = bisect.bisect_left(context.queued, extraction.created)
+        return round(ahead / context.throughput + run_time)
+
+    percent = context.running.get(PROGRESS_CACHE_KEY.format(extraction.id))
+    if percent:
+        return round(run_time * (1 - min(percent, 100) / 100))
+    started = context.running.get(RUN_STARTED_CACHE_KEY.format(extraction.id))
+    elapsed = time.time() - started if started else 0
+    return round(max(run_time - elapsed, 0))
@@ -0,0 +1,229 @@
+import re
+import random
+import subprocess
+from email.utils import parsedate_to_datetime
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+from yt_dlp.utils import DownloadError, ExtractorError, GeoRestrictedError, UnsupportedError
+
+from auddy_backend.extraction.runner import ProcessCancelled
+
+
+class ExtractionError(Exception):
+    """Base class for classified extraction failures."""
+
+    # Whether the task should be retried after this error
+    retryable = False
+    # Short machine-readable label used in logs and metrics
+    kind = "error"
+    # Whether the failure belongs to the source itself, so that requests for
+    # the same source can be refused from the negative cache
+    cacheable = False
+
+
+class TransientNetworkError(ExtractionError):
+    """A network or upstream failure that is likely to succeed on retry."""
+
+    retryable = True
+    kind = "transient"
+
+
+class RateLimitedError(TransientNetworkError):
+    """The source asked us to slow down, optionally saying for how long."""
+
+    kind = "rate_limited"
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class OriginBusyError(RateLimitedError):
+    """Our own per-origin limits had no free connection slot in time; the origin itself is fine."""
+
+    kind = "origin_busy"
+
+
+class PermanentSourceError(ExtractionError):
+    """The source can never be extracted as submitted (invalid, private, removed, unsupported)."""
+
+    kind = "permanent"
+    cacheable = True
+
+    def __init__(self, message="", cacheable=None):
+        super().__init__(message)
+        if cacheable is not None:
+            self.cacheable = cacheable
+
+
+class LimitExceededError(PermanentSourceError):
+    """The source, or the requested clip of it, is longer or larger than we accept."""
+
+    kind = "limit_exceeded"
+    # Another clip of the same source may well fit
+    cacheable = False
+
+
+class InternalError(ExtractionError):
+    """A failure on our side, such as disk or encoder problems."""
+
+    retryable = True
+    kind = "internal"
+
+
+class PlatformUnavailableError(ExtractionError):
+    """The circuit breaker for the source's platform is open after a run of failures there."""
+
+    kind = "circuit_open"
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ExtractionCancelled(ExtractionError):
+    """The extraction was cancelled by its owner while it was running."""
+
+    kind = "cancelled"
+
+
+# yt-dlp reports most failures as DownloadError with the reason in the message. Only
+# reasons that are clearly the source's own belong here: 403s and missing formats
+# usually mean the platform is throttling us or has broken yt-dlp, so they stay
+# transient, are retried and count towards the platform's circuit breaker.
+PERMANENT_SOURCE_PATTERNS = re.compile(
+    r"private video|video unavailable|has been removed|account associated with this video has been terminated"
+    r"|not available in your country|sign in to confirm your age|members[- ]only|join this channel"
+    r"|drm protected|unsupported url|is not a valid url|http error 404|http error 410"
+    r"|premieres in|this live event will begin",
+    re.IGNORECASE,
+)
+RATE_LIMIT_PATTERNS = re.compile(r"http error 429|too many requests|rate[- ]limit", re.IGNORECASE)
+# ffmpeg stderr lines meaning the input itself is not usable media
+UNUSABLE_MEDIA_PATTERNS = re.compile(
+    r"invalid data found when processing input|does not contain any stream|output file #0 does not contain"
+    r"|could not find codec parameters|moov atom not found",
+    re.IGNORECASE,
+)
+# Client errors saying the source itself is gone, the only ones kept in the negative cache.
+# Others, 401 and 403 above all, are often temporary, such as Google Drive's download quota.
+GONE_STATUS_CODES = {404, 410}
+# curl exit codes for connection-level failures worth retrying
+# https://curl.se/libcurl/c/libcurl-errors.html
+CURL_TRANSIENT_EXIT_CODES = {5, 6, 7, 18, 28, 35, 52, 55, 56}
+
+
+def parse_retry_after(value):
+    """Parse a ``Retry-After`` header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0, int((retry_at - timezone.now()).total_seconds()))
+
+
+def raise_for_response(response, source):
+    """Raise a classified error for a failed HTTP response from ``source``."""
+    raise_for_status_code(response.status_code, response.headers, source)
+
+
+def raise_for_status_code(code, headers, source):
+    """Raise a classified error for an HTTP status ``code`` with response ``headers`` from ``source``."""
+    if code < 400:
+        return
+    message = f"{source} responded with HTTP {code}"
+    if code in (429, 503) and headers.get('Retry-After'):
+        raise RateLimitedError(message, parse_retry_after(headers['Retry-After']))
+    if code == 429:
+        raise RateLimitedError(message)
+    if code >= 500 or code == 408:
+        raise TransientNetworkError(message)
+    raise PermanentSourceError(message, cacheable=code in GONE_STATUS_CODES)
+
+
+def _process_output(exc):
+    output = exc.stderr or exc.output or ''
+    return output.decode('utf-8', errors='replace') if isinstance(output, bytes) else output
+
+
+def classify_curl_error(exc, message):
+    """Classify a failed ``curl --fail`` invocation by exit code and reported HTTP status."""
+    match = re.search(r"returned error: (\d{3})", _process_output(exc))
+    if exc.returncode == 22 and match:
+        code = int(match.group(1))
+        if code == 429:
+            return RateLimitedError(f"{message}: HTTP {code}")
+        if code >= 500 or code == 408:
+            return TransientNetworkError(f"{message}: HTTP {code}")
+        return PermanentSourceError(f"{message}: HTTP {code}", cacheable=code in GONE_STATUS_CODES)
+    if exc.returncode == 3:
+        return PermanentSourceError(f"{message}: malformed URL")
+    if exc.returncode in CURL_TRANSIENT_EXIT_CODES:
+        return TransientNetworkError(f"{message}: curl exit code {exc.returncode}")
+    return InternalError(f"{message}: curl exit code {exc.returncode}")
+
+
+def classify_exception(exc, message=None):
+    """Map any exception raised during extraction onto the ``ExtractionError`` hierarchy."""
+    if isinstance(exc, ExtractionError):
+        return exc
+
+    message = f"{message}: {exc}" if message else str(exc)
+    if isinstance(exc, (GeoRestrictedError, UnsupportedError)):
+        error = PermanentSourceError(message)
+    elif isinstance(exc, (DownloadError, ExtractorError)):
+        if RATE_LIMIT_PATTERNS.search(message):
+            error = RateLimitedError(message)
+        elif PERMANENT_SOURCE_PATTERNS.search(message):
+            error = PermanentSourceError(message)
+        else:
+            error = TransientNetworkError(message)
+    elif isinstance(exc, requests.HTTPError) and exc.response is not None:
+        try:
+            raise_for_response(exc.response, "Source")
+        except ExtractionError as classified:
+            error = classified
+        else:
+            error = TransientNetworkError(message)
+    elif isinstance(exc, requests.RequestException):
+        error = TransientNetworkError(message)
+    elif isinstance(exc, ProcessCancelled):
+        error = ExtractionCancelled(message)
+    elif isinstance(exc, subprocess.CalledProcessError):
+        if UNUSABLE_MEDIA_PATTERNS.search(_process_output(exc)):
+            error = PermanentSourceError(f"Unsupported or corrupt media: {message}")
+        else:
+            error = InternalError(message)
+    else:
+        error = InternalError(message)
+
+    error.__cause__ = exc
+    return error
+
+
+def compute_retry_delay(error, retries, base, cap, retry_after_cap=None):
+    """
+    Return the countdown in seconds before retrying after ``error``.
+
+    Uses capped exponential backoff with full jitter, so retries from a burst
+    of failures spread out instead of hitting the source together. A
+    ``Retry-After`` supplied by the source is honoured as a lower bound, up to
+    ``retry_after_cap`` (``EXTRACTION_RETRY_AFTER_MAX`` by default): a
+    countdown past the broker's visibility timeout would run the task twice.
+    """
+    retry_after_cap = settings.EXTRACTION_RETRY_AFTER_MAX if retry_after_cap is None else retry_after_cap
+    delay = random.uniform(0, min(cap, base * (2 ** retries)))  # noqa: S311
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is not None:
+        retry_after = min(retry_after, retry_after_cap)
+        # Add a little jitter on top so rate-limited jobs don't return in lockstep
+        jitter = random.uniform(0, min(base, retry_after / 10 + 1))  # noqa: S311
+        delay = min(max(delay, retry_after + jitter), retry_after_cap)
+    return delay
@@ -0,0 +1,138 @@
+import os
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models import Sum
+from django.utils import timezone
+
+from auddy_backend.extraction.models import Extraction
+
+logger = logging.getLogger(__name__)
+
+
+def get_storage_usage():
+    """
+    Return the number of bytes currently held by completed extractions.
+
+    The extraction rows double as the usage index: ``file_size`` is recorded
+    when a file is finalized, so summing it avoids walking the media tree.
+    """
+    usage = Extraction.objects.filter(
+        status=Extraction.Status.COMPLETED,
+    ).exclude(file_path='').aggregate(total=Sum('file_size'))['total']
+    return usage or 0
+
+
+def remove_extraction_file(file_path):
+    """Delete an extraction file and its per-extraction directory if empty."""
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Unable to remove extraction file {file_path}: {str(e)}")
+        return False
+
+    try:
+        os.rmdir(os.path.dirname(file_path))
+    except OSError:
+        # Directory is not empty or already gone
+        pass
+    return True
+
+
+def _live_references(file_paths, exclude_ids):
+    """Return the subset of ``file_paths`` still referenced by rows outside ``exclude_ids``."""
+    return set(
+        Extraction.objects.filter(file_path__in=file_paths)
+        .exclude(id__in=exclude_ids)
+        .exclude(status=Extraction.Status.EXPIRED)
+        .values_list('file_path', flat=True)
+    )
+
+
+def expire_batch(queryset, started_at, limit):
+    """
+    Expire up to ``limit`` rows from ``queryset`` and reclaim their files.
+
+    Rows are locked with ``SKIP LOCKED`` so concurrent runs never fight over
+    the same batch, and rows downloaded after ``started_at`` are left alone.
+    Files shared with a row that is not being expired are kept on disk.
+    Returns a ``(rows_expired, bytes_reclaimed, bytes_released)`` tuple, where
+    ``bytes_released`` sums the ``file_size`` of the expired rows, which is
+    what :func:`get_storage_usage` drops by.
+    """
+    with transaction.atomic():
+        batch = list(
+            queryset.select_for_update(skip_locked=True)
+            .exclude(last_accessed_at__gt=started_at)
+            .values_list('id', 'file_path', 'file_size')[:limit]
+        )
+        if not batch:
+            return 0, 0, 0
+
+        ids = [row[0] for row in batch]
+        referenced = _live_references([row[1] for row in batch if row[1]], ids)
+
+        Extraction.objects.filter(id__in=ids).update(
+            status=Extraction.Status.EXPIRED,
+            file_path='',
+        )
+
+    sizes = {file_path: file_size or 0 for _, file_path, file_size in batch if file_path}
+    reclaimed = 0
+    for file_path, size in sizes.items():
+        if file_path not in referenced and remove_extraction_file(file_path):
+            reclaimed += size
+
+    released = sum(file_size or 0 for _, file_path, file_size in batch if file_path)
+    return len(batch), reclaimed, released
+
+
+def enforce_storage_policy(now=None):
+    """
+    Apply the TTL and byte budget to completed extraction files.
+
+    Files not accessed within ``EXTRACTION_FILE_TTL`` seconds are expired first.
+    If usage is still above ``EXTRACTION_STORAGE_BUDGET_BYTES``, the least
+    recently accessed files are expired in batches until usage drops below
+    the low watermark. Usage is summed over the table only once.
+    """
+    now = now or timezone.now()
+    batch_size = settings.EXTRACTION_EVICTION_BATCH_SIZE
+    completed = Extraction.objects.filter(status=Extraction.Status.COMPLETED)
+    stats = {'ttl_expired': 0, 'budget_expired': 0, 'bytes_reclaimed': 0}
+
+    ttl_cutoff = now - timedelta(seconds=settings.EXTRACTION_FILE_TTL)
+    ttl_candidates = completed.filter(last_accessed_at__lt=ttl_cutoff).order_by('last_accessed_at')
+    while True:
+        expired, reclaimed, _ = expire_batch(ttl_candidates, now, batch_size)
+        if not expired:
+            break
+        stats['ttl_expired'] += expired
+        stats['bytes_reclaimed'] += reclaimed
+
+    budget = settings.EXTRACTION_STORAGE_BUDGET_BYTES
+    target = int(budget * settings.EXTRACTION_STORAGE_LOW_WATERMARK)
+    # Summed once; each batch then takes off the sizes of the rows it expired
+    usage = get_storage_usage()
+    if usage > budget:
+        lru_candidates = completed.order_by(F('last_accessed_at').asc(nulls_first=True), 'id')
+        while usage > target:
+            expired, reclaimed, released = expire_batch(lru_candidates, now, batch_size)
+            if not expired:
+                break
+            stats['budget_expired'] += expired
+            stats['bytes_reclaimed'] += reclaimed
+            usage -= released
+
+    stats['usage_bytes'] = usage
+    logger.info(
+        f"Storage lifecycle: expired {stats['ttl_expired']} by TTL and "
+        f"{stats['budget_expired']} by budget, reclaimed {stats['bytes_reclaimed']} bytes, "
+        f"usage now {usage}/{budget} bytes"
+    )
+    return stats
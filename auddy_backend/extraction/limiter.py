@@ -0,0 +1,218 @@
+import time
+import uuid
+import random
+import logging
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from auddy_backend.extraction.connections import get_redis
+from auddy_backend.extraction.exceptions import ExtractionCancelled, OriginBusyError
+from auddy_backend.extraction.sources import is_youtube_url
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'extraction:origin'
+
+# Take a connection slot and a request token for one origin, or say how long to wait.
+# KEYS: token bucket hash, lease sorted set
+# ARGV: now, tokens per second, burst, max concurrent leases, lease id, lease ttl
+# Returns 0 when acquired, otherwise the suggested wait in milliseconds.
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local rate, burst = tonumber(ARGV[2]), tonumber(ARGV[3])
+local limit, ttl = tonumber(ARGV[4]), tonumber(ARGV[6])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+if limit > 0 and redis.call('ZCARD', KEYS[2]) >= limit then
+    local first = redis.call('ZRANGE', KEYS[2], 0, 0, 'WITHSCORES')
+    return math.max(1, math.min(1000, math.ceil((tonumber(first[2]) - now) * 1000)))
+end
+
+local tokens, updated = burst, now
+if rate > 0 then
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    if state[1] then
+        tokens = math.min(burst, tonumber(state[1]) + (now - tonumber(state[2])) * rate)
+        updated = now
+    end
+    if tokens < 1 then
+        return math.ceil((1 - tokens) / rate * 1000)
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens - 1, 'updated', updated)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+end
+
+redis.call('ZADD', KEYS[2], now + ttl, ARGV[5])
+redis.call('EXPIRE', KEYS[2], ttl + 60)
+return 0
+"""
+
+
+def origin_of(url):
+    """
+    Return the configured origin ``url`` counts against.
+
+    Hosts are matched against ``EXTRACTION_ORIGIN_LIMITS`` by domain suffix,
+    so ``www.youtube.com`` and ``m.youtube.com`` share ``youtube.com``; other
+    hosts are limited on their own with the ``default`` limits.
+    """
+    host = (urlparse(url).hostname or '').lower()
+    for origin in settings.EXTRACTION_ORIGIN_LIMITS:
+        if host == origin or host.endswith(f".{origin}"):
+            return origin
+    return host or 'unknown'
+
+
+def origins_for(url):
+    """
+    Return every origin fetching ``url`` touches.
+
+    YouTube pages are served by youtube.com but the media itself by
+    googlevideo.com, and both throttle.
+    """
+    if is_youtube_url(url):
+        return ['youtube.com', 'googlevideo.com']
+    return [origin_of(url)]
+
+
+def limits_for(origin):
+    return settings.EXTRACTION_ORIGIN_LIMITS.get(origin, settings.EXTRACTION_ORIGIN_LIMITS['default'])
+
+
+def bandwidth_share(origin):
+    """
+    Return the bytes per second one transfer from ``origin`` may use, or None if unshaped.
+
+    The origin's ``bandwidth`` is split evenly between its concurrent
+    connections, so the fleet as a whole stays under it.
+    """
+    limits = limits_for(origin)
+    if not limits.get('bandwidth') or not limits.get('concurrency'):
+        return None
+    return max(1, limits['bandwidth'] // limits['concurrency'])
+
+
+class OriginLimiter:
+    """
+    Fleet-wide per-origin limits kept in Redis.
+
+    Each origin has a token bucket refilled at ``rate`` requests per second
+    up to ``burst``, and at most ``concurrency`` leases held at once. Leases
+    expire after ``EXTRACTION_ORIGIN_LEASE_TTL`` seconds unless renewed, so a
+    worker that dies holding one does not leak the slot.
+    """
+
+    def __init__(self, connection=None, prefix=KEY_PREFIX):
+        self.redis = connection or get_redis()
+        self.prefix = prefix
+        self._acquire = self.redis.register_script(ACQUIRE_SCRIPT)
+
+    def keys(self, origin):
+        return [f"{self.prefix}:{origin}:bucket", f"{self.prefix}:{origin}:leases"]
+
+    def try_acquire(self, origin, lease_id):
+        """Take a slot for ``lease_id``. Returns 0 on success, otherwise the seconds to wait before trying again."""
+        limits = limits_for(origin)
+        wait = self._acquire(keys=self.keys(origin), args=[
+            time.time(),
+            limits.get('rate', 0),
+            limits.get('burst', 1),
+            limits.get('concurrency', 0),
+            lease_id,
+            settings.EXTRACTION_ORIGIN_LEASE_TTL,
+        ])
+        return int(wait) / 1000
+
+    def renew(self, origin, lease_id):
+        """Push back the expiry of a lease that is still in use."""
+        self.redis.zadd(self.keys(origin)[1], {lease_id: time.time() + settings.EXTRACTION_ORIGIN_LEASE_TTL}, xx=True)
+
+    def release(self, origin, lease_id):
+        self.redis.zrem(self.keys(origin)[1], lease_id)
+
+
+class OriginSlot:
+    """Leases held on a set of origins, renewed while the transfer using them makes progress."""
+
+    def __init__(self, limiter, leases):
+        self.limiter = limiter
+        self.leases = leases
+        self.renewed = time.monotonic()
+
+    def renew(self):
+        """Renew the leases, at most every third of their TTL."""
+        if not self.limiter or time.monotonic() - self.renewed < settings.EXTRACTION_ORIGIN_LEASE_TTL / 3:
+            return
+        self.renewed = time.monotonic()
+        try:
+            for origin, lease_id in self.leases:
+                self.limiter.renew(origin, lease_id)
+        except RedisError as e:
+            logger.warning(f"Unable to renew origin leases: {str(e)}")
+
+    def watch(self, should_cancel=None):
+        """Wrap ``should_cancel`` so that polling it also keeps the leases alive."""
+        def check():
+            self.renew()
+            return bool(should_cancel and should_cancel())
+        return check
+
+
+@contextmanager
+def origin_slot(url, should_cancel=None, timeout=None):
+    """
+    Hold a connection slot and request token on every origin of ``url`` for the duration of the block.
+
+    Waits with jitter while the origin is at its limits, for up to
+    ``EXTRACTION_ORIGIN_WAIT_TIMEOUT`` seconds, then raises
+    ``OriginBusyError`` so the task backs off and retries later instead of
+    tying up the worker. When Redis is unavailable, or ``url`` is None, the
+    block runs unlimited.
+    """
+    timeout = settings.EXTRACTION_ORIGIN_WAIT_TIMEOUT if timeout is None else timeout
+    if url is None or not settings.EXTRACTION_ORIGIN_LIMITS_ENABLED:
+        yield OriginSlot(None, [])
+        return
+
+    limiter, leases = None, []
+    try:
+        limiter = OriginLimiter()
+        deadline = time.monotonic() + timeout
+        for origin in origins_for(url):
+            lease_id = uuid.uuid4().hex
+            while True:
+                wait = limiter.try_acquire(origin, lease_id)
+                if not wait:
+                    leases.append((origin, lease_id))
+                    break
+                if should_cancel and should_cancel():
+                    raise ExtractionCancelled("Cancelled while waiting for a connection slot")
+                if time.monotonic() + wait > deadline:
+                    raise OriginBusyError(f"Too many requests in flight to {origin}", retry_after=wait)
+                # Jitter keeps waiting workers from retrying in lockstep
+                time.sleep(wait * random.uniform(1, 1.5))  # noqa: S311
+    except RedisError as e:
+        logger.warning(f"Origin limiter unavailable, continuing without limits: {str(e)}")
+        # Slots taken before the error would otherwise stay taken until their leases expire
+        release_leases(limiter, leases)
+        limiter, leases = None, []
+    except BaseException:
+        release_leases(limiter, leases)
+        raise
+
+    try:
+        yield OriginSlot(limiter, leases)
+    finally:
+        release_leases(limiter, leases)
+
+
+def release_leases(limiter, leases):
+    """Release ``leases``, leaving any Redis can't release to expire."""
+    for origin, lease_id in leases:
+        try:
+            limiter.release(origin, lease_id)
+        except RedisError as e:
+            logger.warning(f"Unable to release {origin} lease, it will expire: {str(e)}")
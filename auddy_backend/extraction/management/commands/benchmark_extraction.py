@@ -0,0 +1,399 @@
+import os
+import re
+import json
+import time
+import shutil
+import platform
+import statistics
+import subprocess
+import multiprocessing
+from threading import Thread
+from contextlib import ExitStack
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from functools import partial
+
+from django.db import DatabaseError, connections, transaction
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from auddy_backend.extraction.models import Extraction
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+# Synthetic sources: container, then the video and audio encoder arguments. Video is
+# kept small, since the pipeline only demuxes it, but is there so every demuxer has
+# to skip over real video packets.
+FIXTURES = {
+    'mp4-h264-aac': (
+        'mp4',
+        ['-c:v', 'libx264', '-preset', 'ultrafast'],
+        ['-c:a', 'aac', '-movflags', '+faststart'],
+    ),
+    'webm-vp9-opus': (
+        'webm',
+        ['-c:v', 'libvpx-vp9', '-deadline', 'realtime', '-cpu-used', '8'],
+        ['-c:a', 'libopus'],
+    ),
+    'mkv-h264-flac': (
+        'mkv',
+        ['-c:v', 'libx264', '-preset', 'ultrafast'],
+        ['-c:a', 'flac'],
+    ),
+    'mov-mpeg4-pcm': ('mov', ['-c:v', 'mpeg4'], ['-c:a', 'pcm_s16le']),
+    'avi-mjpeg-mp3': ('avi', ['-c:v', 'mjpeg', '-q:v', '10'], ['-c:a', 'libmp3lame']),
+}
+# Everything the pipeline would otherwise reach Redis or the network for
+HERMETIC_SETTINGS = {
+    'CACHES': {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    },
+    'EXTRACTION_SCHEDULER_ENABLED': False,
+    'EXTRACTION_ASYNC_DOWNLOADS': False,
+    'EXTRACTION_ORIGIN_LIMITS_ENABLED': False,
+    'EXTRACTION_BREAKER_ENABLED': False,
+    'EXTRACTION_NEGATIVE_CACHE_TTL': 0,
+    'EXTRACTION_ETA_LEARNING': False,
+    'EXTRACTION_TRACE_EXPORTER': '',
+    'EXTRACTION_PROFILING_SAMPLE_RATE': 0,
+    # The fixtures are served from localhost
+    'EXTRACTION_PREFLIGHT_ALLOW_PRIVATE_HOSTS': True,
+}
+RANGE = re.compile(r'^bytes=(\d+)-(\d*)$')
+BASELINE_VERSION = 1
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """Serve fixtures quietly, honouring single byte ranges like real source hosts."""
+
+    remaining = None
+
+    def send_head(self):
+        match = RANGE.match(self.headers.get('Range', ''))
+        if not match:
+            return super().send_head()
+        with ExitStack() as stack:
+            try:
+                f = stack.enter_context(open(self.translate_path(self.path), 'rb'))
+            except OSError:
+                self.send_error(404)
+                return None
+            size = os.fstat(f.fileno()).st_size
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{size}")
+                self.end_headers()
+                return None
+            f.seek(start)
+            self.remaining = end - start + 1
+            self.send_response(206)
+            self.send_header('Content-Type', self.guess_type(self.path))
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+            self.send_header('Content-Length', str(self.remaining))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.end_headers()
+            # Handed over to do_GET, which copies and closes it
+            stack.pop_all()
+            return f
+
+    def copyfile(self, source, outputfile):
+        if self.remaining is None:
+            return super().copyfile(source, outputfile)
+        while self.remaining > 0:
+            chunk = source.read(min(64 * 1024, self.remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            self.remaining -= len(chunk)
+        return None
+
+    def log_message(self, *args):
+        pass
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # ffprobe and the pre-flight check hang up once they have read enough
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Run extract_audio end to end on synthetic media served over local HTTP, "
+        "and record throughput, per-stage latency and peak RSS per fixture and "
+        "format as a JSON baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fixtures', nargs='+', choices=sorted(FIXTURES), default=sorted(FIXTURES),
+            help="Containers and codecs of the synthetic sources",
+        )
+        parser.add_argument(
+            '--durations', type=int, nargs='+', default=[60],
+            help="Seconds of media per source",
+        )
+        parser.add_argument(
+            '--formats', nargs='+',
+            choices=Extraction.Format.values, default=Extraction.Format.values,
+            help="Audio formats to extract",
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help="Runs per case; the median is recorded",
+        )
+        parser.add_argument(
+            '--fixtures-dir',
+            help="Keep generated sources here and reuse them on later runs",
+        )
+        parser.add_argument(
+            '--output', default='extraction-benchmark.json',
+            help="Where to write the results",
+        )
+        parser.add_argument(
+            '--baseline',
+            help="Compare against the results of an earlier run",
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help=(
+                "Slowdown or memory growth against the baseline reported as a "
+                "regression (0.25 is 25%%)"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if not shutil.which('ffmpeg'):
+            raise CommandError("ffmpeg is needed to generate the synthetic sources")
+
+        fixtures_dir = options['fixtures_dir']
+        fixtures_dir = fixtures_dir or os.path.join(os.getcwd(), '.benchmark-fixtures')
+        os.makedirs(fixtures_dir, exist_ok=True)
+        sources = {}
+        for name in options['fixtures']:
+            for duration in options['durations']:
+                path = self.generate_source(fixtures_dir, name, duration)
+                sources[(name, duration)] = path
+
+        handler = partial(FixtureHandler, directory=fixtures_dir)
+        server = FixtureServer(('127.0.0.1', 0), handler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        results = []
+        try:
+            for (name, duration), path in sources.items():
+                for audio_format in options['formats']:
+                    url = f"{base_url}/{os.path.basename(path)}"
+                    runs = [
+                        run_case(url, audio_format) for _ in range(options['repeat'])
+                    ]
+                    size = os.path.getsize(path)
+                    result = summarize(name, duration, audio_format, size, runs)
+                    results.append(result)
+                    self.report(result)
+        finally:
+            server.shutdown()
+
+        baseline = {
+            'version': BASELINE_VERSION,
+            'created': timezone.now().isoformat(),
+            'environment': environment(),
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(baseline, f, indent=2)
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}"),
+        )
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                previous = json.load(f)
+            regressions = find_regressions(previous, baseline, options['tolerance'])
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            if regressions:
+                raise CommandError(
+                    f"{len(regressions)} regressions against {options['baseline']}",
+                )
+            self.stdout.write(
+                self.style.SUCCESS(f"No regressions against {options['baseline']}"),
+            )
+
+    def generate_source(self, fixtures_dir, name, duration):
+        """Render ``duration`` seconds of test media in the codecs of ``name``."""
+        container, video_args, audio_args = FIXTURES[name]
+        path = os.path.join(fixtures_dir, f"{name}-{duration}s.{container}")
+        # Muxers pick the container from the extension, so keep it on the partial file
+        partial_path = os.path.join(
+            fixtures_dir, f"{name}-{duration}s.part.{container}",
+        )
+        if os.path.exists(path):
+            return path
+        cmd = [
+            'ffmpeg', '-v', 'error',
+            '-f', 'lavfi', '-i', f"testsrc2=size=320x240:rate=25:duration={duration}",
+            '-f', 'lavfi',
+            '-i', f"sine=frequency=440:sample_rate=48000:duration={duration}",
+            *video_args, *audio_args, '-ac', '2', '-shortest',
+            '-y', partial_path,
+        ]
+        self.stdout.write(f"Generating {os.path.basename(path)}")
+        try:
+            subprocess.run(cmd, check=True, capture_output=True)
+        except (subprocess.CalledProcessError, OSError) as e:
+            raise CommandError(f"Unable to generate {name} with ffmpeg: {e}") from e
+        os.replace(partial_path, path)
+        return path
+
+    def report(self, result):
+        stages = '  '.join(
+            f"{stage} {seconds:.2f}s" for stage, seconds in result['stages'].items()
+        )
+        rss = result['peak_rss_kb'] // 1024
+        subprocess_rss = result['peak_subprocess_rss_kb'] // 1024
+        self.stdout.write(
+            f"{result['case']:<32} {result['wall_time']:7.2f}s  "
+            f"{result['realtime_factor']:6.1f}x realtime  "
+            f"rss {rss}M/{subprocess_rss}M  {stages}",
+        )
+
+
+def run_case(url, audio_format):
+    """
+    Extract ``url`` once in a forked process and return the measurements.
+
+    Forking gives the run a peak RSS of its own.
+    """
+    context = multiprocessing.get_context('fork')
+    receiver, sender = context.Pipe(duplex=False)
+    # The child must open its own database connection
+    connections.close_all()
+    process = context.Process(target=measure, args=(sender, url, audio_format))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = {'error': f"Benchmark process exited with code {process.exitcode}"}
+    process.join()
+    if 'error' in result:
+        raise CommandError(
+            f"Extracting {audio_format} from {url} failed: {result['error']}",
+        )
+    return result
+
+
+def measure(sender, url, audio_format):
+    from auddy_backend.extraction.tasks import extract_audio
+
+    try:
+        with override_settings(**HERMETIC_SETTINGS), transaction.atomic():
+            extraction = Extraction.objects.create(
+                source_url=url, audio_format=audio_format,
+            )
+            started = time.perf_counter()
+            extract_audio.apply(args=(extraction.id,), kwargs={'offload': False})
+            wall_time = time.perf_counter() - started
+            extraction.refresh_from_db()
+            if extraction.file_path:
+                output_dir = os.path.dirname(extraction.file_path)
+                shutil.rmtree(output_dir, ignore_errors=True)
+            # Leave nothing behind in the database
+            transaction.set_rollback(True)
+        if extraction.status != Extraction.Status.COMPLETED:
+            sender.send({'error': extraction.error_message or extraction.status})
+            return
+        sender.send({
+            'wall_time': wall_time,
+            'stages': (extraction.profile or {}).get('stages', {}),
+            'duration': extraction.duration,
+            'bytes_out': extraction.file_size,
+            # Kilobytes on Linux
+            'peak_rss_kb': peak_rss(resource.RUSAGE_SELF) if resource else 0,
+            'peak_subprocess_rss_kb': (
+                peak_rss(resource.RUSAGE_CHILDREN) if resource else 0
+            ),
+        })
+    except (DatabaseError, OSError) as e:
+        # Anything else ends the process with its traceback on stderr
+        sender.send({'error': f"{type(e).__name__}: {e}"})
+    finally:
+        sender.close()
+
+
+def peak_rss(who):
+    return resource.getrusage(who).ru_maxrss
+
+
+def summarize(name, duration, audio_format, size, runs):
+    """Reduce the runs of one case to medians, and the highest memory seen."""
+    wall_time = statistics.median(run['wall_time'] for run in runs)
+    stages = {
+        stage: round(statistics.median(run['stages'].get(stage, 0) for run in runs), 4)
+        for stage in runs[0]['stages']
+    }
+    return {
+        'case': f"{name}/{duration}s/{audio_format}",
+        'fixture': name,
+        'duration': duration,
+        'format': audio_format,
+        'runs': len(runs),
+        'source_bytes': size,
+        'output_bytes': runs[-1]['bytes_out'],
+        'wall_time': round(wall_time, 4),
+        'realtime_factor': round(duration / wall_time, 2),
+        'throughput_bytes_per_second': round(size / wall_time),
+        'stages': stages,
+        'peak_rss_kb': max(run['peak_rss_kb'] for run in runs),
+        'peak_subprocess_rss_kb': max(run['peak_subprocess_rss_kb'] for run in runs),
+    }
+
+
+def environment():
+    try:
+        version = subprocess.run(
+            ['ffmpeg', '-version'], check=False, capture_output=True, text=True,
+        )
+        ffmpeg = version.stdout.splitlines()[0]
+    except (OSError, IndexError):
+        ffmpeg = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'ffmpeg': ffmpeg,
+    }
+
+
+def find_regressions(previous, current, tolerance):
+    """
+    Describe every case of ``current`` slower than in ``previous`` beyond ``tolerance``.
+
+    Peak memory of the run and of its subprocesses is compared the same way.
+    """
+    if previous.get('version') != current['version']:
+        raise CommandError(
+            f"Baseline is version {previous.get('version')}, "
+            f"expected {current['version']}",
+        )
+    before = {result['case']: result for result in previous['results']}
+    regressions = []
+    for result in current['results']:
+        old = before.get(result['case'])
+        if old is None:
+            continue
+        regressions.extend(
+            f"{result['case']}: {metric} {old[metric]} -> {result[metric]} "
+            f"(+{result[metric] / old[metric] - 1:.0%})"
+            for metric in ('wall_time', 'peak_rss_kb', 'peak_subprocess_rss_kb')
+            if old[metric] and result[metric] > old[metric] * (1 + tolerance)
+        )
+    return regressions
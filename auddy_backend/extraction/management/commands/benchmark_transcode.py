@@ -0,0 +1,69 @@
+import os
+import time
+import tempfile
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auddy_backend.extraction.budget import probe_duration
+from auddy_backend.extraction.transcode import SEGMENTABLE, transcode_parallel, transcode_serial
+
+
+class Command(BaseCommand):
+    help = "Time serial against parallel segmented transcoding of a synthetic source for several worker counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=int, default=30 * 60, help="Seconds of synthetic audio to encode")
+        parser.add_argument('--format', default='mp3', choices=sorted(SEGMENTABLE), help="Output audio format")
+        parser.add_argument(
+            '--workers', type=int, nargs='+',
+            help="Worker counts to try (default: powers of two up to the number of cores)",
+        )
+        parser.add_argument('--source', help="Encode this file instead of a generated one")
+
+    def handle(self, *args, **options):
+        cores = os.cpu_count() or 1
+        workers = options['workers'] or sorted({2 ** n for n in range(1, cores.bit_length())} | {cores})
+        audio_format = options['format']
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            if options['source']:
+                source = options['source']
+                duration = probe_duration(source)
+                if not duration:
+                    raise CommandError(f"Unable to read the duration of {source}")
+            else:
+                duration = options['duration']
+                source = self.generate_source(work_dir, duration)
+            output = os.path.join(work_dir, f"out.{audio_format}")
+
+            baseline = self.timed(lambda: transcode_serial(source, output, audio_format))
+            self.stdout.write(f"serial      {baseline:8.2f}s")
+            for count in workers:
+                elapsed = self.timed(
+                    lambda count=count: transcode_parallel(source, output, audio_format, duration, workers=count)
+                )
+                self.stdout.write(f"{count:3d} workers {elapsed:8.2f}s  speedup {baseline / elapsed:5.2f}x")
+        self.stdout.write(self.style.SUCCESS(f"Encoded {duration:.0f}s of {audio_format} on {cores} cores"))
+
+    def generate_source(self, work_dir, duration):
+        """Render ``duration`` seconds of stereo test tones to a WAV file."""
+        path = os.path.join(work_dir, 'source.wav')
+        cmd = [
+            'ffmpeg', '-v', 'error',
+            '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=44100:duration={duration}",
+            '-f', 'lavfi', '-i', f"anoisesrc=color=pink:sample_rate=44100:amplitude=0.1:duration={duration}",
+            '-filter_complex', 'amerge=inputs=2',
+            '-y', path,
+        ]
+        try:
+            subprocess.run(cmd, check=True, capture_output=True)
+        except (subprocess.CalledProcessError, OSError) as e:
+            raise CommandError(f"Unable to generate a test source with ffmpeg: {e}") from e
+        return path
+
+    @staticmethod
+    def timed(func):
+        started = time.perf_counter()
+        func()
+        return time.perf_counter() - started
@@ -0,0 +1,17 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from auddy_backend.extraction.download_engine import DownloadEngine
+
+
+class Command(BaseCommand):
+    help = "Run the asyncio download engine that fetches extraction sources for the Celery workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, help="Transfers to run at once")
+        parser.add_argument('--chunk-size', type=int, help="Bytes buffered per transfer")
+
+    def handle(self, *args, **options):
+        engine = DownloadEngine(concurrency=options['concurrency'], chunk_size=options['chunk_size'])
+        asyncio.run(engine.serve())
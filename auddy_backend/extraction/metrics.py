@@ -0,0 +1,161 @@
+import os
+import time
+import hmac
+import logging
+
+from celery.signals import worker_process_shutdown, worker_ready
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+
+from auddy_backend.extraction.sources import resolve_source
+from auddy_backend.extraction.tracing import end_span, start_span
+
+logger = logging.getLogger(__name__)
+
+# Seconds, from sub-second cache hits to multi-hour encodes
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 14400)
+
+QUEUE_WAIT = Histogram(
+    'extraction_queue_wait_seconds',
+    "Time from submission until a worker first picks the extraction up",
+    ['platform', 'format'],
+    buckets=DURATION_BUCKETS,
+)
+STAGE_DURATION = Histogram(
+    'extraction_stage_duration_seconds',
+    "Time spent in each stage of an extraction run",
+    ['stage', 'platform', 'format'],
+    buckets=DURATION_BUCKETS,
+)
+BYTES = Counter(
+    'extraction_bytes',
+    "Bytes downloaded from sources (in) and written as extracted audio (out)",
+    ['direction', 'platform', 'format'],
+)
+ETA_ERROR = Histogram(
+    'extraction_eta_error_ratio',
+    "Relative error of the predicted run time of each finished extraction",
+    ['platform', 'format'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5),
+)
+COMPLETED = Counter('extraction_completed', "Extractions finished successfully", ['platform', 'format'])
+RETRIES = Counter('extraction_retries', "Extraction runs that failed and were scheduled again", ['platform', 'kind'])
+FAILURES = Counter('extraction_failures', "Extractions that failed for good, by error class", ['platform', 'kind'])
+
+
+def platform_label(url):
+    """Label ``url`` by platform only (youtube, google_drive, url), so series stay few whatever users submit."""
+    return resolve_source(url).platform
+
+
+class StageTimer:
+    """
+    Time one run of an extraction through its stages.
+
+    Stages follow one another: :meth:`enter` ends the current stage and
+    starts the next, and :meth:`finish` ends the last one. Each stage is
+    observed in ``STAGE_DURATION`` as it ends and its total kept in
+    ``durations``, and each runs in a span of the current trace.
+    ``details`` collects facts about the run, such as the encoder used, for
+    the execution profile.
+    """
+
+    def __init__(self, extraction):
+        self.platform = platform_label(extraction.source_url)
+        self.audio_format = extraction.audio_format
+        self.durations = {}
+        self.details = {}
+        self.bytes_in = 0
+        self.current = None
+        self.started = None
+        self.span = None
+
+    def enter(self, stage):
+        self.finish()
+        self.current, self.started = stage, time.monotonic()
+        self.span = start_span(f"stage {stage}", stage=stage)
+
+    def finish(self):
+        if self.current is None:
+            return
+        elapsed = time.monotonic() - self.started
+        self.durations[self.current] = self.durations.get(self.current, 0) + elapsed
+        STAGE_DURATION.labels(self.current, self.platform, self.audio_format).observe(elapsed)
+        end_span(self.span)
+        self.current = self.span = None
+
+    def fail(self, error):
+        """Mark the span of the current stage as failed with ``error``."""
+        if self.span is not None:
+            self.span.fail(error)
+
+    def note(self, **details):
+        self.details.update(details)
+
+    def downloaded(self, size):
+        """Count ``size`` bytes fetched from the source."""
+        if size:
+            self.bytes_in += size
+            BYTES.labels('in', self.platform, self.audio_format).inc(size)
+
+    def downloaded_file(self, path):
+        try:
+            self.downloaded(os.path.getsize(path))
+        except OSError:
+            pass
+
+
+def observe_queue_wait(extraction, seconds):
+    QUEUE_WAIT.labels(platform_label(extraction.source_url), extraction.audio_format).observe(max(0, seconds))
+
+
+def observe_completed(extraction, file_size):
+    platform = platform_label(extraction.source_url)
+    COMPLETED.labels(platform, extraction.audio_format).inc()
+    if file_size:
+        BYTES.labels('out', platform, extraction.audio_format).inc(file_size)
+
+
+def observe_failure(url, error, retrying):
+    (RETRIES if retrying else FAILURES).labels(platform_label(url), error.kind).inc()
+
+
+def metrics_registry():
+    """Return the registry to expose: the aggregate of every process when running multiprocess."""
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint of the web processes, behind a bearer token when one is configured."""
+    token = settings.EXTRACTION_METRICS_TOKEN
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(metrics_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+@worker_ready.connect
+def start_worker_metrics_server(sender=None, **kwargs):
+    """Serve the metrics of all pool processes of a Celery worker on ``EXTRACTION_METRICS_PORT``."""
+    if settings.EXTRACTION_METRICS_PORT:
+        start_http_server(settings.EXTRACTION_METRICS_PORT, registry=metrics_registry())
+        logger.info(f"Serving worker metrics on port {settings.EXTRACTION_METRICS_PORT}")
+
+
+@worker_process_shutdown.connect
+def mark_worker_process_dead(pid=None, **kwargs):
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.8 on 2026-10-19 07:09
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_last_accessed_at(apps, schema_editor):
+    Extraction = apps.get_model('extraction', 'Extraction')
+    Extraction.objects.filter(
+        status='completed', last_accessed_at__isnull=True,
+    ).update(last_accessed_at=F('completed_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('extraction', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extraction',
+            name='last_accessed_at',
+            field=models.DateTimeField(blank=True, help_text='Set on completion and bumped on every download; drives LRU eviction.', null=True, verbose_name='Last Accessed At'),
+        ),
+        migrations.AlterField(
+            model_name='extraction',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed'), ('expired', 'Expired')], default='pending', max_length=20, verbose_name='Status'),
+        ),
+        migrations.AddIndex(
+            model_name='extraction',
+            index=models.Index(condition=models.Q(('status', 'completed')), fields=['last_accessed_at'], name='extraction_completed_lru_idx'),
+        ),
+        migrations.RunPython(backfill_last_accessed_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.8 on 2026-10-19 07:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('extraction', '0002_extraction_last_accessed_at_expired_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extraction',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Attempts'),
+        ),
+        migrations.AddField(
+            model_name='extraction',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Last sign of life from the worker processing this extraction.', null=True, verbose_name='Heartbeat At'),
+        ),
+        migrations.AddIndex(
+            model_name='extraction',
+            index=models.Index(condition=models.Q(('status', 'processing')), fields=['heartbeat_at'], name='extraction_processing_hb_idx'),
+        ),
+    ]
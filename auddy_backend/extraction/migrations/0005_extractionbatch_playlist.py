@@ -0,0 +1,43 @@
+# Generated by Django 5.1.8 on 2026-10-19 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('extraction', '0004_extraction_batch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractionbatch',
+            name='audio_format',
+            field=models.CharField(blank=True, max_length=10, verbose_name='Format'),
+        ),
+        migrations.AddField(
+            model_name='extractionbatch',
+            name='error_message',
+            field=models.TextField(blank=True, verbose_name='Error Message'),
+        ),
+        migrations.AddField(
+            model_name='extractionbatch',
+            name='expanded_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Expanded At'),
+        ),
+        migrations.AddField(
+            model_name='extractionbatch',
+            name='max_concurrency',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Maximum number of entries processed at once; empty means no cap.', null=True, verbose_name='Max Concurrency'),
+        ),
+        migrations.AddField(
+            model_name='extractionbatch',
+            name='source_url',
+            field=models.URLField(blank=True, max_length=2000, verbose_name='Playlist URL'),
+        ),
+        migrations.AddField(
+            model_name='extractionbatch',
+            name='title',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Title'),
+        ),
+    ]
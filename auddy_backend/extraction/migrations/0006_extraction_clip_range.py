@@ -0,0 +1,23 @@
+# Generated by Django 5.1.8 on 2026-10-19 07:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('extraction', '0005_extractionbatch_playlist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extraction',
+            name='clip_end',
+            field=models.FloatField(blank=True, null=True, verbose_name='Clip End (seconds)'),
+        ),
+        migrations.AddField(
+            model_name='extraction',
+            name='clip_start',
+            field=models.FloatField(blank=True, null=True, verbose_name='Clip Start (seconds)'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.8 on 2026-10-19 07:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('extraction', '0006_extraction_clip_range'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='extraction',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'processing'])), fields=['user'], name='extraction_active_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='extraction',
+            index=models.Index(fields=['completed_at'], name='extraction_completed_at_idx'),
+        ),
+    ]
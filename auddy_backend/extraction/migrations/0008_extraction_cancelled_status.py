@@ -0,0 +1,18 @@
+# Generated by Django 5.1.8 on 2026-10-19 07:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('extraction', '0007_extraction_admission_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='extraction',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed'), ('expired', 'Expired'), ('cancelled', 'Cancelled')], default='pending', max_length=20, verbose_name='Status'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.8 on 2026-10-19 07:45
+
+from django.db import migrations, models
+
+from auddy_backend.extraction.sources import source_key
+
+
+def backfill_source_key(apps, schema_editor):
+    Extraction = apps.get_model('extraction', 'Extraction')
+    batch = []
+    for extraction in Extraction.objects.filter(source_key='').only('id', 'source_url').iterator(chunk_size=2000):
+        extraction.source_key = source_key(extraction.source_url)
+        batch.append(extraction)
+        if len(batch) >= 2000:
+            Extraction.objects.bulk_update(batch, ['source_key'])
+            batch = []
+    Extraction.objects.bulk_update(batch, ['source_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('extraction', '0008_extraction_cancelled_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extraction',
+            name='source_key',
+            field=models.CharField(blank=True, db_index=True, help_text='Canonical platform:id of the source, shared by every link to the same media.', max_length=2048, verbose_name='Source Key'),
+        ),
+        migrations.RunPython(backfill_source_key, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.8 on 2026-10-19 07:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('extraction', '0009_extraction_source_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extraction',
+            name='profile',
+            field=models.JSONField(blank=True, help_text='Timings, bytes, encoder and worker of the run that finished the extraction.', null=True, verbose_name='Execution Profile'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.8 on 2026-10-19 08:00
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('extraction', '0010_extraction_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extraction',
+            name='profile_requested',
+            field=models.BooleanField(default=False, help_text='Run every attempt of this extraction under the sampling profiler.', verbose_name='Profile Requested'),
+        ),
+        migrations.CreateModel(
+            name='TaskProfile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False)),
+                ('public_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('modified', models.DateTimeField(auto_now=True, null=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('task_id', models.CharField(blank=True, max_length=255, verbose_name='Celery Task ID')),
+                ('retries', models.PositiveSmallIntegerField(default=0, verbose_name='Retries')),
+                ('state', models.CharField(blank=True, max_length=20, verbose_name='Task State')),
+                ('trigger', models.CharField(choices=[('sampled', 'Sampled'), ('requested', 'Requested')], max_length=10, verbose_name='Trigger')),
+                ('wall_time', models.FloatField(verbose_name='Wall Time (seconds)')),
+                ('cpu_time', models.FloatField(help_text='CPU time of the worker process, in Python and the libraries it calls.', verbose_name='Python CPU Time (seconds)')),
+                ('subprocess_time', models.FloatField(help_text='Summed over processes, so parallel encodes can exceed the wall time.', verbose_name='Subprocess Wall Time (seconds)')),
+                ('subprocess_cpu_time', models.FloatField(verbose_name='Subprocess CPU Time (seconds)')),
+                ('subprocesses', models.JSONField(blank=True, default=dict, verbose_name='Subprocesses')),
+                ('sample_count', models.PositiveIntegerField(default=0, verbose_name='Samples')),
+                ('sample_interval', models.FloatField(verbose_name='Sample Interval (seconds)')),
+                ('stacks', models.TextField(blank=True, help_text='Samples per Python stack, in the collapsed format flame graph tools read.', verbose_name='Collapsed Stacks')),
+                ('extraction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_profiles', to='extraction.extraction')),
+            ],
+            options={
+                'verbose_name': 'Task Profile',
+                'verbose_name_plural': 'Task Profiles',
+                'ordering': ['-created'],
+            },
+        ),
+    ]
@@ -4,6 +4,38 @@ from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 
 from auddy_backend.contrib.models import BaseModel
+from auddy_backend.extraction import sources
+
+
+class ExtractionBatch(BaseModel):
+    """A group of extractions submitted together, or expanded from a playlist or channel."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="extraction_batches",
+        null=True,
+        blank=True,
+    )
+    source_url = models.URLField(_("Playlist URL"), max_length=2000, blank=True)
+    title = models.CharField(_("Title"), max_length=255, blank=True)
+    audio_format = models.CharField(_("Format"), max_length=10, blank=True)
+    max_concurrency = models.PositiveSmallIntegerField(
+        _("Max Concurrency"),
+        null=True,
+        blank=True,
+        help_text=_("Maximum number of entries processed at once; empty means no cap."),
+    )
+    expanded_at = models.DateTimeField(_("Expanded At"), null=True, blank=True)
+    error_message = models.TextField(_("Error Message"), blank=True)
+
+    class Meta:
+        verbose_name = _("Extraction Batch")
+        verbose_name_plural = _("Extraction Batches")
+        ordering = ["-created"]
+
+    def __str__(self):
+        return str(self.public_id)
 
 
 class Extraction(BaseModel):
@@ -14,6 +46,8 @@ class Extraction(BaseModel):
         PROCESSING = "processing", _("Processing")
         COMPLETED = "completed", _("Completed")
         FAILED = "failed", _("Failed")
+        EXPIRED = "expired", _("Expired")
+        CANCELLED = "cancelled", _("Cancelled")
 
     class Format(models.TextChoices):
         MP3 = "mp3", _("MP3")
@@ -30,7 +64,21 @@ class Extraction(BaseModel):
         null=True,
         blank=True,
     )
+    batch = models.ForeignKey(
+        ExtractionBatch,
+        on_delete=models.SET_NULL,
+        related_name="extractions",
+        null=True,
+        blank=True,
+    )
     source_url = models.URLField(_("Source URL"), max_length=2000)
+    source_key = models.CharField(
+        _("Source Key"),
+        max_length=2048,
+        blank=True,
+        db_index=True,
+        help_text=_("Canonical platform:id of the source, shared by every link to the same media."),
+    )
     title = models.CharField(_("Title"), max_length=255, blank=True)
     audio_format = models.CharField(
         _("Format"),
@@ -44,20 +92,124 @@ class Extraction(BaseModel):
         choices=Status.choices,
         default=Status.PENDING,
     )
+    clip_start = models.FloatField(_("Clip Start (seconds)"), null=True, blank=True)
+    clip_end = models.FloatField(_("Clip End (seconds)"), null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     file_path = models.CharField(_("File Path"), max_length=255, blank=True)
     file_size = models.PositiveBigIntegerField(_("File Size"), null=True, blank=True)
     duration = models.PositiveIntegerField(_("Duration (seconds)"), null=True, blank=True)
     error_message = models.TextField(_("Error Message"), blank=True)
     task_id = models.CharField(_("Celery Task ID"), max_length=255, blank=True)
+    heartbeat_at = models.DateTimeField(
+        _("Heartbeat At"),
+        null=True,
+        blank=True,
+        help_text=_("Last sign of life from the worker processing this extraction."),
+    )
+    attempts = models.PositiveSmallIntegerField(_("Attempts"), default=0)
+    profile_requested = models.BooleanField(
+        _("Profile Requested"),
+        default=False,
+        help_text=_("Run every attempt of this extraction under the sampling profiler."),
+    )
+    profile = models.JSONField(
+        _("Execution Profile"),
+        null=True,
+        blank=True,
+        help_text=_("Timings, bytes, encoder and worker of the run that finished the extraction."),
+    )
+    last_accessed_at = models.DateTimeField(
+        _("Last Accessed At"),
+        null=True,
+        blank=True,
+        help_text=_("Set on completion and bumped on every download; drives LRU eviction."),
+    )
 
     class Meta:
         verbose_name = _("Extraction")
         verbose_name_plural = _("Extractions")
         ordering = ["-created"]
+        indexes = [
+            models.Index(
+                fields=["last_accessed_at"],
+                condition=models.Q(status="completed"),
+                name="extraction_completed_lru_idx",
+            ),
+            models.Index(
+                fields=["heartbeat_at"],
+                condition=models.Q(status="processing"),
+                name="extraction_processing_hb_idx",
+            ),
+            # Backlog depth, overall and per user, for admission control
+            models.Index(
+                fields=["user"],
+                condition=models.Q(status__in=["pending", "processing"]),
+                name="extraction_active_user_idx",
+            ),
+            models.Index(fields=["completed_at"], name="extraction_completed_at_idx"),
+        ]
 
     def __str__(self):
         return f"{self.title or self.source_url} ({self.audio_format})"
 
+    def save(self, *args, **kwargs):
+        if self.source_url and not self.source_key:
+            self.source_key = sources.source_key(self.source_url)
+        super().save(*args, **kwargs)
+
+    @property
+    def is_clip(self):
+        """Whether only part of the source was requested."""
+        return self.clip_start is not None or self.clip_end is not None
+
     def get_absolute_url(self):
-        return reverse("extraction:detail", kwargs={"id": self.id}) 
+        return reverse("extraction:detail", kwargs={"id": self.id})
+
+
+class TaskProfile(BaseModel):
+    """A sampling profile of one run of an extraction task."""
+
+    class Trigger(models.TextChoices):
+        SAMPLED = "sampled", _("Sampled")
+        REQUESTED = "requested", _("Requested")
+
+    extraction = models.ForeignKey(Extraction, on_delete=models.CASCADE, related_name="task_profiles")
+    task_id = models.CharField(_("Celery Task ID"), max_length=255, blank=True)
+    retries = models.PositiveSmallIntegerField(_("Retries"), default=0)
+    state = models.CharField(_("Task State"), max_length=20, blank=True)
+    trigger = models.CharField(_("Trigger"), max_length=10, choices=Trigger.choices)
+    wall_time = models.FloatField(_("Wall Time (seconds)"))
+    cpu_time = models.FloatField(
+        _("Python CPU Time (seconds)"),
+        help_text=_("CPU time of the worker process, in Python and the libraries it calls."),
+    )
+    subprocess_time = models.FloatField(
+        _("Subprocess Wall Time (seconds)"),
+        help_text=_("Summed over processes, so parallel encodes can exceed the wall time."),
+    )
+    subprocess_cpu_time = models.FloatField(_("Subprocess CPU Time (seconds)"))
+    subprocesses = models.JSONField(_("Subprocesses"), default=dict, blank=True)
+    sample_count = models.PositiveIntegerField(_("Samples"), default=0)
+    sample_interval = models.FloatField(_("Sample Interval (seconds)"))
+    stacks = models.TextField(
+        _("Collapsed Stacks"),
+        blank=True,
+        help_text=_("Samples per Python stack, in the collapsed format flame graph tools read."),
+    )
+
+    class Meta:
+        verbose_name = _("Task Profile")
+        verbose_name_plural = _("Task Profiles")
+        ordering = ["-created"]
+
+    def __str__(self):
+        return f"{self.extraction_id} ({self.trigger}, {self.created:%Y-%m-%d %H:%M})"
+
+    def hot_functions(self, limit=20):
+        """Return ``(function, samples)`` for the functions most often on top of the stack."""
+        counts = {}
+        for line in self.stacks.splitlines():
+            stack, samples = line.rsplit(' ', 1)
+            function = stack.rsplit(';', 1)[-1]
+            counts[function] = counts.get(function, 0) + int(samples)
+        return sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]
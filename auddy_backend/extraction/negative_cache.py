@@ -0,0 +1,42 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from auddy_backend.extraction.sources import source_key
+
+logger = logging.getLogger(__name__)
+
+BAD_SOURCE_CACHE_KEY = 'extraction:bad-source:{}'
+
+
+def bad_source_key(url):
+    # Keys embed arbitrary URLs, so hash them into a bounded cache key
+    return BAD_SOURCE_CACHE_KEY.format(hashlib.sha256(source_key(url).encode()).hexdigest())
+
+
+def remember_bad_source(url, error):
+    """
+    Remember that the source of ``url`` failed permanently with ``error``.
+
+    Only failures of the source itself are kept, such as private, removed,
+    region-locked or DRM-protected media, and only for
+    ``EXTRACTION_NEGATIVE_CACHE_TTL`` seconds, since some of them are lifted.
+    """
+    if not settings.EXTRACTION_NEGATIVE_CACHE_TTL or not error.cacheable:
+        return
+    cache.set(bad_source_key(url), {'kind': error.kind, 'reason': str(error)}, settings.EXTRACTION_NEGATIVE_CACHE_TTL)
+    logger.info(f"Remembering {source_key(url)} as unextractable ({error.kind})")
+
+
+def known_bad_source(url):
+    """Return the cached failure of the source of ``url`` as a dict with ``kind`` and ``reason``, or None."""
+    if not settings.EXTRACTION_NEGATIVE_CACHE_TTL:
+        return None
+    return cache.get(bad_source_key(url))
+
+
+def forget_bad_source(url):
+    """Drop the cached failure of the source of ``url``, e.g. once it has been made public again."""
+    cache.delete(bad_source_key(url))
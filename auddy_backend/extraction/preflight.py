@@ -0,0 +1,228 @@
+import socket
+import hashlib
+import logging
+import ipaddress
+from urllib.parse import urljoin, urlparse
+
+import requests
+import yt_dlp
+from django.conf import settings
+from django.core.cache import cache
+
+from auddy_backend.extraction.exceptions import (
+    ExtractionError,
+    LimitExceededError,
+    PermanentSourceError,
+    TransientNetworkError,
+    classify_exception,
+    raise_for_response,
+)
+from auddy_backend.extraction.sources import (
+    extract_google_drive_file_id,
+    is_google_drive_url,
+    is_youtube_url,
+    source_key,
+)
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the start of a direct source to sniff its container
+SNIFF_BYTES = 64
+# Redirects followed when probing a direct source, each target checked like the first
+MAX_REDIRECTS = 5
+# Told to callers for any source that can't be fetched, so the probe doesn't reveal what we can reach
+UNREACHABLE_MESSAGE = "Source is not reachable"
+
+# (offset, magic) pairs of containers and streams ffmpeg can pull audio from
+MEDIA_SIGNATURES = [
+    (4, b'ftyp'),                 # MP4, M4A, MOV, 3GP
+    (0, b'\x1a\x45\xdf\xa3'),     # Matroska, WebM
+    (0, b'OggS'),                 # Ogg, Opus
+    (0, b'fLaC'),                 # FLAC
+    (0, b'ID3'),                  # MP3 with ID3 tag
+    (0, b'FLV'),                  # Flash video
+    (0, b'\x30\x26\xb2\x75'),     # ASF, WMV, WMA
+    (0, b'\x00\x00\x01\xba'),     # MPEG program stream
+    (0, b'#EXTM3U'),              # HLS playlist
+    (0, b'.RMF'),                 # RealMedia
+    (0, b'caff'),                 # Core Audio
+    (0, b'FORM'),                 # AIFF
+]
+RIFF_MEDIA_TYPES = (b'WAVE', b'AVI ')
+TEXT_MARKERS = (b'<!doctype', b'<html', b'<?xml', b'{', b'%pdf', b'pk\x03\x04')
+MEDIA_CONTENT_TYPES = ('audio/', 'video/', 'application/ogg', 'application/mp4', 'application/vnd.apple.mpegurl',
+                       'application/x-mpegurl', 'application/dash+xml')
+
+
+def sniff_media(head):
+    """
+    Return True if ``head`` starts like a media file, False if it is clearly something else, None if unsure.
+    """
+    if not head:
+        return None
+    for offset, magic in MEDIA_SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return True
+    if head[:4] == b'RIFF' and head[8:12] in RIFF_MEDIA_TYPES:
+        return True
+    # Bare MPEG audio frame sync
+    if len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        return True
+    if head.lstrip().lower().startswith(TEXT_MARKERS):
+        return False
+    return None
+
+
+def get_youtube_info(url):
+    """
+    Return the title, duration, size and live status of a YouTube video.
+
+    Results are cached for ``EXTRACTION_PREFLIGHT_CACHE_TTL`` seconds, so the
+    create request and the worker share a single yt-dlp lookup.
+    """
+    cache_key = f"extraction:ytinfo:{hashlib.sha256(source_key(url).encode()).hexdigest()}"
+    info = cache.get(cache_key)
+    if info is None:
+        with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, 'format': 'bestaudio/best'}) as ydl:
+            raw = ydl.extract_info(url, download=False)
+        info = {
+            'title': raw.get('title', ''),
+            'duration': raw.get('duration') or 0,
+            'size': raw.get('filesize') or raw.get('filesize_approx'),
+            'is_live': bool(raw.get('is_live')) or raw.get('live_status') in ('is_live', 'is_upcoming'),
+        }
+        cache.set(cache_key, info, settings.EXTRACTION_PREFLIGHT_CACHE_TTL)
+    return info
+
+
+def is_public_address(address):
+    """Return True if ``address`` is a globally routable unicast IP address."""
+    ip = ipaddress.ip_address(address)
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def ensure_public_host(url):
+    """
+    Raise ``PermanentSourceError`` unless the host of ``url`` only resolves to public addresses.
+
+    Keeps user-supplied URLs from reaching loopback, private or link-local
+    services, such as cloud metadata endpoints, unless
+    ``EXTRACTION_PREFLIGHT_ALLOW_PRIVATE_HOSTS`` is on.
+    """
+    if settings.EXTRACTION_PREFLIGHT_ALLOW_PRIVATE_HOSTS:
+        return
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise PermanentSourceError(UNREACHABLE_MESSAGE, cacheable=False)
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, None, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError) as e:
+        raise TransientNetworkError(f"Unable to resolve {parsed.hostname}: {str(e)}") from e
+    if not all(is_public_address(address) for address in addresses):
+        logger.warning(f"Pre-flight refused {url}: {parsed.hostname} resolves to a non-public address")
+        raise PermanentSourceError(UNREACHABLE_MESSAGE, cacheable=False)
+
+
+def inspect_http_source(url):
+    """
+    Return the size, content type and sniffed media verdict of a URL without downloading it.
+
+    Asks for the first bytes only; servers that ignore the Range header are
+    cut off after the headers. Redirects are followed by hand so each target
+    goes through :func:`ensure_public_host`, and the source's own status is
+    only logged: callers just learn that it is not reachable.
+    """
+    headers = {'Range': f'bytes=0-{SNIFF_BYTES - 1}'}
+    for _ in range(MAX_REDIRECTS + 1):
+        ensure_public_host(url)
+        response = requests.get(
+            url, headers=headers, stream=True, allow_redirects=False, timeout=settings.EXTRACTION_PREFLIGHT_TIMEOUT,
+        )
+        if not response.is_redirect:
+            break
+        response.close()
+        url = urljoin(url, response.headers['Location'])
+    else:
+        raise PermanentSourceError(UNREACHABLE_MESSAGE, cacheable=False)
+
+    with response:
+        try:
+            raise_for_response(response, "Source")
+        except PermanentSourceError as e:
+            logger.info(f"Pre-flight of {url} failed: {str(e)}")
+            raise PermanentSourceError(UNREACHABLE_MESSAGE, cacheable=e.cacheable) from e
+        size = None
+        if response.status_code == 206 and '/' in response.headers.get('Content-Range', ''):
+            total = response.headers['Content-Range'].rsplit('/', 1)[1]
+            size = int(total) if total.isdigit() else None
+        elif response.headers.get('Content-Length', '').isdigit():
+            size = int(response.headers['Content-Length'])
+        head = next(response.iter_content(chunk_size=SNIFF_BYTES), b'')
+        return {
+            'size': size,
+            'content_type': response.headers.get('Content-Type', '').split(';')[0].strip().lower(),
+            'is_media': sniff_media(head[:SNIFF_BYTES]),
+        }
+
+
+def check_limits(duration=None, size=None):
+    """Raise ``LimitExceededError`` if a source exceeds the configured duration or size limits."""
+    if duration and duration > settings.EXTRACTION_MAX_SOURCE_DURATION:
+        raise LimitExceededError(
+            f"Source is {int(duration) // 60} minutes long; "
+            f"the limit is {settings.EXTRACTION_MAX_SOURCE_DURATION // 60} minutes"
+        )
+    if size and size > settings.EXTRACTION_MAX_SOURCE_BYTES:
+        raise LimitExceededError(
+            f"Source is {size / 1024**2:.0f} MB; "
+            f"the limit is {settings.EXTRACTION_MAX_SOURCE_BYTES / 1024**2:.0f} MB"
+        )
+
+
+def preflight(source_url, clip_start=None, clip_end=None):
+    """
+    Check a source against the limits before any of it is downloaded.
+
+    YouTube sources are looked up with yt-dlp (cached); direct and Google
+    Drive links are probed with a ranged request for their first bytes.
+    Clips are checked by their own length and are exempt from the size limit,
+    since only their range is fetched. Raises ``PermanentSourceError`` for a
+    source that can never be extracted and other ``ExtractionError``
+    subclasses when the source could not be reached. Returns what was
+    learnt: ``title``, ``duration`` and ``size``, each possibly None.
+    """
+    is_clip = clip_start is not None or clip_end is not None
+    try:
+        if is_youtube_url(source_url):
+            info = get_youtube_info(source_url)
+            if info['is_live']:
+                # The stream will be an ordinary video once it ends
+                raise PermanentSourceError("Live streams are not supported", cacheable=False)
+            result = {'title': info['title'], 'duration': info['duration'] or None, 'size': info['size']}
+        else:
+            url = source_url
+            if is_google_drive_url(source_url):
+                file_id = extract_google_drive_file_id(source_url)
+                if not file_id:
+                    raise PermanentSourceError("Invalid Google Drive URL")
+                url = f"https://drive.google.com/uc?export=download&id={file_id}"
+            inspected = inspect_http_source(url)
+            media_type = inspected['content_type'].startswith(MEDIA_CONTENT_TYPES)
+            # Drive answers large files with an HTML confirmation page, which says nothing about the file
+            if inspected['is_media'] is False and not media_type and not is_google_drive_url(source_url):
+                logger.info(f"Pre-flight of {source_url} found {inspected['content_type'] or 'an unknown type'}")
+                raise PermanentSourceError("Source does not look like audio or video")
+            size = inspected['size'] if inspected['is_media'] is not False else None
+            result = {'title': None, 'duration': None, 'size': size}
+    except ExtractionError:
+        raise
+    except Exception as e:
+        raise classify_exception(e, "Pre-flight check failed") from e
+
+    duration = result['duration']
+    if duration and is_clip:
+        duration = min(clip_end if clip_end is not None else duration, duration) - (clip_start or 0)
+    check_limits(duration=duration, size=None if is_clip else result['size'])
+    return result
@@ -0,0 +1,162 @@
+import sys
+import time
+import random
+import logging
+import threading
+from collections import Counter
+from contextvars import ContextVar
+
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+
+from auddy_backend.extraction.models import Extraction, TaskProfile
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Profile of the task running in this context, which subprocess runs are charged to
+active_profile = ContextVar('active_profile', default=None)
+# Profiles of the tasks running in this process, stored by the task_postrun handler
+task_profiles = {}
+
+
+class SamplingProfiler:
+    """
+    Sample the Python stack of one thread at a fixed interval from a background thread.
+
+    The profiled thread is never interrupted, so the overhead is one stack
+    walk every ``interval`` seconds. Stacks are counted in the collapsed
+    format flame graph tools read: frames from the root, separated by ``;``.
+    """
+
+    def __init__(self, thread_id=None, interval=None, max_depth=None):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval or settings.EXTRACTION_PROFILING_INTERVAL
+        self.max_depth = max_depth or settings.EXTRACTION_PROFILING_MAX_DEPTH
+        self.stacks = Counter()
+        self.stopping = threading.Event()
+        self.sampler = threading.Thread(target=self.sample, name='extraction-profiler', daemon=True)
+
+    def start(self):
+        self.sampler.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        self.sampler.join()
+
+    def sample(self):
+        while not self.stopping.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return '\n'.join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+class RunProfile:
+    """
+    Everything measured while one task run is profiled.
+
+    Python time is the CPU time of the worker process; subprocesses are
+    charged their wall time per program as they finish, plus the CPU time of
+    children reaped meanwhile.
+    """
+
+    def __init__(self, trigger):
+        self.trigger = trigger
+        self.lock = threading.Lock()
+        self.processes = {}
+        self.profiler = SamplingProfiler()
+        self.started = time.monotonic()
+        self.cpu_started = time.process_time()
+        self.children_started = children_cpu_time()
+
+    def record_process(self, name, seconds):
+        with self.lock:
+            entry = self.processes.setdefault(name, {'count': 0, 'seconds': 0.0})
+            entry['count'] += 1
+            entry['seconds'] += seconds
+
+    def finish(self):
+        self.profiler.stop()
+        return {
+            'trigger': self.trigger,
+            'wall_time': time.monotonic() - self.started,
+            'cpu_time': time.process_time() - self.cpu_started,
+            'subprocess_time': sum(entry['seconds'] for entry in self.processes.values()),
+            'subprocess_cpu_time': children_cpu_time() - self.children_started,
+            'subprocesses': {
+                name: {**entry, 'seconds': round(entry['seconds'], 3)} for name, entry in self.processes.items()
+            },
+            'sample_count': sum(self.profiler.stacks.values()),
+            'sample_interval': self.profiler.interval,
+            'stacks': self.profiler.collapsed(),
+        }
+
+
+def children_cpu_time():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def record_process(name, seconds):
+    """Charge ``seconds`` of wall time running ``name`` to the profile of the current task, if it is profiled."""
+    profile = active_profile.get()
+    if profile is not None:
+        profile.record_process(name, seconds)
+
+
+def profile_trigger(extraction_id):
+    """Return why a run of ``extraction_id`` is profiled: 'requested', 'sampled', or None if it isn't."""
+    if Extraction.objects.filter(id=extraction_id, profile_requested=True).exists():
+        return 'requested'
+    if random.random() < settings.EXTRACTION_PROFILING_SAMPLE_RATE:  # noqa: S311
+        return 'sampled'
+    return None
+
+
+@task_prerun.connect
+def start_task_profile(task_id=None, task=None, args=(), **kwargs):
+    """Run tasks declared with ``profiled=True`` under the sampling profiler when asked or sampled."""
+    if not getattr(task, 'profiled', False) or not args:
+        return
+    trigger = profile_trigger(args[0])
+    if trigger:
+        profile = RunProfile(trigger)
+        profile.token = active_profile.set(profile)
+        profile.profiler.start()
+        task_profiles[task_id] = (args[0], profile)
+
+
+@task_postrun.connect
+def store_task_profile(task_id=None, task=None, state=None, **kwargs):
+    extraction_id, profile = task_profiles.pop(task_id, (None, None))
+    if profile is None:
+        return
+    active_profile.reset(profile.token)
+    measurements = profile.finish()
+    try:
+        if Extraction.objects.filter(id=extraction_id).exists():
+            TaskProfile.objects.create(
+                extraction_id=extraction_id,
+                task_id=task_id,
+                retries=task.request.retries or 0,
+                state=state or '',
+                **measurements,
+            )
+    except Exception as e:
+        # Profiling must never fail the task it observes
+        logger.warning(f"Unable to store profile of extraction {extraction_id}: {str(e)}")
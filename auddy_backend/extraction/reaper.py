@@ -0,0 +1,298 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+from datetime import timedelta
+
+from celery import current_app
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from auddy_backend.extraction.connections import get_redis
+from auddy_backend.extraction.models import Extraction
+
+logger = logging.getLogger(__name__)
+
+# PENDING extractions found nowhere on the previous reaper run
+LOST_CANDIDATES_KEY = 'extraction:reaper:lost'
+# Hash where the Redis broker keeps messages delivered to a worker but not yet acknowledged
+BROKER_UNACKED_KEY = 'unacked'
+
+
+def get_live_task_ids(timeout=1.0):
+    """
+    Return the IDs of tasks currently active, reserved or waiting for their countdown on any worker.
+
+    Returns ``None`` when no worker replies, since an empty answer cannot be
+    told apart from a broker outage; callers then rely on heartbeats alone.
+    """
+    try:
+        inspect = current_app.control.inspect(timeout=timeout)
+        replies = [inspect.active(), inspect.reserved(), inspect.scheduled()]
+    except Exception as e:
+        logger.warning(f"Unable to inspect Celery workers: {str(e)}")
+        return None
+
+    if not any(replies):
+        return None
+
+    return {
+        # Scheduled entries wrap the task request
+        task.get('request', task)['id']
+        for reply in replies if reply
+        for tasks in reply.values()
+        for task in tasks
+    }
+
+
+def _message_task_id(raw, wrapped=False):
+    try:
+        message = json.loads(raw)
+        return (message[0] if wrapped else message)['headers']['id']
+    except (ValueError, TypeError, LookupError):
+        return None
+
+
+def get_queued_task_ids(connection, queues):
+    """
+    Return the IDs of tasks whose messages wait in the broker.
+
+    The broker is the extraction Redis: each of ``queues`` is a list of JSON
+    messages, and messages handed to a worker stay in the unacked hash until
+    the worker acknowledges them.
+    """
+    task_ids = {_message_task_id(message) for queue in queues for message in connection.lrange(queue, 0, -1)}
+    task_ids |= {_message_task_id(value, wrapped=True) for value in connection.hvals(BROKER_UNACKED_KEY)}
+    task_ids.discard(None)
+    return task_ids
+
+
+def reap_lost_pending(accounted_task_ids, waiting_ids, connection=None, now=None):
+    """
+    Return dispatched PENDING extractions that are no longer queued anywhere, to be dispatched again.
+
+    A dispatched extraction waits in the fair-share scheduler or the download
+    engine's queue (``waiting_ids``), or as a task message in the broker or on
+    a worker (``accounted_task_ids``). One older than
+    ``EXTRACTION_REAPER_GRACE`` and found in none of them on two reaper runs
+    in a row has been lost, for instance popped from the scheduler by a
+    publish that failed or flushed from the engine's queue. The second look keeps a job caught
+    moving from one place to the next from being dispatched twice. The
+    candidates are kept in the extraction Redis between runs, so whichever
+    worker runs the reaper next sees them. Returns ``(extraction_id, task_id)``
+    pairs.
+    """
+    cutoff = (now or timezone.now()) - timedelta(seconds=settings.EXTRACTION_REAPER_GRACE)
+    rows = (
+        Extraction.objects.filter(status=Extraction.Status.PENDING, created__lt=cutoff)
+        .exclude(task_id='')
+        .values_list('id', 'task_id')
+    )
+    missing = {
+        (extraction_id, task_id) for extraction_id, task_id in rows
+        if extraction_id not in waiting_ids and task_id not in accounted_task_ids
+    }
+    connection = connection or get_redis()
+    candidates = connection.get(LOST_CANDIDATES_KEY)
+    lost = missing & {tuple(candidate) for candidate in json.loads(candidates or '[]')}
+    # Candidates must turn up missing again before the next run or two
+    connection.set(LOST_CANDIDATES_KEY, json.dumps(sorted(missing - lost)), ex=settings.EXTRACTION_HEARTBEAT_TIMEOUT)
+
+    if lost:
+        logger.warning(f"Reaper: dispatching {len(lost)} lost PENDING extractions again")
+    return sorted(lost)
+
+
+def reap_stale_extractions(live_task_ids=None, now=None):
+    """
+    Requeue or fail PROCESSING extractions whose worker has gone away.
+
+    When the workers answered, a row is stale once it is past
+    ``EXTRACTION_REAPER_GRACE`` and its task is no longer active or reserved
+    on any of them; a live task is never reaped, however long it has been
+    quiet. Without ``live_task_ids`` the heartbeat is all there is, and rows
+    silent for ``EXTRACTION_HEARTBEAT_TIMEOUT`` are stale. Rows with attempts
+    left are reset to PENDING under the same task ID, so clients polling its
+    status keep tracking them; the rest are failed in one update.
+    Returns ``(requeued, failed, revoked)`` where ``requeued`` is a list of
+    ``(extraction_id, task_id)`` pairs the caller must dispatch and ``revoked``
+    lists the task IDs of the failed runs. Requeued runs can't be revoked,
+    since workers would discard their new dispatch under the same ID too.
+    """
+    now = now or timezone.now()
+    heartbeat_cutoff = now - timedelta(seconds=settings.EXTRACTION_HEARTBEAT_TIMEOUT)
+    grace_cutoff = now - timedelta(seconds=settings.EXTRACTION_REAPER_GRACE)
+
+    # Rows that never sent a heartbeat fall back to their last modification
+    if live_task_ids is None:
+        stale = Q(heartbeat_at__lt=heartbeat_cutoff) | Q(heartbeat_at__isnull=True, modified__lt=heartbeat_cutoff)
+    else:
+        quiet = Q(heartbeat_at__lt=grace_cutoff) | Q(heartbeat_at__isnull=True, modified__lt=grace_cutoff)
+        stale = quiet & ~Q(task_id__in=live_task_ids)
+
+    with transaction.atomic():
+        rows = list(
+            Extraction.objects.select_for_update(skip_locked=True)
+            .filter(stale, status=Extraction.Status.PROCESSING)
+            .only('id', 'task_id', 'attempts')
+        )
+        if not rows:
+            return [], 0, []
+
+        to_requeue = [row for row in rows if row.attempts < settings.EXTRACTION_REAPER_MAX_ATTEMPTS]
+        to_fail = [row.id for row in rows if row.attempts >= settings.EXTRACTION_REAPER_MAX_ATTEMPTS]
+        revoked = [row.task_id for row in rows if row.task_id and row.id in to_fail]
+
+        for row in to_requeue:
+            row.status = Extraction.Status.PENDING
+            # Rows queued before task IDs were assigned up front get one now
+            row.task_id = row.task_id or str(uuid.uuid4())
+            row.heartbeat_at = None
+        Extraction.objects.bulk_update(to_requeue, ['status', 'task_id', 'heartbeat_at'])
+
+        failed = Extraction.objects.filter(id__in=to_fail).update(
+            status=Extraction.Status.FAILED,
+            error_message="Extraction worker stopped responding",
+            heartbeat_at=None,
+        )
+
+    logger.info(f"Reaper: requeued {len(to_requeue)} and failed {failed} stale extractions")
+    return [(row.id, row.task_id) for row in to_requeue], failed, revoked
+
+
+def _owner_id(name):
+    """Return the extraction ID encoded as the leading ``<id>-`` of a scratch entry name."""
+    head = name.split('-', 1)[0]
+    return int(head) if head.isdigit() else None
+
+
+def sweep_orphan_scratch(scratch_dir, now=None):
+    """
+    Remove scratch entries left behind by dead workers.
+
+    Scratch directories are named ``<extraction id>-...``. An entry is removed
+    once it is older than ``EXTRACTION_ORPHAN_GRACE`` and its extraction is no
+    longer PROCESSING. Checkpoints of extractions waiting to be retried are
+    kept until ``EXTRACTION_CHECKPOINT_TTL``. Returns the number of entries removed.
+    """
+    if not os.path.isdir(scratch_dir):
+        return 0
+
+    now_ts = (now or timezone.now()).timestamp()
+    cutoff = now_ts - settings.EXTRACTION_ORPHAN_GRACE
+    checkpoint_cutoff = now_ts - settings.EXTRACTION_CHECKPOINT_TTL
+    candidates = {}
+    with os.scandir(scratch_dir) as entries:
+        for entry in entries:
+            try:
+                mtime = entry.stat(follow_symlinks=False).st_mtime
+            except FileNotFoundError:
+                continue
+            if mtime < cutoff:
+                candidates[entry.path] = (_owner_id(entry.name), mtime)
+
+    statuses = dict(
+        Extraction.objects.filter(
+            id__in={owner for owner, _ in candidates.values() if owner is not None},
+            status__in=[Extraction.Status.PROCESSING, Extraction.Status.PENDING],
+        ).values_list('id', 'status')
+    )
+
+    removed = 0
+    for path, (owner, mtime) in candidates.items():
+        status = statuses.get(owner)
+        if status == Extraction.Status.PROCESSING:
+            continue
+        if status == Extraction.Status.PENDING and mtime >= checkpoint_cutoff:
+            continue
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+        removed += 1
+
+    logger.info(f"Reaper: removed {removed} orphaned scratch entries from {scratch_dir}")
+    return removed
+
+
+def sweep_orphan_files(extraction_dir, now=None, batch_size=1000):
+    """
+    Remove output files under ``extraction_dir`` that no extraction references.
+
+    Outputs live in ``<extraction_dir>/<id>/``. Each directory is checked
+    against the ``file_path`` of its own row, so the sweep never loads the
+    whole table. Files younger than ``EXTRACTION_ORPHAN_GRACE`` are skipped
+    because the worker copies a file before recording its path.
+    Returns the number of files removed.
+    """
+    if not os.path.isdir(extraction_dir):
+        return 0
+
+    cutoff = (now or timezone.now()).timestamp() - settings.EXTRACTION_ORPHAN_GRACE
+    removed = 0
+
+    def sweep(batch):
+        nonlocal removed
+        referenced = dict(
+            Extraction.objects.filter(id__in=batch.keys())
+            .exclude(status=Extraction.Status.EXPIRED)
+            .values_list('id', 'file_path')
+        )
+        for owner, path in batch.items():
+            try:
+                files = list(os.scandir(path))
+            except OSError:
+                continue
+            for entry in files:
+                if entry.path == referenced.get(owner):
+                    continue
+                try:
+                    if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        removed += 1
+                except OSError:
+                    continue
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass
+
+    batch = {}
+    with os.scandir(extraction_dir) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False) and entry.name.isdigit():
+                batch[int(entry.name)] = entry.path
+            if len(batch) >= batch_size:
+                sweep(batch)
+                batch = {}
+    if batch:
+        sweep(batch)
+
+    logger.info(f"Reaper: removed {removed} orphaned output files from {extraction_dir}")
+    return removed
+
+
+def heartbeat(extraction_id, min_interval=0):
+    """
+    Return a callable that records a heartbeat for ``extraction_id``.
+
+    Calls within ``min_interval`` seconds of the previous write are dropped so
+    the callable can be used from chatty progress hooks.
+    """
+    last_beat = [None]
+
+    def beat():
+        current = time.monotonic()
+        if last_beat[0] is not None and current - last_beat[0] < min_interval:
+            return
+        last_beat[0] = current
+        Extraction.objects.filter(id=extraction_id).update(heartbeat_at=timezone.now())
+
+    return beat
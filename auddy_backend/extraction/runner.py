@@ -0,0 +1,186 @@
+import os
+import time
+import signal
+import logging
+import selectors
+import subprocess
+from collections import deque
+
+from django.conf import settings
+
+from auddy_backend.extraction.profiling import record_process
+from auddy_backend.extraction.tracing import span
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds between cancellation checks while a process is running
+POLL_INTERVAL = 0.25
+# Bytes read from a pipe at a time
+READ_SIZE = 65536
+# Seconds a process group gets to exit after SIGTERM before it is killed
+TERMINATE_GRACE = 1.0
+
+
+class ProcessCancelled(subprocess.SubprocessError):
+    """A running process was stopped because its work was cancelled."""
+
+    def __init__(self, cmd):
+        super().__init__(f"Command {cmd[0]!r} was cancelled")
+        self.cmd = cmd
+
+
+class ProgressParser:
+    """
+    Turn ffmpeg ``-progress`` output into percentages of ``duration`` seconds.
+
+    ffmpeg writes blocks of ``key=value`` lines ending in ``progress=continue``
+    or ``progress=end``; ``out_time_us`` is the position reached so far.
+    """
+
+    def __init__(self, duration, callback):
+        self.duration = duration
+        self.callback = callback
+        self.position = 0.0
+
+    def feed(self, line):
+        key, _, value = line.strip().partition('=')
+        if key in ('out_time_us', 'out_time_ms') and value.isdigit():
+            # Both are in microseconds; out_time_ms is misnamed
+            self.position = int(value) / 1_000_000
+        elif key == 'progress':
+            if value == 'end':
+                self.callback(100.0)
+            elif self.duration:
+                self.callback(min(99.9, 100 * self.position / self.duration))
+
+
+def with_progress(cmd):
+    """Return an ffmpeg command that reports progress on stdout instead of printing stats."""
+    return [cmd[0], '-progress', 'pipe:1', '-nostats', *cmd[1:]]
+
+
+def apply_limits(pid):
+    """Lower the priority of ``pid`` and cap its CPU time and memory, as configured."""
+    try:
+        if settings.EXTRACTION_PROCESS_NICE:
+            os.setpriority(os.PRIO_PROCESS, pid, settings.EXTRACTION_PROCESS_NICE)
+        if resource is not None and hasattr(resource, 'prlimit'):
+            if settings.EXTRACTION_PROCESS_MAX_MEMORY:
+                limit = settings.EXTRACTION_PROCESS_MAX_MEMORY
+                resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+            if settings.EXTRACTION_PROCESS_MAX_CPU_SECONDS:
+                limit = settings.EXTRACTION_PROCESS_MAX_CPU_SECONDS
+                resource.prlimit(pid, resource.RLIMIT_CPU, (limit, limit))
+    except (OSError, ValueError) as e:
+        # The process may already have exited; limits are best effort
+        logger.debug(f"Unable to apply resource limits to process {pid}: {str(e)}")
+
+
+def kill_group(process):
+    """Stop ``process`` and everything it spawned: SIGTERM first, SIGKILL after a short grace."""
+    if process.poll() is not None:
+        return
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=TERMINATE_GRACE)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+    except ProcessLookupError:
+        pass
+
+
+def run(cmd, timeout=None, duration=None, on_progress=None, should_cancel=None, check=True):
+    """
+    Run ``cmd`` and return its stdout as text.
+
+    stderr is streamed into a ring buffer of the last
+    ``EXTRACTION_PROCESS_STDERR_LINES`` lines, so a chatty ffmpeg can't grow
+    the worker's memory; the tail is attached to the ``CalledProcessError``
+    raised on failure. With ``on_progress`` the command must be ffmpeg: it is
+    asked for ``-progress`` output, which is parsed into percentages of
+    ``duration`` seconds. ``should_cancel`` is polled a few times a second
+    and stops the process with :class:`ProcessCancelled` once it returns
+    True. The process runs in its own session with lowered priority and
+    resource limits, and its whole process group is killed on timeout,
+    cancellation or any exception in the caller, including Celery's
+    ``SoftTimeLimitExceeded``.
+    """
+    name = os.path.basename(cmd[0])
+    started = time.monotonic()
+    try:
+        with span(f"exec {name}", command=name) as process_span:
+            return _run(cmd, process_span, timeout, duration, on_progress, should_cancel, check)
+    finally:
+        record_process(name, time.monotonic() - started)
+
+
+def _run(cmd, process_span, timeout, duration, on_progress, should_cancel, check):
+    if on_progress:
+        cmd = with_progress(cmd)
+    stderr_tail = deque(maxlen=settings.EXTRACTION_PROCESS_STDERR_LINES)
+    stdout = []
+    parser = ProgressParser(duration, on_progress) if on_progress else None
+    deadline = time.monotonic() + timeout if timeout else None
+
+    process = subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+    )
+    apply_limits(process.pid)
+    process_span.set(pid=process.pid)
+
+    def handle(stream, line):
+        line = line.decode('utf-8', errors='replace')
+        if stream == 'stderr':
+            stderr_tail.append(line)
+        elif parser:
+            parser.feed(line)
+        else:
+            stdout.append(line)
+
+    try:
+        pending = {'stdout': b'', 'stderr': b''}
+        with selectors.DefaultSelector() as selector:
+            selector.register(process.stdout, selectors.EVENT_READ, 'stdout')
+            selector.register(process.stderr, selectors.EVENT_READ, 'stderr')
+            while selector.get_map():
+                if deadline and time.monotonic() > deadline:
+                    raise subprocess.TimeoutExpired(cmd, timeout, stderr='\n'.join(stderr_tail))
+                if should_cancel and should_cancel():
+                    raise ProcessCancelled(cmd)
+                for key, _ in selector.select(timeout=POLL_INTERVAL):
+                    # Read what is there rather than a line: ffmpeg ends its stats lines with \r
+                    chunk = os.read(key.fileobj.fileno(), READ_SIZE)
+                    if not chunk:
+                        selector.unregister(key.fileobj)
+                        if pending[key.data]:
+                            handle(key.data, pending[key.data])
+                        continue
+                    *lines, pending[key.data] = (pending[key.data] + chunk).replace(b'\r', b'\n').split(b'\n')
+                    for line in lines:
+                        if line:
+                            handle(key.data, line)
+        returncode = process.wait(timeout=max(0, deadline - time.monotonic()) if deadline else None)
+    except BaseException:
+        kill_group(process)
+        raise
+    finally:
+        process.stdout.close()
+        process.stderr.close()
+
+    process_span.set(returncode=returncode)
+    if check and returncode:
+        # The tail of stderr is what explains a failed ffmpeg run
+        process_span.set(stderr='\n'.join(stderr_tail))
+        raise subprocess.CalledProcessError(returncode, cmd, output='\n'.join(stdout), stderr='\n'.join(stderr_tail))
+    return '\n'.join(stdout)
@@ -0,0 +1,198 @@
+import json
+import math
+import time
+import logging
+
+from django.conf import settings
+
+from auddy_backend.extraction.connections import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'extraction:sched'
+
+# Add jobs to one owner's queue and activate the owner at the current virtual time.
+# KEYS: active owners, job payloads, owner finish times, virtual clock
+# ARGV: queue key, owner, then (extraction id, priority, payload) triples
+ENQUEUE_SCRIPT = """
+for i = 3, #ARGV, 3 do
+    redis.call('ZADD', ARGV[1], ARGV[i + 1], ARGV[i])
+    redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 2])
+end
+if not redis.call('ZSCORE', KEYS[1], ARGV[2]) then
+    local clock = tonumber(redis.call('GET', KEYS[4]) or '0')
+    local finish = tonumber(redis.call('HGET', KEYS[3], ARGV[2]) or '0')
+    redis.call('ZADD', KEYS[1], math.max(clock, finish), ARGV[2])
+    redis.call('HDEL', KEYS[3], ARGV[2])
+end
+return redis.call('ZCARD', ARGV[1])
+"""
+
+# Pop up to ARGV[2] jobs, each from the owner with the lowest virtual start time.
+# KEYS: active owners, job payloads, owner finish times, virtual clock
+# ARGV: per-owner queue key prefix, job limit
+POP_SCRIPT = """
+local popped = {}
+for _ = 1, tonumber(ARGV[2]) do
+    local head = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    if #head == 0 then
+        break
+    end
+    local owner, start = head[1], tonumber(head[2])
+    local queue = ARGV[1] .. owner
+    local job = redis.call('ZPOPMIN', queue)
+    if #job == 0 then
+        redis.call('ZREM', KEYS[1], owner)
+    else
+        local payload = redis.call('HGET', KEYS[2], job[1])
+        redis.call('HDEL', KEYS[2], job[1])
+        if payload then
+            local finish = start + tonumber(cjson.decode(payload)['weighted_cost'])
+            redis.call('SET', KEYS[4], start)
+            if redis.call('ZCARD', queue) > 0 then
+                redis.call('ZADD', KEYS[1], finish, owner)
+            else
+                redis.call('ZREM', KEYS[1], owner)
+                redis.call('HSET', KEYS[3], owner, finish)
+            end
+            table.insert(popped, payload)
+        end
+    end
+end
+return popped
+"""
+
+
+def estimate_cost(duration):
+    """Return the expected cost of a job in seconds of media, falling back to a default when unknown."""
+    if not duration:
+        return settings.EXTRACTION_SCHEDULER_DEFAULT_COST
+    return max(float(duration), settings.EXTRACTION_SCHEDULER_MIN_COST)
+
+
+def job_priority(enqueued_at, cost):
+    """
+    Return the score ordering one owner's queue, lowest first.
+
+    Shorter jobs go first, but each second of expected cost only counts as
+    ``EXTRACTION_SCHEDULER_AGING_FACTOR`` seconds of waiting, so a long job
+    overtakes short ones submitted long enough after it.
+    """
+    return enqueued_at + cost * settings.EXTRACTION_SCHEDULER_AGING_FACTOR
+
+
+def percentile(samples, pct):
+    """Return the ``pct`` percentile of ``samples`` using the nearest-rank method."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class FairShareScheduler:
+    """
+    Fair-share queue of extractions waiting for the broker, kept in Redis.
+
+    Every owner (a user, an anonymous client or an anonymous batch) has its
+    own virtual queue ordered by :func:`job_priority`. Owners are served by
+    start-time fair queuing: each release charges the owner the job's cost
+    divided by its weight, and the owner with the lowest virtual time goes
+    next, so a user with hundreds of long jobs can't starve everyone else.
+    """
+
+    def __init__(self, connection=None, prefix=KEY_PREFIX):
+        self.redis = connection or get_redis()
+        self.prefix = prefix
+        self.keys = [f"{prefix}:owners", f"{prefix}:jobs", f"{prefix}:finish", f"{prefix}:clock"]
+        self._enqueue = self.redis.register_script(ENQUEUE_SCRIPT)
+        self._pop = self.redis.register_script(POP_SCRIPT)
+
+    def queue_key(self, owner):
+        return f"{self.prefix}:queue:{owner}"
+
+    def enqueue(self, owner, jobs, weight=1.0):
+        """
+        Queue ``jobs`` for ``owner``.
+
+        Each job is a dict with ``id``, ``task_id`` and ``duration``. Returns
+        the length of the owner's queue afterwards.
+        """
+        now = time.time()
+        args = [self.queue_key(owner), owner]
+        for job in jobs:
+            cost = estimate_cost(job.get('duration'))
+            payload = dict(job, owner=owner, enqueued_at=now, weighted_cost=cost / weight)
+            args += [str(job['id']), job_priority(now, cost), json.dumps(payload)]
+        return self._enqueue(keys=self.keys, args=args)
+
+    def pop(self, limit):
+        """Remove and return up to ``limit`` jobs in fair-share order, recording how long each waited."""
+        if limit <= 0:
+            return []
+        jobs = [json.loads(payload) for payload in self._pop(keys=self.keys, args=[f"{self.prefix}:queue:", limit])]
+        if jobs:
+            self.record_waits(jobs)
+        return jobs
+
+    def requeue(self, jobs):
+        """Put back popped ``jobs`` that could not be handed to the broker, each under its owner."""
+        by_owner = {}
+        for job in jobs:
+            by_owner.setdefault(job['owner'], []).append(
+                {key: job[key] for key in ('id', 'task_id', 'duration', 'traceparent') if key in job}
+            )
+        for owner, entries in by_owner.items():
+            self.enqueue(owner, entries)
+
+    def waiting_ids(self):
+        """Return the IDs of every extraction waiting in the scheduler."""
+        return {int(extraction_id) for extraction_id in self.redis.hkeys(self.keys[1])}
+
+    def discard(self, extraction_id):
+        """Drop a job that has not been released yet. Returns True if it was queued."""
+        payload = self.redis.hget(self.keys[1], str(extraction_id))
+        if payload is None:
+            return False
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.queue_key(json.loads(payload)['owner']), str(extraction_id))
+        pipe.hdel(self.keys[1], str(extraction_id))
+        return bool(pipe.execute()[1])
+
+    def pending(self):
+        """Return the number of jobs waiting across all owners."""
+        return self.redis.hlen(self.keys[1])
+
+    def record_waits(self, jobs):
+        """Append queue wait samples per owner and refresh each owner's p95."""
+        now = time.time()
+        samples = settings.EXTRACTION_SCHEDULER_WAIT_SAMPLES
+        waits = {}
+        for job in jobs:
+            waits.setdefault(job['owner'], []).append(now - job['enqueued_at'])
+
+        pipe = self.redis.pipeline()
+        for owner, values in waits.items():
+            key = f"{self.prefix}:waits:{owner}"
+            pipe.lpush(key, *values)
+            pipe.ltrim(key, 0, samples - 1)
+            pipe.expire(key, settings.EXTRACTION_SCHEDULER_WAIT_TTL)
+            pipe.lrange(key, 0, -1)
+        results = pipe.execute()
+
+        p95 = {}
+        for index, owner in enumerate(waits):
+            recent = [float(value) for value in results[index * 4 + 3]]
+            p95[owner] = percentile(recent, 95)
+        pipe = self.redis.pipeline()
+        pipe.hset(f"{self.prefix}:p95", mapping=p95)
+        pipe.expire(f"{self.prefix}:p95", settings.EXTRACTION_SCHEDULER_WAIT_TTL)
+        pipe.execute()
+        logger.info(f"Scheduler released {len(jobs)} jobs; p95 wait per owner: {p95}")
+
+    def wait_p95(self):
+        """Return the most recent p95 queue wait in seconds for every owner that has been served."""
+        return {
+            owner.decode(): float(value)
+            for owner, value in self.redis.hgetall(f"{self.prefix}:p95").items()
+        }
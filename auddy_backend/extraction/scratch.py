@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import shutil
+import logging
+
+from django.conf import settings
+
+from auddy_backend.extraction.models import Extraction
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = 'checkpoint.json'
+
+
+class Stage:
+    """Pipeline stages that can be checkpointed, in execution order."""
+
+    DOWNLOADED = 'downloaded'
+    TRANSCODED = 'transcoded'
+
+    ORDER = [DOWNLOADED, TRANSCODED]
+
+
+class ScratchSpace:
+    """
+    Persistent working directory for one extraction, kept across retries.
+
+    Completed stages are recorded in ``checkpoint.json`` together with the
+    artifact they produced, so a retry can pick up from the last stage whose
+    artifact is still on disk. Checkpoints older than
+    ``EXTRACTION_CHECKPOINT_TTL`` are discarded on load.
+    """
+
+    def __init__(self, root, extraction_id):
+        # The '<id>-' prefix lets the reaper attribute the directory to its extraction
+        self.path = os.path.join(root, f"{extraction_id}-work")
+        self.checkpoint_path = os.path.join(self.path, CHECKPOINT_FILE)
+        self.checkpoint = {}
+
+    def open(self):
+        """Create the directory if needed and load any still-valid checkpoint."""
+        os.makedirs(self.path, exist_ok=True)
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+        except (FileNotFoundError, ValueError):
+            checkpoint = {}
+
+        if checkpoint and time.time() - checkpoint.get('updated', 0) > settings.EXTRACTION_CHECKPOINT_TTL:
+            logger.info(f"Discarding expired checkpoint in {self.path}")
+            self.reset()
+            checkpoint = {}
+
+        self.checkpoint = checkpoint
+        return self
+
+    def path_for(self, name):
+        """Return the path of a file inside the scratch directory."""
+        return os.path.join(self.path, name)
+
+    def reached(self, stage):
+        """Return the artifact of ``stage`` if it or a later stage was completed and the artifact exists."""
+        artifact = self.checkpoint.get('artifacts', {}).get(stage)
+        completed = self.checkpoint.get('stage')
+        if not artifact or completed not in Stage.ORDER:
+            return None
+        if Stage.ORDER.index(completed) < Stage.ORDER.index(stage) or not os.path.exists(artifact):
+            return None
+        return artifact
+
+    @property
+    def metadata(self):
+        """Metadata saved alongside the checkpoint, such as title and duration."""
+        return self.checkpoint.setdefault('metadata', {})
+
+    def mark(self, stage, artifact, **metadata):
+        """Record ``stage`` as completed with ``artifact`` and persist the checkpoint atomically."""
+        self.checkpoint['stage'] = stage
+        self.checkpoint.setdefault('artifacts', {})[stage] = artifact
+        self.metadata.update(metadata)
+        self.checkpoint['updated'] = time.time()
+
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.checkpoint, f)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def reset(self):
+        """Remove every file in the scratch directory, keeping the directory itself."""
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path, exist_ok=True)
+        self.checkpoint = {}
+
+    def cleanup(self):
+        """Delete the scratch directory and its checkpoint."""
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.checkpoint = {}
+
+
+def _directory_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                continue
+    return total
+
+
+def enforce_scratch_budget(root, budget, keep=None, now=None):
+    """
+    Evict the oldest checkpoints under ``root`` until usage fits ``budget`` bytes.
+
+    Directories of extractions that are currently PROCESSING, and ``keep``,
+    are never evicted, nor are those of PENDING extractions younger than
+    ``EXTRACTION_CHECKPOINT_TTL``, which hold a download waiting for its
+    worker. Walks the whole tree, so the reaper runs it periodically rather
+    than every task. Returns the number of bytes freed.
+    """
+    if not os.path.isdir(root):
+        return 0
+
+    entries = []
+    with os.scandir(root) as scan:
+        for entry in scan:
+            if entry.is_dir(follow_symlinks=False):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path, entry.name.split('-', 1)[0]))
+                except FileNotFoundError:
+                    continue
+
+    sizes = {path: _directory_size(path) for _, path, _ in entries}
+    usage = sum(sizes.values())
+    if usage <= budget:
+        return 0
+
+    checkpoint_cutoff = (now or time.time()) - settings.EXTRACTION_CHECKPOINT_TTL
+    owners = {int(owner) for _, _, owner in entries if owner.isdigit()}
+    statuses = dict(
+        Extraction.objects.filter(
+            id__in=owners,
+            status__in=[Extraction.Status.PROCESSING, Extraction.Status.PENDING],
+        ).values_list('id', 'status')
+    )
+
+    freed = 0
+    for mtime, path, owner in sorted(entries):
+        if usage - freed <= budget:
+            break
+        status = statuses.get(int(owner)) if owner.isdigit() else None
+        if path == keep or status == Extraction.Status.PROCESSING:
+            continue
+        if status == Extraction.Status.PENDING and mtime >= checkpoint_cutoff:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        freed += sizes[path]
+
+    logger.info(f"Scratch budget: freed {freed} bytes, usage now {usage - freed}/{budget} bytes")
+    return freed
@@ -1,19 +1,111 @@
-from auddy_backend.extraction.models import Extraction
-from auddy_backend.extraction.tasks import extract_audio
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from auddy_backend.extraction.models import Extraction, ExtractionBatch
+from auddy_backend.extraction.sources import source_key
+from auddy_backend.extraction.tasks import cancel_extraction, expand_playlist, extraction_owner, submit_extractions
+from auddy_backend.extraction.tracing import current_traceparent, trace_options
 
 class ExtractionService:
     """Service for managing extraction requests."""
 
     @staticmethod
-    def initialize_extraction(data: dict) -> Extraction:
-        """Initialize an extraction request."""
-        extraction = Extraction.objects.create(**data)
+    def initialize_extraction(data: dict, user=None, address=None) -> Extraction:
+        """
+        Initialize an extraction request.
 
-        task = extract_audio.delay(str(extraction.id))
-        extraction.task_id = task.id
-        extraction.save(update_fields=['task_id'])
+        ``address`` identifies anonymous clients to the fair-share scheduler.
+        """
+        extraction = Extraction.objects.create(user=user, task_id=str(uuid.uuid4()), **data)
+        submit_extractions([extraction], owner=extraction_owner(extraction, address))
 
         return extraction
+
+    @staticmethod
+    def initialize_batch(items: list[dict], user=None) -> tuple[ExtractionBatch, list[Extraction]]:
+        """
+        Initialize a batch of extraction requests.
+
+        Task IDs are assigned up front so the rows are written with a single
+        ``bulk_create``, and the tasks are handed over together once the
+        transaction commits.
+        """
+        batch = ExtractionBatch.objects.create(user=user)
+        extractions = Extraction.objects.bulk_create([
+            # bulk_create skips save(), which fills in the source key
+            Extraction(
+                batch=batch, user=user, task_id=str(uuid.uuid4()), source_key=source_key(item['source_url']), **item,
+            )
+            for item in items
+        ])
+        submit_extractions(extractions)
+
+        return batch, extractions
+
+    @staticmethod
+    def initialize_playlist(data: dict, user=None) -> ExtractionBatch:
+        """
+        Initialize extraction of every entry in a playlist or channel.
+
+        The playlist is resolved in a worker, which creates one extraction per
+        entry under the returned batch and runs at most
+        ``EXTRACTION_PLAYLIST_CONCURRENCY`` of them at a time.
+        """
+        batch = ExtractionBatch.objects.create(
+            user=user,
+            source_url=data['source_url'],
+            audio_format=data.get('audio_format', Extraction.Format.MP3),
+            max_concurrency=settings.EXTRACTION_PLAYLIST_CONCURRENCY,
+        )
+        options = trace_options(current_traceparent())
+        transaction.on_commit(lambda: expand_playlist.apply_async((batch.id,), **options))
+        return batch
+
+    @staticmethod
+    def cancel_extraction(extraction: Extraction) -> bool:
+        """Cancel a queued or running extraction. Returns False if it had already finished."""
+        return cancel_extraction(extraction)
+
+    @staticmethod
+    def get_batch_status(batch_id) -> dict | None:
+        """Return per-status counts and progress for a batch using a single aggregate query."""
+        rows = list(
+            ExtractionBatch.objects.filter(public_id=batch_id)
+            .order_by()
+            .values('source_url', 'title', 'expanded_at', 'error_message', 'extractions__status')
+            .annotate(count=Count('extractions__id'))
+        )
+        if not rows:
+            return None
+
+        counts = {row['extractions__status']: row['count'] for row in rows if row['extractions__status']}
+        total = sum(counts.values())
+        done = sum(
+            counts.get(status, 0)
+            for status in (
+                Extraction.Status.COMPLETED,
+                Extraction.Status.FAILED,
+                Extraction.Status.EXPIRED,
+                Extraction.Status.CANCELLED,
+            )
+        )
+        batch = rows[0]
+        # Playlists have no entries until expansion finishes
+        expanding = bool(batch['source_url']) and not batch['expanded_at'] and not batch['error_message']
+        return {
+            'batch_id': str(batch_id),
+            'source_url': batch['source_url'],
+            'title': batch['title'],
+            'error_message': batch['error_message'],
+            'expanding': expanding,
+            'total': total,
+            'counts': {status: counts.get(status, 0) for status in Extraction.Status.values},
+            'progress': round(100 * done / total, 1) if total else 0.0,
+            'finished': not expanding and done == total,
+        }
     
     def get_extraction_status(self, extraction_id: str) -> Extraction:
         """Get the status of an extraction request."""
@@ -0,0 +1,118 @@
+import re
+import logging
+from typing import NamedTuple
+from urllib.parse import parse_qsl, urlencode, urlparse, parse_qs
+
+logger = logging.getLogger(__name__)
+
+# Matchers are compiled once; resolving a URL never touches the network
+YOUTUBE_HOST = re.compile(r'^(?:(?:www|m|music|gaming)\.)?youtube(?:-nocookie)?\.com$|^youtu\.be$')
+YOUTUBE_ID = r'([A-Za-z0-9_-]+)'
+YOUTUBE_VIDEO_PATH = re.compile(rf'^/(?:shorts|embed|live|v|e)/{YOUTUBE_ID}')
+YOUTUBE_SHORT_PATH = re.compile(rf'^/{YOUTUBE_ID}')
+YOUTUBE_CHANNEL_PATH = re.compile(r'^/((?:channel|c|user)/[^/]+|@[^/]+)')
+GOOGLE_DRIVE_HOST = re.compile(r'^(?:drive|docs)\.google\.com$')
+GOOGLE_DRIVE_FILE_PATH = re.compile(r'/(?:file/)?d/([A-Za-z0-9_-]+)')
+GOOGLE_DRIVE_ID_PATH = re.compile(r'/(?:open|uc)$')
+# Query parameters that never change what a direct link serves
+TRACKING_PARAMS = re.compile(r'^(?:utm_\w+|fbclid|gclid|mc_cid|mc_eid)$')
+
+
+class SourceKey(NamedTuple):
+    """What a submitted URL points at: the platform and the ID of the media on it."""
+
+    platform: str
+    stable_id: str
+
+    def __str__(self):
+        return f"{self.platform}:{self.stable_id}"
+
+
+def _hostname(parsed_url):
+    return (parsed_url.hostname or '').lower()
+
+
+def resolve_source(url):
+    """
+    Map ``url`` onto the ``SourceKey`` of the media it points at, without any network calls.
+
+    Every shape of YouTube link (``youtu.be``, ``watch?v=`` with any extra
+    parameters, ``m.``, ``music.``, ``/shorts/``, ``/embed/``) resolves to
+    the video ID, and playlists and channels to their own keys. Google Drive
+    links resolve to the file ID. Any other link is keyed by its lowercased
+    host, path and sorted query, without scheme, default port, fragment or
+    tracking parameters.
+    """
+    parsed_url = urlparse(url.strip())
+    host = _hostname(parsed_url)
+
+    if YOUTUBE_HOST.match(host):
+        query_params = parse_qs(parsed_url.query)
+        if host == 'youtu.be':
+            match = YOUTUBE_SHORT_PATH.match(parsed_url.path)
+            if match:
+                return SourceKey('youtube', match.group(1))
+        elif 'v' in query_params:
+            return SourceKey('youtube', query_params['v'][0])
+        elif match := YOUTUBE_VIDEO_PATH.match(parsed_url.path):
+            return SourceKey('youtube', match.group(1))
+        elif parsed_url.path.rstrip('/') == '/playlist' and 'list' in query_params:
+            return SourceKey('youtube_playlist', query_params['list'][0])
+        elif match := YOUTUBE_CHANNEL_PATH.match(parsed_url.path):
+            return SourceKey('youtube_channel', match.group(1).lower())
+
+    elif GOOGLE_DRIVE_HOST.match(host):
+        file_id = google_drive_file_id(parsed_url)
+        if file_id:
+            return SourceKey('google_drive', file_id)
+
+    try:
+        port = f":{parsed_url.port}" if parsed_url.port and parsed_url.port not in (80, 443) else ''
+    except ValueError:
+        port = ''
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parsed_url.query, keep_blank_values=True)
+        if not TRACKING_PARAMS.match(key)
+    ))
+    stable_id = f"{host}{port}{parsed_url.path or '/'}"
+    return SourceKey('url', f"{stable_id}?{query}" if query else stable_id)
+
+
+def source_key(url):
+    """Return the canonical key of ``url`` as stored in ``Extraction.source_key``."""
+    return str(resolve_source(url))
+
+
+def is_youtube_url(url):
+    """Check if a URL is from YouTube."""
+    return bool(YOUTUBE_HOST.match(_hostname(urlparse(url))))
+
+
+def is_youtube_playlist_url(url):
+    """Check if a YouTube URL points at a playlist or channel rather than a single video."""
+    return resolve_source(url).platform in ('youtube_playlist', 'youtube_channel')
+
+
+def is_google_drive_url(url):
+    """Check if a URL is from Google Drive."""
+    return bool(GOOGLE_DRIVE_HOST.match(_hostname(urlparse(url))))
+
+
+def google_drive_file_id(parsed_url):
+    # /file/d/{id}/view, /document/d/{id}/edit, /open?id={id} and /uc?id={id}
+    match = GOOGLE_DRIVE_FILE_PATH.search(parsed_url.path)
+    if match:
+        return match.group(1)
+    if GOOGLE_DRIVE_ID_PATH.search(parsed_url.path):
+        file_ids = parse_qs(parsed_url.query).get('id')
+        if file_ids:
+            return file_ids[0]
+    return None
+
+
+def extract_google_drive_file_id(url):
+    """Extract the file ID from a Google Drive URL."""
+    file_id = google_drive_file_id(urlparse(url))
+    if not file_id:
+        logger.error(f"Could not extract Google Drive file ID from URL: {url}")
+    return file_id
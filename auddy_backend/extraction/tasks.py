@@ -1,75 +1,84 @@
 import os
+import json
 import time
 import tempfile
 import shutil
 import subprocess
 import logging
-import re
-from urllib.parse import urlparse, parse_qs
+import uuid
+import random
+import socket
+from urllib.parse import urlparse
 from datetime import datetime
 
 import yt_dlp
 import requests
 from pydub import AudioSegment
-from celery import shared_task
+from celery import current_app, group, shared_task
+from kombu.exceptions import OperationalError
+from redis.exceptions import LockError, RedisError
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
 from django.utils import timezone
 
-from auddy_backend.extraction.models import Extraction
+from auddy_backend.extraction.models import Extraction, ExtractionBatch
+from auddy_backend.extraction.sources import (
+    extract_google_drive_file_id,
+    is_google_drive_url,
+    is_youtube_url,
+    source_key,
+)
+from auddy_backend.extraction.lifecycle import enforce_storage_policy
+from auddy_backend.extraction.admission import AdmissionRejected, check_admission
+from auddy_backend.extraction.cancellation import cancel_checker, is_cancelled, raise_if_cancelled, request_cancel
+from auddy_backend.extraction.budget import default_queue, dispatch_options, fits_budget, probe_duration
+from auddy_backend.extraction.breaker import check_platform, record_outcome
+from auddy_backend.extraction.connections import get_redis
+from auddy_backend.extraction.limiter import bandwidth_share, origin_of, origin_slot
+from auddy_backend.extraction.eta import PROGRESS_CACHE_KEY, mark_started, record_run
+from auddy_backend.extraction.metrics import StageTimer, observe_completed, observe_failure, observe_queue_wait
+from auddy_backend.extraction.negative_cache import remember_bad_source
+from auddy_backend.extraction.preflight import check_limits, get_youtube_info, preflight
+from auddy_backend.extraction.scheduler import KEY_PREFIX, FairShareScheduler
+from auddy_backend.extraction.runner import run
+from auddy_backend.extraction.transcode import encoder_name, transcode
+from auddy_backend.extraction.tracing import current_traceparent, trace_options
+from auddy_backend.extraction.exceptions import (
+    ExtractionCancelled,
+    InternalError,
+    PermanentSourceError,
+    PlatformUnavailableError,
+    RateLimitedError,
+    classify_curl_error,
+    classify_exception,
+    compute_retry_delay,
+    parse_retry_after,
+    raise_for_response,
+)
+from auddy_backend.extraction.scratch import ScratchSpace, Stage, enforce_scratch_budget
+from auddy_backend.extraction.reaper import (
+    get_live_task_ids,
+    get_queued_task_ids,
+    heartbeat,
+    reap_lost_pending,
+    reap_stale_extractions,
+    sweep_orphan_files,
+    sweep_orphan_scratch,
+)
 
 logger = logging.getLogger(__name__)
 
 # Configure media storage directory
 MEDIA_ROOT = getattr(settings, 'MEDIA_ROOT', os.path.join(settings.BASE_DIR, 'media'))
 EXTRACTION_DIR = os.path.join(MEDIA_ROOT, 'extractions')
-
-
-def is_youtube_url(url):
-    """Check if a URL is from YouTube."""
-    parsed_url = urlparse(url)
-    return ('youtube.com' in parsed_url.netloc or 
-            'youtu.be' in parsed_url.netloc or 
-            'youtube' in parsed_url.netloc)
-
-
-def is_google_drive_url(url):
-    """Check if a URL is from Google Drive."""
-    parsed_url = urlparse(url)
-    return ('drive.google.com' in parsed_url.netloc or
-            'docs.google.com' in parsed_url.netloc)
-
-
-def extract_google_drive_file_id(url):
-    """Extract the file ID from a Google Drive URL."""
-    parsed_url = urlparse(url)
-    
-    # Pattern 1: /file/d/{file_id}/
-    file_id_match = re.search(r'/file/d/([^/]+)', parsed_url.path)
-    if file_id_match:
-        return file_id_match.group(1)
-    
-    # Pattern 2: /open?id={file_id}
-    if 'open' in parsed_url.path:
-        query_params = parse_qs(parsed_url.query)
-        if 'id' in query_params:
-            return query_params['id'][0]
-    
-    # Pattern 3: /uc?id={file_id}
-    if 'uc' in parsed_url.path:
-        query_params = parse_qs(parsed_url.query)
-        if 'id' in query_params:
-            return query_params['id'][0]
-            
-    # Pattern 4: /view?usp=sharing
-    if 'view' in parsed_url.path:
-        # Extract from path for GDrive's sharing URLs
-        path_parts = parsed_url.path.split('/')
-        if len(path_parts) >= 3:
-            return path_parts[-2]
-    
-    # If no pattern matches, return None
-    logger.error(f"Could not extract Google Drive file ID from URL: {url}")
-    return None
+# Per-task working directories live here so the reaper can find leftovers
+SCRATCH_DIR = getattr(settings, 'EXTRACTION_SCRATCH_DIR', os.path.join(tempfile.gettempdir(), 'auddy-scratch'))
+# Seconds an ffprobe metadata lookup may take
+PROBE_TIMEOUT = 60
+# Redis list the download engine takes its jobs from
+DOWNLOAD_QUEUE_KEY = 'extraction:downloads'
 
 
 def create_directory_safely(directory_path):
@@ -92,8 +101,13 @@ def create_directory_safely(directory_path):
         return False
 
 
-def download_from_google_drive(file_id, output_path):
-    """Download a file from Google Drive."""
+def download_from_google_drive(file_id, output_path, should_cancel=None):
+    """
+    Download a file from Google Drive, resuming a partial download left by a previous attempt.
+
+    ``should_cancel`` is checked between chunks and stops the download with
+    ``ExtractionCancelled``.
+    """
     logger.info(f"Downloading Google Drive file: {file_id}")
     
     # First, get a download URL
@@ -112,19 +126,37 @@ def download_from_google_drive(file_id, output_path):
             url = f"https://drive.google.com/uc?export=download&confirm={token}&id={file_id}"
             break
     
+    # Ask only for the bytes we don't have yet
+    offset = os.path.getsize(output_path) if os.path.exists(output_path) else 0
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+
     # Download the file
-    response = session.get(url, stream=True)
+    response = session.get(url, stream=True, headers=headers)
+
+    if offset and response.status_code == 416:
+        # Range not satisfiable: the partial file is already complete
+        return offset
     
-    if response.status_code != 200:
+    if response.status_code not in (200, 206):
         logger.error(f"Failed to download Google Drive file: {response.status_code}")
-        raise Exception(f"Failed to download from Google Drive: HTTP {response.status_code}")
+        if response.status_code == 403:
+            # Google Drive answers 403 once a file's daily download quota is used up
+            raise RateLimitedError(
+                "Google Drive refused the download, its quota may be exceeded",
+                parse_retry_after(response.headers.get('Retry-After')),
+            )
+        raise_for_response(response, "Google Drive")
     
     # Make sure the directory exists
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     
-    # Save the file
-    with open(output_path, 'wb') as f:
+    # Append when the server honoured the range, otherwise start over
+    if response.status_code == 206:
+        logger.info(f"Resuming Google Drive download at byte {offset}")
+    with open(output_path, 'ab' if response.status_code == 206 else 'wb') as f:
         for chunk in response.iter_content(chunk_size=8192):
+            if should_cancel and should_cancel():
+                raise ExtractionCancelled("Google Drive download was cancelled")
             if chunk:
                 f.write(chunk)
     
@@ -132,90 +164,391 @@ def download_from_google_drive(file_id, output_path):
     return os.path.getsize(output_path)
 
 
-def get_video_info(url):
-    """Get video information using yt-dlp."""
-    with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
-        info = ydl.extract_info(url, download=False)
-        return {
-            'title': info.get('title', ''),
-            'duration': info.get('duration', 0),
-        }
-
+def get_playlist_entries(url, limit):
+    """
+    Resolve the entries of a playlist or channel without visiting each video.
 
-def extract_from_youtube(extraction, temp_dir):
-    """Extract audio from YouTube video."""
+    Uses yt-dlp flat extraction, which reads only the playlist pages, so the
+    cost is independent of how many videos are listed.
+    """
     ydl_opts = {
-        'format': 'bestaudio/best',
-        'outtmpl': os.path.join(temp_dir, '%(title)s.%(ext)s'),
         'quiet': True,
         'no_warnings': True,
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': extraction.audio_format,
-            'preferredquality': '192',
-        }],
-        'progress_hooks': [lambda d: logger.info(f"Progress: {d.get('status')}, {d.get('_percent_str', 'N/A')}")],
+        'extract_flat': 'in_playlist',
+        'playlistend': limit,
     }
-    
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(extraction.source_url, download=True)
-        extracted_file = None
-        
-        # Find the extracted audio file
-        for file in os.listdir(temp_dir):
-            if file.endswith(f".{extraction.audio_format}"):
-                extracted_file = os.path.join(temp_dir, file)
-                break
-        
-        if not extracted_file:
-            raise Exception("Failed to find extracted audio file")
-        
-        extraction.title = info.get('title', '')
-        extraction.duration = info.get('duration', 0)
-        
+        info = ydl.extract_info(url, download=False)
+
+    entries = []
+    for entry in info.get('entries') or []:
+        # Channel tabs nest playlists; only direct video entries are queued
+        if not entry or entry.get('_type') == 'playlist' or not entry.get('id'):
+            continue
+        entries.append({
+            'source_url': entry.get('url') if is_youtube_url(entry.get('url') or '')
+            else f"https://www.youtube.com/watch?v={entry['id']}",
+            'title': (entry.get('title') or '')[:255],
+            'duration': int(entry['duration']) if entry.get('duration') else None,
+        })
+    return info.get('title', ''), entries[:limit]
+
+
+def get_video_info(url):
+    """Get video information using yt-dlp, sharing the pre-flight cache."""
+    info = get_youtube_info(url)
+    return {
+        'title': info['title'],
+        'duration': info['duration'],
+    }
+
+
+def resolve_duration(extraction, scratch, info=None):
+    """
+    Return the seconds of media this run has to process, if they can be found cheaply.
+
+    Tries the clip range, a known duration, yt-dlp ``info``, a finished
+    download and finally an ffprobe of a direct link. Returns None once the
+    audio is already transcoded, since only finalizing is left.
+    """
+    if scratch.reached(Stage.TRANSCODED):
+        return None
+    if extraction.clip_end is not None:
+        return extraction.clip_end - (extraction.clip_start or 0)
+    if extraction.duration:
+        return extraction.duration
+    if info and info.get('duration'):
+        return info['duration']
+    downloaded = scratch.reached(Stage.DOWNLOADED)
+    if downloaded:
+        return probe_duration(downloaded)
+    if not is_youtube_url(extraction.source_url) and not is_google_drive_url(extraction.source_url):
+        # ffprobe reads only the container header, not the whole file
+        return probe_duration(extraction.source_url)
+    return None
+
+
+def extraction_signature(extraction_id, task_id, duration=None, offload=True, traceparent=None):
+    """
+    Return the ``extract_audio`` signature for an extraction, routed and budgeted by its duration when known.
+
+    With ``offload=False`` the worker downloads the source itself instead of
+    handing it to the download engine. ``traceparent`` continues the trace of
+    work published outside the span that started it, such as after commit.
+    """
+    kwargs = {} if offload else {'offload': False}
+    return extract_audio.signature(
+        (str(extraction_id),), kwargs, task_id=task_id, **dispatch_options(duration), **trace_options(traceparent),
+    )
+
+
+def download_target(extraction, scratch):
+    """
+    Return where the source of ``extraction`` is downloaded to, or None if it isn't downloaded whole.
+
+    YouTube sources are fetched by yt-dlp and direct-link clips are read
+    straight from the URL.
+    """
+    if is_youtube_url(extraction.source_url):
+        return None
+    if is_google_drive_url(extraction.source_url):
+        return scratch.path_for('google_drive_video')
+    if extraction.is_clip:
+        return None
+    return scratch.path_for('input_video')
+
+
+def offload_download(extraction, scratch, duration=None):
+    """
+    Hand the download of ``extraction`` to the asyncio download engine, if it should go there.
+
+    The row goes back to PENDING while it waits for the engine, which marks
+    the download checkpoint and dispatches ``extract_audio`` again once the
+    file is in scratch space. Returns True if the download was handed over.
+    """
+    target = download_target(extraction, scratch)
+    if not settings.EXTRACTION_ASYNC_DOWNLOADS or not target or scratch.reached(Stage.DOWNLOADED):
+        return False
+
+    job = {
+        'id': extraction.id,
+        'task_id': extraction.task_id,
+        'url': extraction.source_url,
+        'path': target,
+        'duration': duration,
+        'traceparent': current_traceparent(),
+    }
+    if is_google_drive_url(extraction.source_url):
+        job['drive_file_id'] = extract_google_drive_file_id(extraction.source_url)
+    Extraction.objects.filter(id=extraction.id, status=Extraction.Status.PROCESSING).update(
+        status=Extraction.Status.PENDING,
+        heartbeat_at=None,
+        # Waiting for the engine is not a real attempt
+        attempts=F('attempts') - 1,
+    )
+    get_redis().rpush(DOWNLOAD_QUEUE_KEY, json.dumps(job))
+    logger.info(f"Handed download of extraction {extraction.id} to the download engine")
+    return True
+
+
+def extraction_owner(extraction, address=None):
+    """Return the key the fair-share scheduler bills ``extraction`` to."""
+    if extraction.user_id:
+        return f"user:{extraction.user_id}"
+    if extraction.batch_id:
+        # Anonymous batches share one queue, however many entries they have
+        return f"batch:{extraction.batch_id}"
+    if address:
+        return f"addr:{address}"
+    return 'anonymous'
+
+
+def submit_extractions(extractions, owner=None):
+    """
+    Hand extractions with assigned task IDs to the workers once the transaction commits.
+
+    With ``EXTRACTION_SCHEDULER_ENABLED`` they wait in the fair-share
+    scheduler and reach the broker through :func:`release_scheduled`;
+    otherwise, or while Redis is unavailable, they are published at once as
+    one group.
+    """
+    if not extractions:
+        return
+    # The submitting span has ended by the time the transaction commits
+    traceparent = current_traceparent()
+
+    if not settings.EXTRACTION_SCHEDULER_ENABLED:
+        tasks = group(
+            extraction_signature(extraction.id, extraction.task_id, extraction.duration, traceparent=traceparent)
+            for extraction in extractions
+        )
+        transaction.on_commit(tasks.apply_async)
+        return
+
+    by_owner = {}
+    for extraction in extractions:
+        by_owner.setdefault(owner or extraction_owner(extraction), []).append(extraction)
+
+    def schedule():
+        scheduler = None
+        for key, entries in list(by_owner.items()):
+            try:
+                scheduler = scheduler or FairShareScheduler()
+                scheduler.enqueue(key, [
+                    {
+                        'id': extraction.id,
+                        'task_id': extraction.task_id,
+                        'duration': extraction.duration or (
+                            extraction.clip_end - (extraction.clip_start or 0)
+                            if extraction.clip_end is not None else None
+                        ),
+                        'traceparent': traceparent,
+                    }
+                    for extraction in entries
+                ])
+            except RedisError as e:
+                logger.warning(f"Scheduler unavailable, dispatching {len(entries)} extractions directly: {str(e)}")
+                group(
+                    extraction_signature(
+                        extraction.id, extraction.task_id, extraction.duration, traceparent=traceparent,
+                    )
+                    for extraction in entries
+                ).apply_async()
+        release_scheduled()
+
+    transaction.on_commit(schedule)
+
+
+def release_scheduled():
+    """
+    Move scheduled extractions onto the broker while its queues are shallow.
+
+    Work is only released while fewer than ``EXTRACTION_SCHEDULER_BROKER_DEPTH``
+    messages wait in the extraction queues, so the order jobs start in is
+    decided by the scheduler rather than the broker's FIFO. Returns the number
+    of extractions released.
+    """
+    connection = get_redis()
+    released = 0
+    try:
+        with connection.lock(f"{KEY_PREFIX}:release", timeout=30, blocking_timeout=2):
+            # The broker lives in the same Redis; each queue is a plain list
+            depth = sum(connection.llen(queue) for queue in (default_queue(), settings.EXTRACTION_HEAVY_QUEUE))
+            scheduler = FairShareScheduler(connection)
+            jobs = scheduler.pop(settings.EXTRACTION_SCHEDULER_BROKER_DEPTH - depth)
+            for job in jobs:
+                try:
+                    extraction_signature(
+                        job['id'], job['task_id'], job['duration'], traceparent=job.get('traceparent'),
+                    ).apply_async()
+                except (RedisError, OperationalError) as e:
+                    # Popped jobs exist nowhere else; if putting them back fails too, the reaper recovers them
+                    logger.warning(f"Unable to publish scheduled extractions, putting them back: {str(e)}")
+                    scheduler.requeue(jobs[released:])
+                    break
+                released += 1
+    except LockError:
+        # Another process is releasing right now
+        pass
+    except RedisError as e:
+        logger.warning(f"Unable to release scheduled extractions: {str(e)}")
+    return released
+
+
+def progress_reporter(extraction_id, beat, min_interval=1.0):
+    """
+    Return a callable that publishes the transcode percentage of ``extraction_id``.
+
+    The latest value is kept in the cache under ``PROGRESS_CACHE_KEY`` for
+    status polling, at most once every ``min_interval`` seconds, and every
+    report counts as a heartbeat.
+    """
+    last_report = [None]
+
+    def report(percent):
+        beat()
+        current = time.monotonic()
+        if percent < 100 and last_report[0] is not None and current - last_report[0] < min_interval:
+            return
+        last_report[0] = current
+        cache.set(PROGRESS_CACHE_KEY.format(extraction_id), round(percent, 1), settings.EXTRACTION_PROGRESS_TTL)
+
+    return report
+
+
+def restore_from_checkpoint(extraction, scratch):
+    """Return the audio produced by a previous attempt, restoring its metadata, if any."""
+    extracted_file = scratch.reached(Stage.TRANSCODED)
+    if extracted_file:
+        logger.info(f"Resuming extraction {extraction.id} from transcoded checkpoint")
+        extraction.title = scratch.metadata.get('title') or extraction.title
+        extraction.duration = scratch.metadata.get('duration') or 0
+    return extracted_file
+
+
+def extract_from_youtube(extraction, scratch, on_progress=None, should_cancel=None, timer=None):
+    """
+    Extract audio from YouTube video.
+
+    yt-dlp only downloads the audio stream; the encode runs through
+    :func:`transcode` like every other source, so it reports progress and
+    stops within a second of a cancellation instead of running to the end.
+    """
+    extracted_file = restore_from_checkpoint(extraction, scratch)
+    if extracted_file:
         return extracted_file
+    timer = timer or StageTimer(extraction)
+
+    def progress_hook(d):
+        logger.info(f"Progress: {d.get('status')}, {d.get('_percent_str', 'N/A')}")
+        if should_cancel and should_cancel():
+            # yt-dlp stops the download when a hook raises
+            raise ExtractionCancelled("YouTube download was cancelled")
+        slot.renew()
+        if d.get('status') == 'finished':
+            timer.downloaded(d.get('total_bytes') or d.get('downloaded_bytes'))
+        if on_progress:
+            # Nothing is encoded yet, but it counts as a heartbeat
+            on_progress(0)
+
+    source = scratch.reached(Stage.DOWNLOADED)
+    if not source:
+        ydl_opts = {
+            'format': 'bestaudio/best',
+            # A stable name lets yt-dlp resume its .part file after a failed attempt
+            'outtmpl': scratch.path_for('%(id)s.%(ext)s'),
+            'quiet': True,
+            'no_warnings': True,
+            'progress_hooks': [progress_hook],
+        }
+        rate = bandwidth_share('googlevideo.com')
+        if rate:
+            ydl_opts['ratelimit'] = rate
+        if extraction.is_clip:
+            # Fetch only the fragments covering the clip instead of the whole stream
+            ydl_opts['download_ranges'] = yt_dlp.utils.download_range_func(
+                None, [(extraction.clip_start or 0, extraction.clip_end or float('inf'))]
+            )
+            ydl_opts['force_keyframes_at_cuts'] = True
+
+        # Counted against the fleet-wide limits of youtube.com and googlevideo.com
+        timer.enter('download')
+        with origin_slot(extraction.source_url, should_cancel) as slot, yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(extraction.source_url, download=True)
+            downloads = info.get('requested_downloads') or [{}]
+            source = downloads[0].get('filepath') or ydl.prepare_filename(info)
+        if not os.path.exists(source):
+            raise InternalError("Failed to find downloaded YouTube audio")
+
+        duration = info.get('duration') or 0
+        if extraction.is_clip and duration:
+            clip_end = min(extraction.clip_end or duration, duration)
+            duration = max(0, int(clip_end - (extraction.clip_start or 0)))
+        scratch.mark(Stage.DOWNLOADED, source, title=info.get('title', ''), duration=duration)
+    extraction.title = scratch.metadata.get('title') or extraction.title
+    extraction.duration = scratch.metadata.get('duration') or 0
 
+    # The download already covers just the clip, so it is encoded whole
+    extracted_file = scratch.path_for(f"extracted_audio.{extraction.audio_format}")
+    timer.enter('transcode')
+    try:
+        segments = transcode(
+            source, extracted_file, extraction.audio_format, duration=extraction.duration or None,
+            on_progress=on_progress, should_cancel=should_cancel,
+        )
+    except subprocess.CalledProcessError as e:
+        logger.error(f"FFmpeg error: {e.stdout}, {e.stderr}")
+        raise classify_exception(e, "Failed to extract audio") from e
+    timer.note(encoder=encoder_name(extraction.audio_format), segments=segments)
+    scratch.mark(Stage.TRANSCODED, extracted_file, title=extraction.title, duration=extraction.duration)
 
-def extract_from_google_drive(extraction, temp_dir):
+    return extracted_file
+
+
+def extract_from_google_drive(extraction, scratch, on_progress=None, should_cancel=None, timer=None):
     """Extract audio from a Google Drive video file."""
+    extracted_file = restore_from_checkpoint(extraction, scratch)
+    if extracted_file:
+        return extracted_file
+    timer = timer or StageTimer(extraction)
+
     # Extract the file ID from the URL
     file_id = extract_google_drive_file_id(extraction.source_url)
     if not file_id:
-        raise Exception("Invalid Google Drive URL")
+        raise PermanentSourceError("Invalid Google Drive URL")
     
-    # Download the video to a temporary file
-    temp_video = os.path.join(temp_dir, 'google_drive_video')
-    try:
-        download_from_google_drive(file_id, temp_video)
-    except Exception as e:
-        logger.error(f"Failed to download from Google Drive: {str(e)}")
-        raise Exception(f"Failed to download from Google Drive: {str(e)}")
+    # Download the video to the scratch directory unless a previous attempt finished it
+    temp_video = download_target(extraction, scratch)
+    if not scratch.reached(Stage.DOWNLOADED):
+        timer.enter('download')
+        try:
+            with origin_slot(extraction.source_url, should_cancel) as slot:
+                download_from_google_drive(file_id, temp_video, should_cancel=slot.watch(should_cancel))
+        except Exception as e:
+            logger.error(f"Failed to download from Google Drive: {str(e)}")
+            raise classify_exception(e, "Failed to download from Google Drive") from e
+        timer.downloaded_file(temp_video)
+        scratch.mark(Stage.DOWNLOADED, temp_video)
     
     # Generate output filename
     output_filename = f"extracted_audio.{extraction.audio_format}"
-    output_path = os.path.join(temp_dir, output_filename)
+    output_path = scratch.path_for(output_filename)
     
+    timer.enter('transcode')
     try:
-        # Extract audio using FFmpeg
-        cmd = [
-            'ffmpeg',
-            '-i', temp_video,
-            '-vn',  # Disable video
-            '-c:a', 'libmp3lame' if extraction.audio_format == 'mp3' else extraction.audio_format,
-            '-q:a', '2',  # Quality setting
-            '-y',  # Overwrite output file
-            output_path
-        ]
-        
-        logger.info(f"Running FFmpeg: {' '.join(cmd)}")
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        logger.info(f"FFmpeg stdout: {result.stdout}")
-        logger.info(f"FFmpeg stderr: {result.stderr}")
+        # Extract audio using FFmpeg, split across cores for long sources
+        segments = transcode(
+            temp_video, output_path, extraction.audio_format,
+            start=extraction.clip_start, end=extraction.clip_end, duration=extraction.duration or None,
+            on_progress=on_progress, should_cancel=should_cancel,
+        )
     except subprocess.CalledProcessError as e:
         logger.error(f"FFmpeg error: {e.stdout}, {e.stderr}")
-        raise Exception(f"Failed to extract audio: {e}")
+        raise classify_exception(e, "Failed to extract audio") from e
+    timer.note(encoder=encoder_name(extraction.audio_format), segments=segments)
     
     # Try to get the title and duration from the video
+    timer.enter('probe')
     try:
         # Get duration using FFprobe
         duration_cmd = [
@@ -226,7 +559,7 @@ def extract_from_google_drive(extraction, temp_dir):
             output_path
         ]
         
-        duration = float(subprocess.check_output(duration_cmd).decode('utf-8').strip())
+        duration = float(run(duration_cmd, timeout=PROBE_TIMEOUT).strip())
         extraction.duration = int(duration)
         
         # Try to get title from the video metadata
@@ -239,7 +572,7 @@ def extract_from_google_drive(extraction, temp_dir):
         ]
         
         try:
-            title = subprocess.check_output(title_cmd).decode('utf-8').strip()
+            title = run(title_cmd, timeout=PROBE_TIMEOUT).strip()
             if title:
                 extraction.title = title
             else:
@@ -253,46 +586,78 @@ def extract_from_google_drive(extraction, temp_dir):
         extraction.title = f"Google Drive Video {file_id[:8]}"
         # Don't fail the whole process for metadata issues
     
+    scratch.mark(Stage.TRANSCODED, output_path, title=extraction.title, duration=extraction.duration)
     return output_path
 
 
-def extract_from_video(extraction, temp_dir):
-    """Extract audio from a video file using FFmpeg directly."""
-    # Download the video to a temporary file
-    temp_video = os.path.join(temp_dir, 'input_video')
-    
-    # Download video using curl
+def download_with_curl(url, output_path, should_cancel=None, limit_rate=None):
+    """
+    Download ``url`` with curl, continuing a partial file by HTTP Range when possible.
+
+    ``limit_rate`` caps the transfer in bytes per second.
+    """
+    # --fail turns HTTP errors into exit code 22; -C - resumes from the current file size
+    cmd = ['curl', '-L', '--fail', '-sS', '-C', '-', '-o', output_path, url]
+    if limit_rate:
+        cmd[1:1] = ['--limit-rate', str(limit_rate)]
     try:
-        subprocess.run(
-            ['curl', '-L', '-o', temp_video, extraction.source_url],
-            check=True, capture_output=True, text=True
-        )
+        run(cmd, should_cancel=should_cancel)
     except subprocess.CalledProcessError as e:
-        logger.error(f"Failed to download video: {e.stdout} {e.stderr}")
-        raise Exception(f"Failed to download video: {e}")
+        # 33: the server does not support byte ranges, so start over
+        if e.returncode != 33:
+            raise
+        logger.info(f"Server does not support resuming, restarting download of {url}")
+        os.remove(output_path)
+        run(cmd, should_cancel=should_cancel)
+
+
+def extract_from_video(extraction, scratch, on_progress=None, should_cancel=None, timer=None):
+    """Extract audio from a video file using FFmpeg directly."""
+    extracted_file = restore_from_checkpoint(extraction, scratch)
+    if extracted_file:
+        return extracted_file
+    timer = timer or StageTimer(extraction)
+
+    # Clips are read straight from the URL: ffmpeg seeks with HTTP Range
+    # requests, so only the bytes around the clip are fetched
+    temp_video = download_target(extraction, scratch) or extraction.source_url
+    if not extraction.is_clip and not scratch.reached(Stage.DOWNLOADED):
+        timer.enter('download')
+        try:
+            with origin_slot(extraction.source_url, should_cancel) as slot:
+                download_with_curl(
+                    extraction.source_url, temp_video,
+                    should_cancel=slot.watch(should_cancel),
+                    limit_rate=bandwidth_share(origin_of(extraction.source_url)),
+                )
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Failed to download video: {e.stdout} {e.stderr}")
+            raise classify_curl_error(e, "Failed to download video") from e
+        timer.downloaded_file(temp_video)
+        scratch.mark(Stage.DOWNLOADED, temp_video)
     
     # Generate output filename
     output_filename = f"extracted_audio.{extraction.audio_format}"
-    output_path = os.path.join(temp_dir, output_filename)
-    
-    # Extract audio using FFmpeg
-    cmd = [
-        'ffmpeg',
-        '-i', temp_video,
-        '-vn',  # Disable video
-        '-c:a', 'libmp3lame' if extraction.audio_format == 'mp3' else extraction.audio_format,
-        '-q:a', '2',  # Quality setting
-        '-y',  # Overwrite output file
-        output_path
-    ]
+    output_path = scratch.path_for(output_filename)
     
+    # Extract audio using FFmpeg, split across cores for long sources. A clip
+    # read straight from the URL holds a connection to its origin meanwhile
+    remote = temp_video == extraction.source_url
+    timer.enter('transcode')
     try:
-        subprocess.run(cmd, check=True)
+        with origin_slot(temp_video if remote else None, should_cancel) as slot:
+            segments = transcode(
+                temp_video, output_path, extraction.audio_format,
+                start=extraction.clip_start, end=extraction.clip_end, duration=extraction.duration or None,
+                on_progress=on_progress, should_cancel=slot.watch(should_cancel),
+            )
     except subprocess.CalledProcessError as e:
         logger.error(f"FFmpeg error: {str(e)}")
-        raise Exception(f"Failed to extract audio: {str(e)}")
+        raise classify_exception(e, "Failed to extract audio") from e
+    timer.note(encoder=encoder_name(extraction.audio_format), segments=segments)
     
     # Get duration using FFprobe
+    timer.enter('probe')
     duration_cmd = [
         'ffprobe',
         '-v', 'error',
@@ -301,7 +666,7 @@ def extract_from_video(extraction, temp_dir):
         output_path
     ]
     
-    duration = float(subprocess.check_output(duration_cmd).decode('utf-8').strip())
+    duration = float(run(duration_cmd, timeout=PROBE_TIMEOUT).strip())
     extraction.duration = int(duration)
     
     # Try to get title from the video metadata
@@ -314,7 +679,7 @@ def extract_from_video(extraction, temp_dir):
     ]
     
     try:
-        title = subprocess.check_output(title_cmd).decode('utf-8').strip()
+        title = run(title_cmd, timeout=PROBE_TIMEOUT).strip()
         if title:
             extraction.title = title
         else:
@@ -326,99 +691,478 @@ def extract_from_video(extraction, temp_dir):
         parsed_url = urlparse(extraction.source_url)
         extraction.title = os.path.basename(parsed_url.path)
     
+    scratch.mark(Stage.TRANSCODED, output_path, title=extraction.title, duration=extraction.duration)
     return output_path
 
 
-@shared_task(bind=True, max_retries=3, default_retry_delay=30)
-def extract_audio(self, extraction_id):
-    """Extract audio from a URL."""
+@shared_task(bind=True, max_retries=3, profiled=True)
+def extract_audio(self, extraction_id, offload=True):
+    """
+    Extract audio from a URL.
+
+    Unless ``offload`` is False, whole-file downloads are left to the download
+    engine when ``EXTRACTION_ASYNC_DOWNLOADS`` is on, and the task ends until
+    the engine hands the downloaded source back. Runs are profiled when the
+    extraction asks for it or ``EXTRACTION_PROFILING_SAMPLE_RATE`` picks them.
+    """
+    extraction = timer = None
     try:
         # Get the extraction object
         extraction = Extraction.objects.get(id=extraction_id)
         
-        # Update status to processing
-        extraction.status = Extraction.Status.PROCESSING
-        extraction.save(update_fields=['status'])
-        
-        # Create temporary directory
-        with tempfile.TemporaryDirectory() as temp_dir:
-            try:
-                # Process based on URL type
-                if is_youtube_url(extraction.source_url):
-                    # First, get video info to update the extraction title
-                    try:
-                        info = get_video_info(extraction.source_url)
-                        extraction.title = info.get('title', '')
-                        extraction.save(update_fields=['title'])
-                    except Exception as e:
-                        logger.warning(f"Failed to get video info: {str(e)}")
-                    
-                    # Extract audio from YouTube
-                    extracted_file = extract_from_youtube(extraction, temp_dir)
-                elif is_google_drive_url(extraction.source_url):
-                    # Extract audio from Google Drive
-                    extracted_file = extract_from_google_drive(extraction, temp_dir)
-                else:
-                    # Extract audio from direct video link
-                    extracted_file = extract_from_video(extraction, temp_dir)
-                
-                # Create final directory based on extraction ID
-                final_dir = os.path.join(EXTRACTION_DIR, str(extraction.id))
-                
-                # Verify if we can create the directory - if not, fail gracefully
-                if not create_directory_safely(final_dir):
-                    raise Exception("Unable to create extraction directory. Please contact administrator.")
-                
-                # Move file to final location
-                filename = f"{extraction.title or 'extracted'}.{extraction.audio_format}"
-                sanitized_filename = "".join(c for c in filename if c.isalnum() or c in ' ._-').strip()
-                
-                # Ensure filename is not too long
-                if len(sanitized_filename) > 100:
-                    sanitized_filename = sanitized_filename[:100] + f".{extraction.audio_format}"
-                
-                final_path = os.path.join(final_dir, sanitized_filename)
-                
-                try:
-                    shutil.copy2(extracted_file, final_path)
-                except (PermissionError, IOError) as e:
-                    logger.error(f"Failed to copy file to {final_path}: {str(e)}")
-                    raise Exception(f"Unable to save extracted audio file: {str(e)}")
-                
-                # Get file size
+        # Update status to processing, unless it was cancelled while queued
+        started = Extraction.objects.filter(id=extraction.id).exclude(status=Extraction.Status.CANCELLED).update(
+            status=Extraction.Status.PROCESSING,
+            heartbeat_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if not started:
+            logger.info(f"Extraction {extraction.id} was cancelled before it started")
+            # The API can't reach the scratch volume, so leftovers of an earlier attempt go here
+            ScratchSpace(SCRATCH_DIR, extraction.id).cleanup()
+            return
+        extraction.refresh_from_db(fields=['status', 'heartbeat_at', 'attempts'])
+        if extraction.attempts == 1:
+            observe_queue_wait(extraction, (timezone.now() - extraction.created).total_seconds())
+        timer = StageTimer(extraction)
+        started_at = timezone.now()
+        mark_started(extraction.id)
+        beat = heartbeat(extraction.id, min_interval=settings.EXTRACTION_HEARTBEAT_INTERVAL)
+        progress = progress_reporter(extraction.id, beat)
+        cancelled = cancel_checker(extraction.id)
+
+        if settings.EXTRACTION_SCHEDULER_ENABLED:
+            # This run left the broker, so there is room for the next scheduled job
+            release_scheduled()
+
+        if not create_directory_safely(SCRATCH_DIR):
+            raise InternalError("Unable to create scratch directory. Please contact administrator.")
+
+        # Persistent scratch space so a retry can resume from the last completed stage
+        scratch = ScratchSpace(SCRATCH_DIR, extraction.id).open()
+        resumed_from = next((stage for stage in reversed(Stage.ORDER) if scratch.reached(stage)), None)
+        if resumed_from:
+            timer.note(resumed_from=resumed_from)
+
+        try:
+            timer.enter('resolve')
+            # Don't spend metadata calls and downloads on a platform that keeps failing
+            if not scratch.reached(Stage.DOWNLOADED):
+                check_platform(extraction.source_url, extraction.id)
+
+            info = None
+            if is_youtube_url(extraction.source_url):
+                # First, get video info to update the extraction title
                 try:
-                    file_size = os.path.getsize(final_path)
-                except (PermissionError, IOError) as e:
-                    logger.warning(f"Unable to get file size for {final_path}: {str(e)}")
-                    file_size = None
-                
-                # Update extraction object
-                extraction.file_path = final_path
-                extraction.file_size = file_size
-                extraction.status = Extraction.Status.COMPLETED
-                extraction.completed_at = timezone.now()
-                extraction.save()
-                
-                logger.info(f"Successfully extracted audio: {extraction.id}")
-                
-            except Exception as e:
-                logger.error(f"Error during extraction: {str(e)}")
-                extraction.status = Extraction.Status.FAILED
-                extraction.error_message = str(e)
-                extraction.save()
-                raise
-    
+                    info = get_video_info(extraction.source_url)
+                    extraction.title = info.get('title', '')
+                    extraction.save(update_fields=['title'])
+                except Exception as e:
+                    logger.warning(f"Failed to get video info: {str(e)}")
+
+            # Reject oversized or unsupported sources before downloading anything
+            if not scratch.reached(Stage.DOWNLOADED):
+                preflight(extraction.source_url, extraction.clip_start, extraction.clip_end)
+            duration = resolve_duration(extraction, scratch, info)
+            check_limits(duration=duration)
+            raise_if_cancelled(extraction.id)
+
+            # Long media gets a time limit sized to it and runs on the heavy queue
+            options = dispatch_options(duration)
+            if options and not fits_budget(self.request, options):
+                Extraction.objects.filter(id=extraction.id, status=Extraction.Status.PROCESSING).update(
+                    status=Extraction.Status.PENDING,
+                    duration=int(duration),
+                    heartbeat_at=None,
+                    # Handing over is not a real attempt
+                    attempts=F('attempts') - 1,
+                )
+                # Same task ID, so clients polling the status endpoint keep tracking it, and the
+                # same signature as any dispatch so offloading and tracing carry over
+                extraction_signature(
+                    extraction_id, self.request.id, duration, offload=offload, traceparent=current_traceparent(),
+                ).apply_async()
+                logger.info(
+                    f"Rerouting extraction {extraction.id} ({int(duration)}s of media) to queue "
+                    f"{options['queue']} with a {options['soft_time_limit']}s soft time limit"
+                )
+                return
+
+            # Waiting on sockets is cheaper on the download engine's event loop than in this process
+            if offload and offload_download(extraction, scratch, duration):
+                return
+
+            # Process based on URL type
+            if is_youtube_url(extraction.source_url):
+                # Extract audio from YouTube
+                extracted_file = extract_from_youtube(
+                    extraction, scratch, on_progress=progress, should_cancel=cancelled, timer=timer,
+                )
+            elif is_google_drive_url(extraction.source_url):
+                # Extract audio from Google Drive
+                extracted_file = extract_from_google_drive(
+                    extraction, scratch, on_progress=progress, should_cancel=cancelled, timer=timer,
+                )
+            else:
+                # Extract audio from direct video link
+                extracted_file = extract_from_video(
+                    extraction, scratch, on_progress=progress, should_cancel=cancelled, timer=timer,
+                )
+            beat()
+            raise_if_cancelled(extraction.id)
+            timer.enter('finalize')
+            
+            # Create final directory based on extraction ID
+            final_dir = os.path.join(EXTRACTION_DIR, str(extraction.id))
+            
+            # Verify if we can create the directory - if not, fail gracefully
+            if not create_directory_safely(final_dir):
+                raise InternalError("Unable to create extraction directory. Please contact administrator.")
+            
+            # Move file to final location
+            filename = f"{extraction.title or 'extracted'}.{extraction.audio_format}"
+            sanitized_filename = "".join(c for c in filename if c.isalnum() or c in ' ._-').strip()
+            
+            # Ensure filename is not too long
+            if len(sanitized_filename) > 100:
+                sanitized_filename = sanitized_filename[:100] + f".{extraction.audio_format}"
+            
+            final_path = os.path.join(final_dir, sanitized_filename)
+            
+            try:
+                shutil.copy2(extracted_file, final_path)
+            except (PermissionError, IOError) as e:
+                logger.error(f"Failed to copy file to {final_path}: {str(e)}")
+                raise InternalError(f"Unable to save extracted audio file: {str(e)}") from e
+            
+            # Get file size
+            try:
+                file_size = os.path.getsize(final_path)
+            except (PermissionError, IOError) as e:
+                logger.warning(f"Unable to get file size for {final_path}: {str(e)}")
+                file_size = None
+            
+            # Update extraction object, unless it was cancelled while the file was copied
+            extraction.file_path = final_path
+            extraction.file_size = file_size
+            extraction.status = Extraction.Status.COMPLETED
+            extraction.completed_at = timezone.now()
+            extraction.last_accessed_at = extraction.completed_at
+            extraction.heartbeat_at = None
+            timer.finish()
+            completed = Extraction.objects.filter(id=extraction.id, status=Extraction.Status.PROCESSING).update(
+                title=extraction.title,
+                duration=extraction.duration,
+                file_path=final_path,
+                file_size=file_size,
+                status=extraction.status,
+                completed_at=extraction.completed_at,
+                last_accessed_at=extraction.last_accessed_at,
+                heartbeat_at=None,
+                profile=execution_profile(extraction, timer, started_at, self.request, file_size=file_size),
+            )
+            if not completed:
+                shutil.rmtree(final_dir, ignore_errors=True)
+                raise ExtractionCancelled(f"Extraction {extraction.id} was cancelled")
+
+            # The final copy is in place, so the checkpoint is no longer needed
+            scratch.cleanup()
+            record_outcome(extraction.source_url)
+            observe_completed(extraction, file_size)
+            record_run(extraction, timer)
+            
+            logger.info(f"Successfully extracted audio: {extraction.id}")
+
+            if extraction.batch_id:
+                release_batch_slots(extraction.batch_id)
+            
+        except Exception as e:
+            logger.error(f"Error during extraction: {str(e)}")
+            timer.fail(e)
+            error = classify_exception(e)
+            if not isinstance(error, PlatformUnavailableError):
+                record_outcome(extraction.source_url, error)
+            remember_bad_source(extraction.source_url, error)
+            raise
+        finally:
+            timer.finish()
+
     except Extraction.DoesNotExist:
         logger.error(f"Extraction with ID {extraction_id} does not exist")
     except Exception as e:
-        logger.error(f"Error in extract_audio task: {str(e)}")
-        try:
-            extraction = Extraction.objects.get(id=extraction_id)
-            extraction.status = Extraction.Status.FAILED
-            extraction.error_message = str(e)
-            extraction.save()
-        except Exception:
-            pass
-        
-        # Retry the task
-        self.retry(exc=e) 
\ No newline at end of file
+        error = classify_exception(e)
+        # yt-dlp reports an aborted download as its own error, so trust the flag over the exception
+        if isinstance(error, ExtractionCancelled) or is_cancelled(extraction_id):
+            logger.info(f"Extraction {extraction_id} cancelled, cleaning up")
+            ScratchSpace(SCRATCH_DIR, extraction_id).cleanup()
+            Extraction.objects.filter(id=extraction_id, status=Extraction.Status.CANCELLED).update(heartbeat_at=None)
+            return
+        if isinstance(error, PlatformUnavailableError) and settings.EXTRACTION_BREAKER_ON_OPEN == 'park':
+            # Wait for the breaker to close without spending an attempt; jitter
+            # spreads the parked jobs out so they don't all arrive at once
+            countdown = (error.retry_after or settings.EXTRACTION_BREAKER_COOLDOWN) * random.uniform(1, 2)  # noqa: S311
+            Extraction.objects.filter(id=extraction_id, status=Extraction.Status.PROCESSING).update(
+                status=Extraction.Status.PENDING,
+                heartbeat_at=None,
+                attempts=F('attempts') - 1,
+            )
+            extraction_signature(extraction_id, self.request.id, offload=offload).apply_async(countdown=countdown)
+            logger.info(f"Parked extraction {extraction_id} for {countdown:.0f}s: {str(error)}")
+            return
+        retrying = error.retryable and self.request.retries < self.max_retries
+        logger.error(f"Error in extract_audio task ({error.kind}, retrying={retrying}): {str(e)}")
+        if extraction is not None:
+            observe_failure(extraction.source_url, error, retrying)
+
+        # Permanent failures are final right away; retryable ones wait in PENDING
+        final = {}
+        if not retrying and timer is not None:
+            final['profile'] = execution_profile(extraction, timer, started_at, self.request, error=error)
+        Extraction.objects.filter(id=extraction_id).exclude(status=Extraction.Status.CANCELLED).update(
+            status=Extraction.Status.PENDING if retrying else Extraction.Status.FAILED,
+            error_message=str(error),
+            heartbeat_at=None,
+            **final,
+        )
+        if not retrying:
+            ScratchSpace(SCRATCH_DIR, extraction_id).cleanup()
+            batch_id = Extraction.objects.filter(id=extraction_id).values_list('batch_id', flat=True).first()
+            if batch_id:
+                release_batch_slots(batch_id)
+            raise error from e
+
+        # Retry the task with jittered exponential backoff
+        countdown = compute_retry_delay(
+            error,
+            self.request.retries,
+            base=settings.EXTRACTION_RETRY_BACKOFF_BASE,
+            cap=settings.EXTRACTION_RETRY_BACKOFF_MAX,
+        )
+        raise self.retry(exc=error, countdown=countdown) from e
+
+
+def execution_profile(extraction, timer, started_at, request, file_size=None, error=None):
+    """
+    Return the record of the final run of ``extraction`` kept in ``Extraction.profile``.
+
+    Stage durations cover that run only; ``resumed_from`` says which
+    checkpoint it started from when earlier runs did part of the work.
+    """
+    profile = {
+        'enqueued_at': extraction.created.isoformat(),
+        'started_at': started_at.isoformat(),
+        'finished_at': timezone.now().isoformat(),
+        'stages': {stage: round(seconds, 3) for stage, seconds in timer.durations.items()},
+        'bytes_in': timer.bytes_in or None,
+        'bytes_out': file_size,
+        'worker': socket.gethostname(),
+        'queue': (request.delivery_info or {}).get('routing_key'),
+        'retries': request.retries,
+        **timer.details,
+    }
+    if error is not None:
+        profile['error_kind'] = error.kind
+    return profile
+
+
+def release_batch_slots(batch_id):
+    """
+    Dispatch queued entries of a concurrency-capped batch into free slots.
+
+    Entries without a task ID have not been dispatched yet. The batch row is
+    locked so entries finishing at the same time can't both fill one slot.
+    Returns the number of entries dispatched.
+    """
+    with transaction.atomic():
+        batch = ExtractionBatch.objects.select_for_update().filter(id=batch_id).first()
+        if batch is None or not batch.max_concurrency:
+            return 0
+
+        entries = Extraction.objects.filter(batch_id=batch_id)
+        in_flight = entries.filter(
+            status__in=[Extraction.Status.PENDING, Extraction.Status.PROCESSING],
+        ).exclude(task_id='').count()
+        queued = list(
+            entries.filter(status=Extraction.Status.PENDING, task_id='')
+            .order_by('id')[:max(0, batch.max_concurrency - in_flight)]
+        )
+        for extraction in queued:
+            extraction.task_id = str(uuid.uuid4())
+        Extraction.objects.bulk_update(queued, ['task_id'])
+        submit_extractions(queued)
+
+    return len(queued)
+
+
+def cancel_extraction(extraction):
+    """
+    Cancel a queued or running extraction. Returns False if it had already finished.
+
+    The row is marked ``CANCELLED`` first, so a worker picking the task up
+    afterwards drops it, along with any scratch space of an earlier attempt.
+    Queued work is removed from the scheduler and its broker message revoked;
+    the reaper's scratch sweep removes what those leave behind. A running
+    worker sees the cancel flag at its next stage boundary or within a second
+    from the process runner, or the row within
+    ``EXTRACTION_CANCEL_DB_CHECK_INTERVAL`` if the flag was lost, kills its
+    subprocesses and removes its scratch space.
+    """
+    previous = extraction.status
+    cancelled = Extraction.objects.filter(
+        id=extraction.id,
+        status__in=[Extraction.Status.PENDING, Extraction.Status.PROCESSING],
+    ).update(status=Extraction.Status.CANCELLED, heartbeat_at=None)
+    if not cancelled:
+        return False
+    extraction.status = Extraction.Status.CANCELLED
+
+    request_cancel(extraction.id)
+
+    def withdraw():
+        if settings.EXTRACTION_SCHEDULER_ENABLED:
+            try:
+                FairShareScheduler().discard(extraction.id)
+            except RedisError as e:
+                logger.warning(f"Unable to remove extraction {extraction.id} from the scheduler: {str(e)}")
+        if extraction.task_id:
+            # Not terminate: a running worker stops itself on the cancel flag, which also kills
+            # its ffmpeg process group and removes its scratch space; killing the pool process
+            # would orphan ffmpeg and leave the scratch space behind
+            try:
+                current_app.control.revoke(extraction.task_id)
+            except Exception as e:
+                logger.warning(f"Unable to revoke task {extraction.task_id}: {str(e)}")
+
+    transaction.on_commit(withdraw)
+    if extraction.batch_id:
+        release_batch_slots(extraction.batch_id)
+
+    logger.info(f"Cancelled extraction {extraction.id} ({previous})")
+    return True
+
+
+@shared_task(bind=True, max_retries=3)
+def expand_playlist(self, batch_id):
+    """Resolve a playlist or channel into one extraction per entry and start the first slots."""
+    try:
+        batch = ExtractionBatch.objects.get(id=batch_id)
+    except ExtractionBatch.DoesNotExist:
+        logger.error(f"Extraction batch with ID {batch_id} does not exist")
+        return 0
+    if batch.expanded_at:
+        return 0
+
+    try:
+        title, entries = get_playlist_entries(batch.source_url, settings.EXTRACTION_PLAYLIST_MAX_ENTRIES)
+    except Exception as e:
+        error = classify_exception(e, "Failed to resolve playlist")
+        if error.retryable and self.request.retries < self.max_retries:
+            raise self.retry(exc=error, countdown=compute_retry_delay(
+                error,
+                self.request.retries,
+                base=settings.EXTRACTION_RETRY_BACKOFF_BASE,
+                cap=settings.EXTRACTION_RETRY_BACKOFF_MAX,
+            )) from e
+        batch.error_message = str(error)
+        batch.save(update_fields=['error_message', 'modified'])
+        raise error from e
+
+    # The request was admitted as one extraction; admit what it fans out into before queuing it
+    try:
+        check_admission(batch.user, count=len(entries))
+    except AdmissionRejected as rejection:
+        if rejection.retry_after and self.request.retries < self.max_retries:
+            raise self.retry(exc=rejection, countdown=rejection.retry_after) from rejection
+        logger.warning(f"Playlist {batch.source_url} of {len(entries)} entries not admitted: {str(rejection)}")
+        batch.error_message = str(rejection)
+        batch.save(update_fields=['error_message', 'modified'])
+        return 0
+
+    with transaction.atomic():
+        Extraction.objects.bulk_create([
+            Extraction(
+                batch=batch, user=batch.user, audio_format=batch.audio_format,
+                source_key=source_key(entry['source_url']), **entry,
+            )
+            for entry in entries
+        ])
+        batch.title = title[:255]
+        batch.expanded_at = timezone.now()
+        batch.save(update_fields=['title', 'expanded_at', 'modified'])
+
+    logger.info(f"Expanded playlist {batch.source_url} into {len(entries)} extractions")
+    release_batch_slots(batch.id)
+    return len(entries)
+
+
+@shared_task
+def release_scheduled_extractions():
+    """Top up the broker from the fair-share scheduler in case no running task did."""
+    if not settings.EXTRACTION_SCHEDULER_ENABLED:
+        return 0
+    return release_scheduled()
+
+
+@shared_task
+def enforce_storage_lifecycle():
+    """Expire extraction files past their TTL or over the storage budget."""
+    return enforce_storage_policy()
+
+
+def find_lost_pending(live_task_ids):
+    """
+    Return PENDING extractions lost between the scheduler, the download engine and the broker.
+
+    See :func:`reap_lost_pending`.
+
+    Messages prefetched by workers are only visible when the workers answer,
+    so nothing is reported lost without ``live_task_ids``.
+    """
+    if live_task_ids is None:
+        return []
+    connection = get_redis()
+    try:
+        queued = get_queued_task_ids(connection, (default_queue(), settings.EXTRACTION_HEAVY_QUEUE))
+        waiting = FairShareScheduler(connection).waiting_ids() if settings.EXTRACTION_SCHEDULER_ENABLED else set()
+        # Downloads waiting for the engine, which leaves their rows PENDING too
+        waiting |= {json.loads(job)['id'] for job in connection.lrange(DOWNLOAD_QUEUE_KEY, 0, -1)}
+        return reap_lost_pending(live_task_ids | queued, waiting, connection)
+    except RedisError as e:
+        logger.warning(f"Unable to look for lost extractions: {str(e)}")
+        return []
+
+
+@shared_task
+def reap_stale_extractions_task():
+    """Requeue or fail extractions abandoned by dead workers and sweep their leftovers."""
+    live_task_ids = get_live_task_ids()
+    requeued, failed, revoked = reap_stale_extractions(live_task_ids)
+    lost = find_lost_pending(live_task_ids)
+
+    if revoked:
+        # Kill anything still hanging on to the abandoned runs
+        extract_audio.app.control.revoke(revoked, terminate=True, signal='SIGKILL')
+    # Known durations keep requeued long jobs on their queue and budget
+    durations = dict(
+        Extraction.objects.filter(id__in=[extraction_id for extraction_id, _ in requeued + lost])
+        .values_list('id', 'duration')
+    )
+    for extraction_id, task_id in requeued + lost:
+        extraction_signature(extraction_id, task_id, durations.get(extraction_id)).apply_async()
+
+    # Failed rows free playlist slots too; refill any capped batch with queued entries
+    stalled = ExtractionBatch.objects.filter(
+        Q(extractions__status=Extraction.Status.PENDING) & Q(extractions__task_id=''),
+        max_concurrency__isnull=False,
+    ).values_list('id', flat=True).distinct()
+    for batch_id in stalled:
+        release_batch_slots(batch_id)
+
+    return {
+        'requeued': len(requeued),
+        'failed': failed,
+        'recovered': len(lost),
+        'scratch_removed': sweep_orphan_scratch(SCRATCH_DIR),
+        'scratch_freed': enforce_scratch_budget(SCRATCH_DIR, settings.EXTRACTION_SCRATCH_BUDGET_BYTES),
+        'files_removed': sweep_orphan_files(EXTRACTION_DIR),
+    }
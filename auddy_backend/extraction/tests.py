@@ -1,11 +1,60 @@
+import os
+import json
+import time
+import uuid
+import tempfile
+import subprocess
+from datetime import timedelta
 from unittest.mock import patch, MagicMock
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
 
 from auddy_backend.extraction.models import Extraction
-from auddy_backend.extraction.tasks import is_youtube_url
+from auddy_backend.users.tests.factories import UserFactory
+from auddy_backend.extraction.exceptions import (
+    ExtractionCancelled,
+    LimitExceededError,
+    OriginBusyError,
+    PermanentSourceError,
+    PlatformUnavailableError,
+    RateLimitedError,
+    TransientNetworkError,
+    classify_exception,
+    compute_retry_delay,
+    raise_for_status_code,
+)
+from auddy_backend.extraction.budget import compute_time_limits, dispatch_options
+from auddy_backend.extraction.preflight import sniff_media
+from auddy_backend.extraction.lifecycle import enforce_storage_policy, get_storage_usage
+from auddy_backend.extraction.services import ExtractionService
+from auddy_backend.extraction.scheduler import estimate_cost, job_priority, percentile
+from auddy_backend.extraction.runner import ProcessCancelled, ProgressParser, run
+from auddy_backend.extraction.breaker import CircuitBreaker, counts_against_platform, platform_of
+from auddy_backend.extraction.sources import is_youtube_playlist_url, resolve_source
+from auddy_backend.extraction.metrics import StageTimer
+from auddy_backend.extraction.eta import ThroughputModel, estimate_eta, eta_context, record_run
+from auddy_backend.extraction.tracing import current_traceparent, get_exporter, parse_traceparent, span
+from auddy_backend.extraction.profiling import SamplingProfiler
+from auddy_backend.extraction.negative_cache import known_bad_source, remember_bad_source
+from auddy_backend.extraction.limiter import bandwidth_share, origin_of, origin_slot, origins_for
+from auddy_backend.extraction.scratch import ScratchSpace, Stage, enforce_scratch_budget
+from auddy_backend.extraction.transcode import adts_frames, mp3_frames, plan_segments, should_segment
+from auddy_backend.extraction.reaper import reap_lost_pending, reap_stale_extractions, sweep_orphan_files
+from auddy_backend.extraction.models import ExtractionBatch, TaskProfile
+from auddy_backend.extraction.tasks import (
+    cancel_extraction,
+    download_from_google_drive,
+    expand_playlist,
+    extract_audio,
+    extract_from_video,
+    extraction_owner,
+    is_youtube_url,
+    progress_reporter,
+    release_batch_slots,
+)
 
 
 class ExtractionModelTests(TestCase):
@@ -15,10 +64,11 @@ class ExtractionModelTests(TestCase):
         """Test creating an extraction record."""
         extraction = Extraction.objects.create(
             source_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ",
-            format=Extraction.Format.MP3,
+            audio_format=Extraction.Format.MP3,
         )
         self.assertEqual(extraction.status, Extraction.Status.PENDING)
-        self.assertEqual(extraction.format, Extraction.Format.MP3)
+        self.assertEqual(extraction.audio_format, Extraction.Format.MP3)
+        self.assertEqual(extraction.source_key, "youtube:dQw4w9WgXcQ")
 
 
 class ExtractionTaskTests(TestCase):
@@ -47,15 +97,13 @@ class ExtractionTaskTests(TestCase):
 class ExtractionAPITests(APITestCase):
     """Tests for the extraction API endpoints."""
 
-    @patch('auddy_backend.extraction.api.views.extract_audio')
-    def test_create_extraction(self, mock_task):
+    @patch('auddy_backend.extraction.services.submit_extractions')
+    def test_create_extraction(self, mock_submit):
         """Test creating an extraction via API."""
-        mock_task.delay.return_value = MagicMock(id="test-task-id")
-
         url = reverse("api:extract-list")
         data = {
             "source_url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
-            "format": Extraction.Format.MP3,
+            "audio_format": Extraction.Format.MP3,
         }
         
         response = self.client.post(url, data, format="json")
@@ -65,10 +113,13 @@ class ExtractionAPITests(APITestCase):
         
         extraction = Extraction.objects.first()
         self.assertEqual(extraction.source_url, data["source_url"])
-        self.assertEqual(extraction.format, data["format"])
-        self.assertEqual(extraction.task_id, "test-task-id")
+        self.assertEqual(extraction.audio_format, data["audio_format"])
+        # Task IDs are assigned up front so clients can poll before the task is published
+        self.assertEqual(str(uuid.UUID(extraction.task_id)), extraction.task_id)
+        self.assertEqual(response.data["data"]["task_id"], extraction.task_id)
         
-        mock_task.delay.assert_called_once_with(str(extraction.id))
+        mock_submit.assert_called_once()
+        self.assertEqual(mock_submit.call_args.args[0], [extraction])
 
     def test_formats_list(self):
         """Test listing available formats."""
@@ -80,4 +131,1593 @@ class ExtractionAPITests(APITestCase):
         
         for format_data in response.data:
             self.assertIn("value", format_data)
-            self.assertIn("label", format_data) 
\ No newline at end of file
+            self.assertIn("label", format_data)
+
+
+@override_settings(
+    EXTRACTION_FILE_TTL=3600,
+    EXTRACTION_STORAGE_BUDGET_BYTES=250,
+    EXTRACTION_STORAGE_LOW_WATERMARK=0.5,
+    EXTRACTION_EVICTION_BATCH_SIZE=1,
+)
+class StorageLifecycleTests(TestCase):
+    """Tests for TTL and budget based eviction of extraction files."""
+
+    def setUp(self):
+        self.media_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_dir.cleanup)
+
+    def make_completed(self, name, size, accessed_ago):
+        directory = os.path.join(self.media_dir.name, name)
+        os.makedirs(directory)
+        file_path = os.path.join(directory, f"{name}.mp3")
+        with open(file_path, 'wb') as f:
+            f.write(b'\0' * size)
+        return Extraction.objects.create(
+            source_url=f"https://example.com/{name}.mp4",
+            status=Extraction.Status.COMPLETED,
+            file_path=file_path,
+            file_size=size,
+            last_accessed_at=timezone.now() - accessed_ago,
+        )
+
+    def test_ttl_expires_stale_files(self):
+        """Files not accessed within the TTL are removed and their rows expired."""
+        stale = self.make_completed("stale", 10, timedelta(hours=2))
+        fresh = self.make_completed("fresh", 10, timedelta(minutes=5))
+
+        stats = enforce_storage_policy()
+
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual(stats['ttl_expired'], 1)
+        self.assertEqual(stale.status, Extraction.Status.EXPIRED)
+        self.assertEqual(stale.file_path, '')
+        self.assertFalse(os.path.exists(os.path.join(self.media_dir.name, "stale")))
+        self.assertEqual(fresh.status, Extraction.Status.COMPLETED)
+        self.assertTrue(os.path.exists(fresh.file_path))
+
+    def test_budget_evicts_least_recently_accessed(self):
+        """Over budget, the least recently accessed files go first until the low watermark."""
+        oldest = self.make_completed("oldest", 100, timedelta(minutes=30))
+        middle = self.make_completed("middle", 100, timedelta(minutes=20))
+        newest = self.make_completed("newest", 100, timedelta(minutes=10))
+
+        # Usage is summed once and tracked from what each batch expires
+        with patch('auddy_backend.extraction.lifecycle.get_storage_usage', wraps=get_storage_usage) as usage:
+            stats = enforce_storage_policy()
+        usage.assert_called_once()
+
+        self.assertEqual(stats['budget_expired'], 2)
+        self.assertEqual(stats['bytes_reclaimed'], 200)
+        self.assertEqual(stats['usage_bytes'], 100)
+        self.assertEqual(get_storage_usage(), 100)
+        statuses = dict(Extraction.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[oldest.id], Extraction.Status.EXPIRED)
+        self.assertEqual(statuses[middle.id], Extraction.Status.EXPIRED)
+        self.assertEqual(statuses[newest.id], Extraction.Status.COMPLETED)
+
+    def test_shared_file_is_kept_while_referenced(self):
+        """A file still referenced by a live row is not deleted."""
+        stale = self.make_completed("shared", 10, timedelta(hours=2))
+        Extraction.objects.create(
+            source_url=stale.source_url,
+            status=Extraction.Status.PROCESSING,
+            file_path=stale.file_path,
+        )
+
+        enforce_storage_policy()
+
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, Extraction.Status.EXPIRED)
+        self.assertTrue(os.path.exists(os.path.join(self.media_dir.name, "shared", "shared.mp3")))
+
+
+@override_settings(
+    EXTRACTION_HEARTBEAT_TIMEOUT=600,
+    EXTRACTION_REAPER_GRACE=60,
+    EXTRACTION_REAPER_MAX_ATTEMPTS=2,
+    EXTRACTION_ORPHAN_GRACE=0,
+)
+class ReaperTests(TestCase):
+    """Tests for the stale job reaper and orphan sweeps."""
+
+    def make_processing(self, heartbeat_ago, attempts=1, task_id="task"):
+        return Extraction.objects.create(
+            source_url="https://example.com/video.mp4",
+            status=Extraction.Status.PROCESSING,
+            heartbeat_at=timezone.now() - heartbeat_ago,
+            attempts=attempts,
+            task_id=task_id,
+        )
+
+    def test_silent_extractions_are_requeued_or_failed(self):
+        """Rows past the heartbeat timeout are requeued while attempts remain, otherwise failed."""
+        retryable = self.make_processing(timedelta(minutes=20), attempts=1)
+        exhausted = self.make_processing(timedelta(minutes=20), attempts=2)
+        healthy = self.make_processing(timedelta(seconds=5))
+
+        requeued, failed, revoked = reap_stale_extractions()
+
+        retryable.refresh_from_db()
+        exhausted.refresh_from_db()
+        healthy.refresh_from_db()
+        # The task ID is kept so the status endpoint keeps answering for the requeued run
+        self.assertEqual(requeued, [(retryable.id, "task")])
+        self.assertEqual(retryable.task_id, "task")
+        self.assertEqual(retryable.status, Extraction.Status.PENDING)
+        self.assertEqual(failed, 1)
+        self.assertEqual(exhausted.status, Extraction.Status.FAILED)
+        self.assertEqual(healthy.status, Extraction.Status.PROCESSING)
+        self.assertEqual(revoked, ["task"])
+
+    def test_live_task_is_never_reaped(self):
+        """A task a worker still reports is left alone, even with its heartbeat long silent."""
+        busy = self.make_processing(timedelta(minutes=20), task_id="busy")
+
+        requeued, failed, revoked = reap_stale_extractions(live_task_ids={"busy"})
+
+        self.assertEqual((requeued, failed, revoked), ([], 0, []))
+        busy.refresh_from_db()
+        self.assertEqual(busy.status, Extraction.Status.PROCESSING)
+
+    def test_dead_task_is_reaped_after_grace(self):
+        """Rows whose task no worker reports are reaped once the grace period passes."""
+        dead = self.make_processing(timedelta(minutes=3), task_id="dead")
+        alive = self.make_processing(timedelta(minutes=3), task_id="alive")
+
+        requeued, _, _ = reap_stale_extractions(live_task_ids={"alive"})
+
+        self.assertEqual([extraction_id for extraction_id, _ in requeued], [dead.id])
+        alive.refresh_from_db()
+        self.assertEqual(alive.status, Extraction.Status.PROCESSING)
+
+    def test_lost_pending_is_dispatched_again_after_two_runs(self):
+        """Dispatched rows found neither in the scheduler nor the broker are recovered on the second look."""
+        store = {}
+        connection = MagicMock()
+        connection.get.side_effect = store.get
+        connection.set.side_effect = lambda key, value, **kwargs: store.__setitem__(key, value)
+        lost, queued, scheduled, fresh = (
+            Extraction.objects.create(source_url="https://example.com/video.mp4", task_id=task_id)
+            for task_id in ("lost", "queued", "scheduled", "fresh")
+        )
+        Extraction.objects.exclude(id=fresh.id).update(created=timezone.now() - timedelta(minutes=5))
+
+        self.assertEqual(reap_lost_pending({"queued"}, {scheduled.id}, connection), [])
+        self.assertEqual(reap_lost_pending({"queued"}, {scheduled.id}, connection), [(lost.id, "lost")])
+        # Only dispatched once
+        self.assertEqual(reap_lost_pending({"queued"}, {scheduled.id}, connection), [])
+
+    @override_settings(EXTRACTION_SCHEDULER_BROKER_DEPTH=10)
+    def test_unpublished_jobs_go_back_to_the_scheduler(self):
+        """Jobs popped from the scheduler but not published are put back instead of being lost."""
+        from kombu.exceptions import OperationalError
+
+        from auddy_backend.extraction.tasks import release_scheduled
+
+        jobs = [
+            {'id': i, 'task_id': f"task-{i}", 'duration': None, 'owner': "user:1", 'enqueued_at': 0}
+            for i in range(3)
+        ]
+        with patch('auddy_backend.extraction.tasks.get_redis') as mock_redis, \
+                patch('auddy_backend.extraction.tasks.FairShareScheduler') as mock_scheduler, \
+                patch('auddy_backend.extraction.tasks.extraction_signature') as mock_signature:
+            mock_redis.return_value.llen.return_value = 0
+            mock_scheduler.return_value.pop.return_value = jobs
+            mock_signature.return_value.apply_async.side_effect = [None, OperationalError("broker down")]
+
+            self.assertEqual(release_scheduled(), 1)
+
+        mock_scheduler.return_value.requeue.assert_called_once_with(jobs[1:])
+
+    def test_sweep_removes_unreferenced_outputs(self):
+        """Only files not referenced by their extraction row are removed."""
+        extraction = Extraction.objects.create(source_url="https://example.com/video.mp4")
+        with tempfile.TemporaryDirectory() as extraction_dir:
+            directory = os.path.join(extraction_dir, str(extraction.id))
+            os.makedirs(directory)
+            kept = os.path.join(directory, "kept.mp3")
+            partial = os.path.join(directory, "partial.mp3")
+            for path in (kept, partial):
+                open(path, 'wb').close()
+            extraction.file_path = kept
+            extraction.save()
+
+            removed = sweep_orphan_files(extraction_dir, now=timezone.now() + timedelta(seconds=1))
+
+            self.assertEqual(removed, 1)
+            self.assertTrue(os.path.exists(kept))
+            self.assertFalse(os.path.exists(partial))
+
+
+class RetryPolicyTests(TestCase):
+    """Tests for error classification and retry backoff."""
+
+    def test_classify_yt_dlp_errors(self):
+        """yt-dlp messages are sorted into permanent, rate-limited and transient failures."""
+        from yt_dlp.utils import DownloadError
+
+        self.assertIsInstance(
+            classify_exception(DownloadError("ERROR: [youtube] abc: Private video")), PermanentSourceError
+        )
+        self.assertIsInstance(
+            classify_exception(DownloadError("ERROR: HTTP Error 429: Too Many Requests")), RateLimitedError
+        )
+        self.assertIsInstance(
+            classify_exception(DownloadError("ERROR: Connection reset by peer")), TransientNetworkError
+        )
+        # Throttling and yt-dlp breakage must reach the circuit breaker, not the negative cache
+        for message in ("ERROR: unable to download video data: HTTP Error 403: Forbidden",
+                        "ERROR: [youtube] abc: Requested format is not available"):
+            error = classify_exception(DownloadError(message))
+            self.assertIsInstance(error, TransientNetworkError)
+            self.assertFalse(error.cacheable)
+        self.assertIsInstance(
+            classify_exception(DownloadError("ERROR: HTTP Error 404: Not Found")), PermanentSourceError
+        )
+
+    def test_retry_delay_is_capped_and_honours_retry_after(self):
+        """Backoff never exceeds the cap, and Retry-After acts as a lower bound."""
+        for retries in range(10):
+            delay = compute_retry_delay(TransientNetworkError("x"), retries, base=10, cap=60)
+            self.assertTrue(0 <= delay <= 60)
+
+        delay = compute_retry_delay(RateLimitedError("x", retry_after=120), 0, base=10, cap=60)
+        self.assertTrue(120 <= delay <= 130)
+
+        # A short Retry-After doesn't undercut the backoff
+        for _ in range(20):
+            delay = compute_retry_delay(RateLimitedError("x", retry_after=1), 5, base=60, cap=60)
+            self.assertTrue(1 <= delay <= 60)
+        # Hours of Retry-After would outlive the broker's visibility timeout
+        error = RateLimitedError("x", retry_after=6 * 3600)
+        self.assertEqual(compute_retry_delay(error, 0, base=10, cap=60, retry_after_cap=1800), 1800)
+
+    def test_only_gone_sources_are_negatively_cached(self):
+        """404 and 410 are cached; 401, 403 and other client errors fail without blocking the source."""
+        for code in (404, 410):
+            with self.assertRaises(PermanentSourceError) as caught:
+                raise_for_status_code(code, {}, "Source")
+            self.assertTrue(caught.exception.cacheable)
+        for code in (400, 401, 403):
+            with self.assertRaises(PermanentSourceError) as caught:
+                raise_for_status_code(code, {}, "Source")
+            self.assertFalse(caught.exception.cacheable)
+
+    @patch('auddy_backend.extraction.tasks.requests.Session')
+    def test_google_drive_quota_is_rate_limited(self, mock_session):
+        """Google Drive's 403 for an exhausted download quota is retried rather than failed."""
+        response = mock_session.return_value.get.return_value
+        response.status_code = 403
+        response.headers = {}
+        response.cookies = {}
+        with tempfile.TemporaryDirectory() as root, self.assertRaises(RateLimitedError):
+            download_from_google_drive("abc", os.path.join(root, "video"))
+
+    def test_permanent_error_fails_without_retry(self):
+        """A permanent source error marks the extraction failed on the first attempt."""
+        extraction = Extraction.objects.create(source_url="https://drive.google.com/drive/folders")
+
+        with patch.object(extract_audio, 'retry') as mock_retry:
+            result = extract_audio.apply(args=[str(extraction.id)])
+
+        extraction.refresh_from_db()
+        self.assertIsInstance(result.result, PermanentSourceError)
+        self.assertEqual(extraction.status, Extraction.Status.FAILED)
+        self.assertEqual(extraction.error_message, "Invalid Google Drive URL")
+        mock_retry.assert_not_called()
+
+
+class ScratchCheckpointTests(TestCase):
+    """Tests for persistent scratch space and stage checkpoints."""
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+
+    def test_checkpoint_survives_reopen(self):
+        """A completed stage is visible to the next attempt while its artifact exists."""
+        scratch = ScratchSpace(self.root.name, 7).open()
+        source = scratch.path_for('input_video')
+        open(source, 'wb').close()
+        scratch.mark(Stage.DOWNLOADED, source)
+
+        retry = ScratchSpace(self.root.name, 7).open()
+        self.assertEqual(retry.reached(Stage.DOWNLOADED), source)
+        self.assertIsNone(retry.reached(Stage.TRANSCODED))
+
+        os.remove(source)
+        self.assertIsNone(retry.reached(Stage.DOWNLOADED))
+
+    @override_settings(EXTRACTION_CHECKPOINT_TTL=0)
+    def test_expired_checkpoint_is_discarded(self):
+        """Checkpoints older than the TTL are wiped on load."""
+        scratch = ScratchSpace(self.root.name, 7).open()
+        source = scratch.path_for('input_video')
+        open(source, 'wb').close()
+        scratch.mark(Stage.DOWNLOADED, source)
+
+        with patch('auddy_backend.extraction.scratch.time.time', return_value=scratch.checkpoint['updated'] + 1):
+            retry = ScratchSpace(self.root.name, 7).open()
+
+        self.assertIsNone(retry.reached(Stage.DOWNLOADED))
+        self.assertFalse(os.path.exists(source))
+
+    def test_retry_skips_finished_download(self):
+        """With a download checkpoint, extract_from_video goes straight to transcoding."""
+        extraction = Extraction.objects.create(source_url="https://example.com/clip.mp4")
+        scratch = ScratchSpace(self.root.name, extraction.id).open()
+        source = scratch.path_for('input_video')
+        open(source, 'wb').close()
+        scratch.mark(Stage.DOWNLOADED, source)
+
+        with patch('auddy_backend.extraction.tasks.download_with_curl') as mock_download, \
+                patch('auddy_backend.extraction.tasks.transcode') as mock_transcode, \
+                patch('auddy_backend.extraction.tasks.run', side_effect=["12.5", "Clip"]):
+            output = extract_from_video(extraction, scratch)
+
+        mock_download.assert_not_called()
+        self.assertEqual(mock_transcode.call_args[0][0], source)
+        self.assertEqual(scratch.checkpoint['stage'], Stage.TRANSCODED)
+        self.assertEqual(output, scratch.path_for(f"extracted_audio.{extraction.audio_format}"))
+        self.assertEqual(extraction.duration, 12)
+
+    def test_budget_evicts_oldest_idle_checkpoint(self):
+        """Over budget, the oldest checkpoint that isn't in use is removed."""
+        old = ScratchSpace(self.root.name, 1).open()
+        new = ScratchSpace(self.root.name, 2).open()
+        for scratch in (old, new):
+            with open(scratch.path_for('input_video'), 'wb') as f:
+                f.write(b'\0' * 100)
+        os.utime(old.path, (0, 0))
+
+        freed = enforce_scratch_budget(self.root.name, budget=150, keep=new.path)
+
+        self.assertEqual(freed, 100)
+        self.assertFalse(os.path.exists(old.path))
+        self.assertTrue(os.path.exists(new.path))
+
+    def test_budget_keeps_downloads_waiting_for_a_worker(self):
+        """A PENDING extraction's fresh checkpoint, such as an engine download, survives the budget."""
+        waiting = Extraction.objects.create(source_url="https://example.com/a.mp4")
+        abandoned = Extraction.objects.create(source_url="https://example.com/b.mp4")
+        spaces = [ScratchSpace(self.root.name, extraction.id).open() for extraction in (waiting, abandoned)]
+        for scratch in spaces:
+            with open(scratch.path_for('input_video'), 'wb') as f:
+                f.write(b'\0' * 100)
+        os.utime(spaces[1].path, (0, 0))
+        os.utime(spaces[0].path, (3000, 3000))
+
+        with self.settings(EXTRACTION_CHECKPOINT_TTL=3600):
+            freed = enforce_scratch_budget(self.root.name, budget=50, now=4000)
+
+        self.assertEqual(freed, 100)
+        self.assertTrue(os.path.exists(spaces[0].path))
+        self.assertFalse(os.path.exists(spaces[1].path))
+
+
+class ExtractionBatchAPITests(APITestCase):
+    """Tests for the batch extraction endpoints."""
+
+    @patch('auddy_backend.extraction.tasks.group')
+    def test_create_batch(self, mock_group):
+        """A batch is bulk inserted and dispatched as one group after commit."""
+        urls = [f"https://example.com/video-{i}.mp4" for i in range(3)]
+        data = {"items": [{"source_url": url, "audio_format": Extraction.Format.MP3} for url in urls]}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("api:extract-batch"), data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        batch_id = response.data["data"]["batch_id"]
+        extractions = Extraction.objects.filter(batch__public_id=batch_id)
+        self.assertEqual(sorted(extractions.values_list('source_url', flat=True)), urls)
+        self.assertTrue(all(extraction.task_id for extraction in extractions))
+        mock_group.return_value.apply_async.assert_called_once_with()
+
+    def test_batch_rejects_invalid_items(self):
+        """Any invalid item rejects the whole batch."""
+        data = {"items": [{"source_url": "https://example.com/a.mp4"}, {"source_url": "not a url"}]}
+
+        response = self.client.post(reverse("api:extract-batch"), data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Extraction.objects.count(), 0)
+
+    @patch('auddy_backend.extraction.tasks.group')
+    def test_batch_status_counts(self, mock_group):
+        """The batch status endpoint reports counts per status."""
+        data = {"items": [{"source_url": f"https://example.com/{i}.mp4"} for i in range(2)]}
+        response = self.client.post(reverse("api:extract-batch"), data, format="json")
+        batch_id = response.data["data"]["batch_id"]
+        first = Extraction.objects.filter(batch__public_id=batch_id).first()
+        Extraction.objects.filter(id=first.id).update(status=Extraction.Status.COMPLETED)
+
+        with self.assertNumQueries(1):
+            ExtractionService.get_batch_status(batch_id)
+
+        url = reverse("api:extract-batch-status", kwargs={"batch_id": batch_id})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total"], 2)
+        self.assertEqual(response.data["counts"]["completed"], 1)
+        self.assertEqual(response.data["counts"]["pending"], 1)
+        self.assertFalse(response.data["finished"])
+
+
+class PlaylistExpansionTests(TestCase):
+    """Tests for playlist and channel fan-out."""
+
+    def test_playlist_url_detection(self):
+        """Playlist and channel URLs are recognised, single videos are not."""
+        self.assertTrue(is_youtube_playlist_url("https://www.youtube.com/playlist?list=PL123"))
+        self.assertTrue(is_youtube_playlist_url("https://www.youtube.com/@somechannel/videos"))
+        self.assertFalse(is_youtube_playlist_url("https://www.youtube.com/watch?v=abc&list=PL123"))
+        self.assertFalse(is_youtube_playlist_url("https://youtu.be/abc"))
+        self.assertFalse(is_youtube_playlist_url("https://example.com/playlist?list=PL123"))
+
+    @patch('auddy_backend.extraction.tasks.group')
+    @patch('auddy_backend.extraction.tasks.get_playlist_entries')
+    def test_expansion_respects_concurrency_cap(self, mock_entries, mock_group):
+        """Every entry gets a row, but only max_concurrency of them are dispatched."""
+        mock_entries.return_value = ("My Playlist", [
+            {'source_url': f"https://www.youtube.com/watch?v={i}", 'title': f"Video {i}", 'duration': 60}
+            for i in range(5)
+        ])
+        batch = ExtractionBatch.objects.create(
+            source_url="https://www.youtube.com/playlist?list=PL123",
+            audio_format=Extraction.Format.MP3,
+            max_concurrency=2,
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            created = expand_playlist.apply(args=[batch.id]).result
+
+        self.assertEqual(created, 5)
+        entries = Extraction.objects.filter(batch=batch)
+        self.assertEqual(entries.exclude(task_id='').count(), 2)
+        batch.refresh_from_db()
+        self.assertEqual(batch.title, "My Playlist")
+        self.assertIsNotNone(batch.expanded_at)
+
+        # Finishing one entry frees a slot for the next queued one
+        Extraction.objects.filter(id=entries.order_by('id').first().id).update(status=Extraction.Status.COMPLETED)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(release_batch_slots(batch.id), 1)
+        self.assertEqual(entries.exclude(task_id='').count(), 3)
+        self.assertEqual(mock_group.return_value.apply_async.call_count, 2)
+
+
+class ClipExtractionTests(TestCase):
+    """Tests for range-limited clip extraction."""
+
+    def test_serializer_validates_clip_range(self):
+        """End must come after start, and both map onto the clip fields."""
+        from auddy_backend.extraction.api.serializers import ExtractionCreateSerializer
+
+        serializer = ExtractionCreateSerializer(
+            data={"source_url": "https://example.com/a.mp4", "start": 30, "end": 10}
+        )
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("end", serializer.errors)
+
+        serializer = ExtractionCreateSerializer(
+            data={"source_url": "https://example.com/a.mp4", "start": 10, "end": 40}
+        )
+        self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.validated_data["clip_start"], 10)
+        self.assertEqual(serializer.validated_data["clip_end"], 40)
+
+    def test_direct_clip_seeks_over_http_without_download(self):
+        """A direct-link clip is transcoded from the URL with input seeking, skipping curl."""
+        extraction = Extraction.objects.create(
+            source_url="https://example.com/long.mp4", clip_start=60, clip_end=90,
+        )
+        with tempfile.TemporaryDirectory() as root:
+            scratch = ScratchSpace(root, extraction.id).open()
+            with patch('auddy_backend.extraction.tasks.download_with_curl') as mock_download, \
+                    patch('auddy_backend.extraction.transcode.run') as mock_ffmpeg, \
+                    patch('auddy_backend.extraction.tasks.run', side_effect=["30.0", ""]):
+                extract_from_video(extraction, scratch)
+
+        mock_download.assert_not_called()
+        cmd = mock_ffmpeg.call_args[0][0]
+        self.assertEqual(cmd[:6], ['ffmpeg', '-ss', '60.000', '-t', '30.000', '-i'])
+        self.assertEqual(cmd[6], extraction.source_url)
+        self.assertEqual(extraction.duration, 30)
+
+
+@override_settings(
+    CELERY_TASK_SOFT_TIME_LIMIT=60,
+    CELERY_TASK_TIME_LIMIT=300,
+    EXTRACTION_TIME_BUDGET_BASE=30,
+    EXTRACTION_TIME_BUDGET_PER_MEDIA_SECOND=0.25,
+    EXTRACTION_TIME_BUDGET_MAX=3 * 60 * 60,
+    EXTRACTION_TIME_BUDGET_HARD_GRACE=120,
+    EXTRACTION_HEAVY_QUEUE="heavy",
+    EXTRACTION_HEAVY_DURATION_THRESHOLD=20 * 60,
+)
+class TimeBudgetTests(TestCase):
+    """Tests for duration-based time limits and heavy-queue routing."""
+
+    def test_limits_scale_with_duration(self):
+        """Short media keeps the global limits; long media gets a proportional, capped budget."""
+        self.assertEqual(compute_time_limits(60), (60, 300))
+        self.assertEqual(compute_time_limits(2 * 60 * 60), (1830, 1950))
+        self.assertEqual(compute_time_limits(100 * 60 * 60), (3 * 60 * 60, 3 * 60 * 60 + 120))
+
+    def test_long_media_is_routed_to_heavy_queue(self):
+        """Only media past the threshold leaves the default queue."""
+        self.assertEqual(dispatch_options(None), {})
+        self.assertEqual(dispatch_options(5 * 60)['queue'], "celery")
+        self.assertEqual(dispatch_options(2 * 60 * 60)['queue'], "heavy")
+
+    def test_long_video_is_handed_to_heavy_queue(self):
+        """A long YouTube video is re-dispatched with its budget instead of being extracted under the default limits."""
+        extraction = Extraction.objects.create(
+            source_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ", task_id="task-1",
+        )
+        with tempfile.TemporaryDirectory() as root, \
+                patch('auddy_backend.extraction.tasks.SCRATCH_DIR', root), \
+                patch('auddy_backend.extraction.tasks.get_video_info', return_value={'title': 'Podcast', 'duration': 7200}), \
+                patch('auddy_backend.extraction.tasks.preflight'), \
+                patch('auddy_backend.extraction.tasks.extract_from_youtube') as mock_extract, \
+                patch.object(extract_audio, 'apply_async') as mock_apply:
+            extract_audio.apply(args=[str(extraction.id)], kwargs={'offload': False}, task_id="task-1")
+
+        mock_extract.assert_not_called()
+        # Re-dispatched exactly like the original, offload flag and trace included
+        mock_apply.assert_called_once()
+        self.assertEqual(mock_apply.call_args.args, ((str(extraction.id),), {'offload': False}))
+        options = mock_apply.call_args.kwargs
+        self.assertEqual(
+            {key: options[key] for key in ('task_id', 'queue', 'soft_time_limit', 'time_limit')},
+            {'task_id': "task-1", 'queue': "heavy", 'soft_time_limit': 1830, 'time_limit': 1950},
+        )
+        self.assertIn('traceparent', options['headers'])
+        extraction.refresh_from_db()
+        self.assertEqual(extraction.status, Extraction.Status.PENDING)
+        self.assertEqual(extraction.duration, 7200)
+        self.assertEqual(extraction.attempts, 0)
+
+
+@override_settings(
+    EXTRACTION_SCHEDULER_DEFAULT_COST=600,
+    EXTRACTION_SCHEDULER_MIN_COST=30,
+    EXTRACTION_SCHEDULER_AGING_FACTOR=0.1,
+)
+class FairShareSchedulerTests(TestCase):
+    """Tests for fair-share scheduling helpers."""
+
+    def test_short_jobs_first_with_aging(self):
+        """A short job beats an earlier long one until the long job has waited long enough."""
+        long_job = job_priority(0, estimate_cost(7200))
+        self.assertLess(job_priority(60, estimate_cost(120)), long_job)
+        self.assertGreater(job_priority(800, estimate_cost(120)), long_job)
+        self.assertEqual(estimate_cost(None), 600)
+        self.assertEqual(estimate_cost(5), 30)
+
+    def test_wait_percentile(self):
+        """p95 uses the nearest rank of the recorded samples."""
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+        self.assertEqual(percentile([4.0], 95), 4.0)
+        self.assertIsNone(percentile([], 95))
+
+    def test_owner_keys(self):
+        """Users are billed by account, anonymous batches as a whole, other clients by address."""
+        batch = ExtractionBatch.objects.create()
+        self.assertEqual(extraction_owner(Extraction(batch=batch)), f"batch:{batch.id}")
+        self.assertEqual(extraction_owner(Extraction(), "10.0.0.1"), "addr:10.0.0.1")
+        self.assertEqual(extraction_owner(Extraction()), "anonymous")
+
+    @override_settings(EXTRACTION_SCHEDULER_ENABLED=True)
+    @patch('auddy_backend.extraction.tasks.release_scheduled')
+    @patch('auddy_backend.extraction.tasks.group')
+    @patch('auddy_backend.extraction.tasks.FairShareScheduler')
+    def test_redis_outage_falls_back_to_direct_dispatch(self, mock_scheduler, mock_group, mock_release):
+        """Extractions are still dispatched when the scheduler can't reach Redis."""
+        from redis.exceptions import ConnectionError
+
+        mock_scheduler.return_value.enqueue.side_effect = ConnectionError("down")
+        with self.captureOnCommitCallbacks(execute=True):
+            extraction = ExtractionService.initialize_extraction(
+                {"source_url": "https://example.com/a.mp4"}, address="10.0.0.1",
+            )
+
+        mock_scheduler.return_value.enqueue.assert_called_once()
+        self.assertEqual(mock_scheduler.return_value.enqueue.call_args[0][0], "addr:10.0.0.1")
+        mock_group.return_value.apply_async.assert_called_once()
+        self.assertTrue(extraction.task_id)
+
+
+@override_settings(
+    EXTRACTION_ADMISSION_ENABLED=True,
+    EXTRACTION_ADMISSION_LANES={"anonymous": 60, "free": 60, "pro": 600},
+    EXTRACTION_ADMISSION_MAX_DEPTH=100,
+    EXTRACTION_ADMISSION_MAX_PER_USER=3,
+    EXTRACTION_ADMISSION_MIN_THROUGHPUT=6.0,
+)
+class AdmissionControlTests(APITestCase):
+    """Tests for backlog-based admission control on the create endpoints."""
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.url = reverse("api:extract-list")
+        self.data = {"source_url": "https://example.com/video.mp4"}
+
+    def backlog(self, count, **kwargs):
+        Extraction.objects.bulk_create(
+            Extraction(source_url="https://example.com/queued.mp4", task_id=str(uuid.uuid4()), **kwargs)
+            for _ in range(count)
+        )
+
+    def test_long_backlog_rejects_free_but_admits_pro(self):
+        """Past a lane's drain limit requests get 503 with Retry-After; paid plans still get in."""
+        # 10 queued jobs at the 6/minute floor take 100s to drain, past the 60s lane
+        self.backlog(10)
+
+        response = self.client.post(self.url, self.data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "40")
+
+        self.client.force_authenticate(UserFactory(plan="pro"))
+        with patch('auddy_backend.extraction.tasks.group'):
+            response = self.client.post(self.url, self.data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @override_settings(EXTRACTION_PREFLIGHT_ON_CREATE=True)
+    @patch('auddy_backend.extraction.api.serializers.preflight')
+    def test_rejected_requests_skip_preflight(self, mock_preflight):
+        """An overloaded server answers before probing the source."""
+        self.backlog(10)
+
+        response = self.client.post(self.url, self.data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        mock_preflight.assert_not_called()
+
+    def test_undispatched_playlist_entries_do_not_fill_the_backlog(self):
+        """Entries a playlist holds back until it has a free slot don't turn other users away."""
+        batch = ExtractionBatch.objects.create(source_url="https://www.youtube.com/playlist?list=PL123")
+        Extraction.objects.bulk_create(
+            Extraction(source_url=f"https://www.youtube.com/watch?v={i}", batch=batch) for i in range(50)
+        )
+
+        with patch('auddy_backend.extraction.tasks.group'):
+            response = self.client.post(self.url, self.data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_large_batch_on_idle_cluster_is_admitted(self):
+        """The drain limit applies to the existing backlog, so a big batch gets in while it is short."""
+        data = {"items": [{"source_url": f"https://example.com/idle-{i}.mp4"} for i in range(50)]}
+        with patch('auddy_backend.extraction.tasks.group'):
+            response = self.client.post(reverse("api:extract-batch"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_batch_over_capacity_gets_413(self):
+        """A batch that could never fit is refused outright, without a pointless Retry-After."""
+        data = {"items": [{"source_url": f"https://example.com/huge-{i}.mp4"} for i in range(101)]}
+        response = self.client.post(reverse("api:extract-batch"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertNotIn("Retry-After", response)
+
+    @patch('auddy_backend.extraction.tasks.get_playlist_entries')
+    def test_playlist_fan_out_is_admitted(self, mock_entries):
+        """A playlist expanding past the user's quota records why instead of queuing its entries."""
+        mock_entries.return_value = ("Long Playlist", [
+            {'source_url': f"https://www.youtube.com/watch?v={i}", 'title': f"Video {i}", 'duration': 60}
+            for i in range(5)
+        ])
+        batch = ExtractionBatch.objects.create(
+            user=UserFactory(plan="pro"), source_url="https://www.youtube.com/playlist?list=PL123",
+        )
+
+        self.assertEqual(expand_playlist.apply(args=[batch.id]).result, 0)
+        batch.refresh_from_db()
+        self.assertIn("At most 3", batch.error_message)
+        self.assertFalse(Extraction.objects.filter(batch=batch).exists())
+
+    def test_user_over_quota_gets_429(self):
+        """A user holding too many active extractions is told to slow down."""
+        user = UserFactory(plan="pro")
+        self.backlog(3, user=user)
+        self.client.force_authenticate(user)
+
+        response = self.client.post(self.url, self.data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "10")
+
+
+@override_settings(
+    EXTRACTION_PREFLIGHT_ON_CREATE=True,
+    EXTRACTION_MAX_SOURCE_DURATION=60 * 60,
+    EXTRACTION_MAX_SOURCE_BYTES=100 * 1024**2,
+)
+class PreflightTests(TestCase):
+    """Tests for rejecting unusable sources before download."""
+
+    def setUp(self):
+        self.addresses = {"example.com": "93.184.215.14"}
+        patcher = patch(
+            'auddy_backend.extraction.preflight.socket.getaddrinfo',
+            side_effect=lambda host, *args, **kwargs: [(None, None, None, '', (self.addresses[host], 0))],
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def validate(self, **data):
+        from auddy_backend.extraction.api.serializers import ExtractionCreateSerializer
+
+        serializer = ExtractionCreateSerializer(data=data)
+        serializer.is_valid()
+        return serializer
+
+    def mock_response(self, mock_get, status_code=206, headers=None, body=b''):
+        response = mock_get.return_value
+        response.__enter__.return_value = response
+        response.is_redirect = False
+        response.status_code = status_code
+        response.headers = headers or {}
+        response.iter_content.return_value = iter([body])
+
+    def test_sniff_media(self):
+        """Container magic is recognised, HTML is not media, and unknown bytes stay undecided."""
+        self.assertTrue(sniff_media(b'\x00\x00\x00\x20ftypisom'))
+        self.assertTrue(sniff_media(b'RIFF\x00\x00\x00\x00WAVEfmt '))
+        self.assertFalse(sniff_media(b'  <!DOCTYPE html><html>'))
+        self.assertIsNone(sniff_media(b'\x01\x02\x03\x04'))
+
+    @patch('auddy_backend.extraction.preflight.requests.get')
+    def test_rejects_html_and_oversized_sources(self, mock_get):
+        """A web page or a file over the size limit is refused in the create serializer."""
+        self.mock_response(mock_get, 200, {'Content-Type': 'text/html; charset=utf-8'}, b'<!doctype html>')
+        serializer = self.validate(source_url="https://example.com/watch")
+        self.assertIn("does not look like audio or video", serializer.errors["source_url"][0])
+
+        self.mock_response(
+            mock_get, 206, {'Content-Type': 'video/mp4', 'Content-Range': f'bytes 0-63/{12 * 1024**3}'},
+            b'\x00\x00\x00\x20ftypisom',
+        )
+        serializer = self.validate(source_url="https://example.com/huge.mp4")
+        self.assertIn("12288 MB", serializer.errors["source_url"][0])
+
+        # A clip only fetches its range, so the size limit doesn't apply
+        self.assertTrue(self.validate(source_url="https://example.com/huge.mp4", start=0, end=30).is_valid())
+
+    @patch('auddy_backend.extraction.preflight.requests.get')
+    def test_private_hosts_are_never_fetched(self, mock_get):
+        """Hosts resolving to internal addresses are refused, directly or through a redirect."""
+        self.addresses.update({
+            "metadata.internal": "169.254.169.254",
+            "db.internal": "10.0.0.5",
+            "loopback.example.com": "::1",
+            "127.0.0.1": "127.0.0.1",
+        })
+        for url in ("http://metadata.internal/latest/", "http://loopback.example.com:8000/admin", "http://127.0.0.1/"):
+            self.assertEqual(self.validate(source_url=url).errors["source_url"][0], "Source is not reachable")
+        mock_get.assert_not_called()
+
+        self.mock_response(mock_get, 302, {'Location': "http://db.internal/dump"})
+        mock_get.return_value.is_redirect = True
+        self.assertEqual(
+            self.validate(source_url="https://example.com/a.mp4").errors["source_url"][0], "Source is not reachable",
+        )
+        mock_get.assert_called_once()
+
+    @patch('auddy_backend.extraction.preflight.requests.get')
+    def test_upstream_status_is_not_disclosed(self, mock_get):
+        """A failing source only tells the caller it is unreachable."""
+        self.mock_response(mock_get, 403)
+        serializer = self.validate(source_url="https://example.com/private.mp4")
+        self.assertEqual(serializer.errors["source_url"][0], "Source is not reachable")
+
+        self.mock_response(mock_get, 200, {'Content-Type': 'application/x-secret'}, b'<!doctype html>')
+        serializer = self.validate(source_url="https://example.com/page")
+        self.assertNotIn("x-secret", serializer.errors["source_url"][0])
+
+    @patch('auddy_backend.extraction.preflight.get_youtube_info')
+    def test_youtube_duration_and_live_checks(self, mock_info):
+        """Long videos and live streams are refused; accepted videos carry their metadata."""
+        url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+        mock_info.return_value = {'title': 'Talk', 'duration': 6 * 60 * 60, 'size': None, 'is_live': False}
+        self.assertIn("360 minutes", self.validate(source_url=url).errors["source_url"][0])
+        self.assertTrue(self.validate(source_url=url, start=60, end=120).is_valid())
+
+        mock_info.return_value = {'title': 'Stream', 'duration': 0, 'size': None, 'is_live': True}
+        self.assertIn("Live streams", self.validate(source_url=url).errors["source_url"][0])
+
+        mock_info.return_value = {'title': 'Talk', 'duration': 600, 'size': None, 'is_live': False}
+        serializer = self.validate(source_url=url)
+        self.assertEqual(serializer.validated_data["duration"], 600)
+        self.assertEqual(serializer.validated_data["title"], "Talk")
+
+
+@override_settings(EXTRACTION_TRANSCODE_WORKERS=4, EXTRACTION_PARALLEL_TRANSCODE_MIN_DURATION=600)
+class ParallelTranscodeTests(TestCase):
+    """Tests for splitting long encodes into frame-aligned segments."""
+
+    def test_segments_tile_the_frame_grid(self):
+        """Kept frames of consecutive segments join without gaps or overlaps."""
+        frame = 1152
+        segments = plan_segments(frame * 1000 + 17, 4, frame)
+
+        position = 0
+        for segment in segments:
+            first = segment['start'] // frame + segment['keep_from']
+            self.assertEqual(segment['start'] % frame, 0)
+            self.assertEqual(first, position)
+            if segment['keep_count'] is not None:
+                # Postroll frames are encoded past the kept range
+                self.assertGreater(segment['start'] + segment['length'], (first + segment['keep_count']) * frame)
+                position = first + segment['keep_count']
+        self.assertEqual(segments[0]['start'], 0)
+        self.assertIsNone(segments[-1]['length'])
+        self.assertEqual(segments[1]['keep_from'], 4)
+
+    def test_frame_parsers_split_streams(self):
+        """MP3 and ADTS streams are cut into whole frames, skipping junk and ID3 tags."""
+        # MPEG-1 Layer III, 128 kbps, 44.1 kHz, no padding: 417 bytes
+        mp3_frame = b'\xff\xfb\x90\x00' + b'\0' * 413
+        data = b'ID3\x04\x00\x00\x00\x00\x00\x02xx' + mp3_frame * 3
+        self.assertEqual(mp3_frames(data), [(12, 417), (429, 417), (846, 417)])
+
+        adts_frame = bytes([0xFF, 0xF1, 0x50, 0x80, 0x02, 0x1F, 0xFC]) + b'\0' * 9
+        self.assertEqual(adts_frames(b'junk' + adts_frame * 2), [(4, 16), (20, 16)])
+
+    def test_only_long_segmentable_encodes_are_split(self):
+        self.assertTrue(should_segment('mp3', 3600))
+        self.assertFalse(should_segment('mp3', 60))
+        self.assertFalse(should_segment('flac', 3600))
+        self.assertFalse(should_segment('aac', 3600, workers=1))
+        self.assertFalse(should_segment('aac', None))
+
+
+@override_settings(EXTRACTION_PROCESS_STDERR_LINES=5)
+class ProcessRunnerTests(TestCase):
+    """Tests for the bounded subprocess runner."""
+
+    def test_failure_keeps_only_stderr_tail(self):
+        """A failing command raises CalledProcessError carrying its last stderr lines."""
+        script = 'for i in $(seq 1 500); do echo "line $i" >&2; done; exit 3'
+        with self.assertRaises(subprocess.CalledProcessError) as ctx:
+            run(['sh', '-c', script])
+
+        self.assertEqual(ctx.exception.returncode, 3)
+        self.assertEqual(ctx.exception.stderr.splitlines(), [f"line {i}" for i in range(496, 501)])
+
+    def test_returns_stdout(self):
+        self.assertEqual(run(['sh', '-c', 'echo 12.5']).strip(), "12.5")
+
+    def test_cancel_kills_process_group(self):
+        """Cancellation stops the command and the children it spawned within a second or two."""
+        started = time.monotonic()
+        with tempfile.TemporaryDirectory() as root:
+            marker = os.path.join(root, 'survived')
+            with self.assertRaises(ProcessCancelled):
+                run(
+                    ['sh', '-c', f'(sleep 2; touch {marker}) & sleep 30'],
+                    should_cancel=lambda: time.monotonic() - started > 0.3,
+                )
+            self.assertLess(time.monotonic() - started, 3)
+            time.sleep(2.5)
+            self.assertFalse(os.path.exists(marker))
+
+    def test_timeout_kills_process(self):
+        started = time.monotonic()
+        with self.assertRaises(subprocess.TimeoutExpired):
+            run(['sleep', '30'], timeout=0.5)
+        self.assertLess(time.monotonic() - started, 3)
+
+    def test_progress_parser_reports_percentages(self):
+        """ffmpeg -progress blocks are turned into percentages of the expected duration."""
+        reports = []
+        parser = ProgressParser(200, reports.append)
+        for line in ["out_time_us=50000000", "progress=continue", "out_time_ms=150000000",
+                     "progress=continue", "progress=end"]:
+            parser.feed(line)
+
+        self.assertEqual(reports, [25.0, 75.0, 100.0])
+
+
+class CancellationTests(APITestCase):
+    """Tests for cancelling queued and running extractions."""
+
+    def setUp(self):
+        self.flags = set()
+        self.connection = MagicMock()
+        self.connection.set.side_effect = lambda key, *args, **kwargs: self.flags.add(key)
+        self.connection.exists.side_effect = lambda key: key in self.flags
+        patcher = patch('auddy_backend.extraction.cancellation.get_redis', return_value=self.connection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def cancel(self, extraction):
+        return self.client.post(reverse("api:extract-cancel", kwargs={"task_id": extraction.task_id}))
+
+    def test_cancel_queued_extraction_revokes_task(self):
+        """A queued extraction is marked cancelled, flagged for workers and revoked on commit."""
+        from auddy_backend.extraction.cancellation import is_cancelled
+
+        extraction = Extraction.objects.create(source_url="https://example.com/a.mp4", task_id=str(uuid.uuid4()))
+        with patch('auddy_backend.extraction.tasks.current_app') as mock_app, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.cancel(extraction)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        extraction.refresh_from_db()
+        self.assertEqual(extraction.status, Extraction.Status.CANCELLED)
+        self.assertTrue(is_cancelled(extraction.id))
+        mock_app.control.revoke.assert_called_once()
+        self.assertEqual(mock_app.control.revoke.call_args.args[0], extraction.task_id)
+
+    def test_lost_flag_still_stops_the_worker(self):
+        """With Redis down the cancel goes through and workers find it on the row instead."""
+        from redis.exceptions import RedisError
+
+        from auddy_backend.extraction.cancellation import cancel_checker, cancelled_ids
+
+        self.connection.set.side_effect = RedisError("down")
+        self.connection.exists.side_effect = RedisError("down")
+        self.connection.pipeline.return_value.execute.side_effect = RedisError("down")
+        running = Extraction.objects.create(
+            source_url="https://example.com/a.mp4", status=Extraction.Status.PROCESSING, task_id=str(uuid.uuid4()),
+        )
+        other = Extraction.objects.create(
+            source_url="https://example.com/b.mp4", status=Extraction.Status.PROCESSING, task_id=str(uuid.uuid4()),
+        )
+        checker = cancel_checker(running.id, min_interval=0, db_interval=0)
+        self.assertFalse(checker())
+
+        with patch('auddy_backend.extraction.tasks.current_app'):
+            self.assertEqual(self.cancel(running).status_code, status.HTTP_200_OK)
+
+        self.assertTrue(checker())
+        self.assertEqual(cancelled_ids([running.id, other.id]), {running.id})
+
+    def test_finished_or_foreign_extractions_cannot_be_cancelled(self):
+        done = Extraction.objects.create(
+            source_url="https://example.com/a.mp4", status=Extraction.Status.COMPLETED, task_id=str(uuid.uuid4()),
+        )
+        self.assertEqual(self.cancel(done).status_code, status.HTTP_409_CONFLICT)
+
+        # Anonymous extractions can't be reached by counting through their ids
+        anonymous = Extraction.objects.create(source_url="https://example.com/a.mp4", task_id=str(uuid.uuid4()))
+        response = self.client.post(f"/api/extract/{anonymous.id}/cancel/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        owned = Extraction.objects.create(
+            source_url="https://example.com/a.mp4", user=UserFactory(), task_id=str(uuid.uuid4()),
+        )
+        self.client.force_authenticate(UserFactory())
+        self.assertEqual(self.cancel(owned).status_code, status.HTTP_403_FORBIDDEN)
+        owned.refresh_from_db()
+        self.assertEqual(owned.status, Extraction.Status.PENDING)
+
+    def test_worker_skips_cancelled_extraction(self):
+        """A worker picking up a cancelled extraction drops it along with its earlier scratch space."""
+        extraction = Extraction.objects.create(
+            source_url="https://example.com/a.mp4", status=Extraction.Status.CANCELLED,
+        )
+        with tempfile.TemporaryDirectory() as root, \
+                patch('auddy_backend.extraction.tasks.SCRATCH_DIR', root), \
+                patch('auddy_backend.extraction.tasks.extract_from_video') as mock_extract:
+            ScratchSpace(root, extraction.id).open().mark(Stage.DOWNLOADED, "input_video")
+            extract_audio.apply(args=(extraction.id,))
+            self.assertEqual(os.listdir(root), [])
+
+        mock_extract.assert_not_called()
+        extraction.refresh_from_db()
+        self.assertEqual(extraction.attempts, 0)
+
+    def test_running_extraction_stops_and_cleans_scratch(self):
+        """A worker interrupted by cancellation keeps the CANCELLED status and removes its scratch space."""
+        extraction = Extraction.objects.create(source_url="https://example.com/a.mp4")
+
+        def cancel_midway(extraction, scratch, **kwargs):
+            open(scratch.path_for('input_video'), 'wb').close()
+            cancel_extraction(extraction)
+            raise ExtractionCancelled("stopped")
+
+        with tempfile.TemporaryDirectory() as root, \
+                patch('auddy_backend.extraction.tasks.SCRATCH_DIR', root), \
+                patch('auddy_backend.extraction.tasks.preflight'), \
+                patch('auddy_backend.extraction.tasks.resolve_duration', return_value=None), \
+                patch('auddy_backend.extraction.tasks.current_app'), \
+                patch('auddy_backend.extraction.tasks.extract_from_video', side_effect=cancel_midway):
+            extract_audio.apply(args=(extraction.id,))
+            self.assertEqual(os.listdir(root), [])
+
+        extraction.refresh_from_db()
+        self.assertEqual(extraction.status, Extraction.Status.CANCELLED)
+        self.assertEqual(extraction.error_message, "")
+
+
+    def test_youtube_encode_goes_through_cancellable_transcode(self):
+        """yt-dlp only downloads; the encode gets the cancel check instead of a postprocessor ignoring it."""
+        from auddy_backend.extraction.tasks import extract_from_youtube
+
+        extraction = Extraction.objects.create(source_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+        should_cancel = MagicMock(return_value=False)
+        with tempfile.TemporaryDirectory() as root, \
+                patch('auddy_backend.extraction.tasks.yt_dlp.YoutubeDL') as mock_ydl, \
+                patch('auddy_backend.extraction.tasks.transcode', return_value=1) as mock_transcode:
+            scratch = ScratchSpace(root, extraction.id).open()
+            source = scratch.path_for("dQw4w9WgXcQ.webm")
+            open(source, 'wb').close()
+            ydl = mock_ydl.return_value.__enter__.return_value
+            ydl.extract_info.return_value = {
+                'title': "Song", 'duration': 212, 'requested_downloads': [{'filepath': source}],
+            }
+
+            extracted = extract_from_youtube(extraction, scratch, should_cancel=should_cancel)
+
+            self.assertNotIn('postprocessors', mock_ydl.call_args.args[0])
+            self.assertEqual(mock_transcode.call_args.args[0], source)
+            self.assertIs(mock_transcode.call_args.kwargs['should_cancel'], should_cancel)
+            self.assertEqual(scratch.reached(Stage.DOWNLOADED), source)
+            self.assertEqual(extracted, scratch.path_for(f"extracted_audio.{extraction.audio_format}"))
+        self.assertEqual((extraction.title, extraction.duration), ("Song", 212))
+
+
+@override_settings(EXTRACTION_ASYNC_DOWNLOADS=True)
+class DownloadOffloadTests(TestCase):
+    """Tests for handing whole-file downloads to the download engine."""
+
+    def run_task(self, extraction, **kwargs):
+        with tempfile.TemporaryDirectory() as root, \
+                patch('auddy_backend.extraction.tasks.SCRATCH_DIR', root), \
+                patch('auddy_backend.extraction.tasks.preflight'), \
+                patch('auddy_backend.extraction.tasks.resolve_duration', return_value=None), \
+                patch('auddy_backend.extraction.tasks.get_redis') as mock_redis, \
+                patch('auddy_backend.extraction.tasks.extract_from_video', side_effect=PermanentSourceError) as mock_extract:
+            extract_audio.apply(args=(extraction.id,), kwargs=kwargs)
+        return mock_redis.return_value, mock_extract
+
+    def test_direct_download_is_queued_for_engine(self):
+        """The worker leaves the download to the engine and gives its slot back."""
+        import json
+
+        extraction = Extraction.objects.create(source_url="https://example.com/a.mp4", task_id="task-1")
+        redis, mock_extract = self.run_task(extraction)
+
+        mock_extract.assert_not_called()
+        key, payload = redis.rpush.call_args[0]
+        self.assertEqual(key, "extraction:downloads")
+        job = json.loads(payload)
+        self.assertEqual((job['id'], job['task_id']), (extraction.id, "task-1"))
+        self.assertTrue(job['path'].endswith("input_video"))
+        extraction.refresh_from_db()
+        self.assertEqual(extraction.status, Extraction.Status.PENDING)
+        self.assertEqual(extraction.attempts, 0)
+
+    def test_failed_engine_download_falls_back_to_worker(self):
+        """Handed back with offload=False, the worker downloads the source itself."""
+        extraction = Extraction.objects.create(source_url="https://example.com/a.mp4")
+        redis, mock_extract = self.run_task(extraction, offload=False)
+
+        redis.rpush.assert_not_called()
+        mock_extract.assert_called_once()
+
+    def test_jobs_waiting_for_the_engine_are_not_lost(self):
+        """The reaper counts the engine's queue as a place PENDING rows wait, and recovers the rest."""
+        from auddy_backend.extraction.tasks import find_lost_pending
+
+        store = {}
+        waiting, lost = (
+            Extraction.objects.create(source_url="https://example.com/a.mp4", task_id=str(uuid.uuid4()))
+            for _ in range(2)
+        )
+        Extraction.objects.update(created=timezone.now() - timedelta(minutes=5))
+        connection = MagicMock()
+        connection.lrange.side_effect = lambda key, *args: (
+            [json.dumps({'id': waiting.id})] if key == "extraction:downloads" else []
+        )
+        connection.hvals.return_value = []
+        connection.get.side_effect = store.get
+        connection.set.side_effect = lambda key, value, **kwargs: store.__setitem__(key, value)
+
+        with patch('auddy_backend.extraction.tasks.get_redis', return_value=connection):
+            self.assertEqual(find_lost_pending(set()), [])
+            self.assertEqual(find_lost_pending(set()), [(lost.id, lost.task_id)])
+            # Nothing can be told lost while the workers don't answer
+            self.assertEqual(find_lost_pending(None), [])
+
+
+@override_settings(EXTRACTION_ORIGIN_LIMITS_ENABLED=True, EXTRACTION_ORIGIN_WAIT_TIMEOUT=0)
+class OriginLimitTests(TestCase):
+    """Tests for the fleet-wide per-origin limits."""
+
+    def test_origin_matching(self):
+        """Subdomains share their configured origin; other hosts are limited on their own."""
+        self.assertEqual(origin_of("https://m.youtube.com/watch?v=abc"), "youtube.com")
+        self.assertEqual(origin_of("https://drive.google.com/file/d/abc/view"), "drive.google.com")
+        self.assertEqual(origin_of("https://cdn.example.com/a.mp4"), "cdn.example.com")
+        self.assertEqual(origins_for("https://www.youtube.com/watch?v=abc"), ["youtube.com", "googlevideo.com"])
+
+    def test_bandwidth_share(self):
+        """An origin's bandwidth is split between its connection slots."""
+        limits = {'default': {'concurrency': 4, 'bandwidth': 8_000_000}, 'youtube.com': {'concurrency': 4}}
+        with self.settings(EXTRACTION_ORIGIN_LIMITS=limits):
+            self.assertEqual(bandwidth_share("example.com"), 2_000_000)
+            self.assertIsNone(bandwidth_share("youtube.com"))
+
+    @patch('auddy_backend.extraction.limiter.OriginLimiter')
+    def test_busy_origin_raises_rate_limited(self, mock_limiter):
+        """A worker that can't get a slot in time backs off instead of waiting."""
+        mock_limiter.return_value.try_acquire.return_value = 0.5
+
+        with self.assertRaises(RateLimitedError) as ctx, origin_slot("https://example.com/a.mp4"):
+            pass
+        self.assertEqual(ctx.exception.retry_after, 0.5)
+
+    @patch('auddy_backend.extraction.limiter.OriginLimiter')
+    def test_slot_released_after_use(self, mock_limiter):
+        limiter = mock_limiter.return_value
+        limiter.try_acquire.return_value = 0
+
+        with origin_slot("https://example.com/a.mp4") as slot:
+            self.assertEqual([origin for origin, _ in slot.leases], ["example.com"])
+        limiter.release.assert_called_once_with("example.com", slot.leases[0][1])
+
+    @patch('auddy_backend.extraction.limiter.OriginLimiter')
+    def test_leases_are_released_when_redis_fails_midway(self, mock_limiter):
+        """A Redis error after the first origin's slot was taken gives that slot back before running unlimited."""
+        from redis.exceptions import RedisError
+
+        limiter = mock_limiter.return_value
+        limiter.try_acquire.side_effect = [0, RedisError("connection lost")]
+
+        with origin_slot("https://www.youtube.com/watch?v=abc") as slot:
+            self.assertEqual(slot.leases, [])
+        origin, _ = limiter.release.call_args.args
+        self.assertEqual(origin, "youtube.com")
+        limiter.release.assert_called_once()
+
+
+class CircuitBreakerTests(TestCase):
+    """Tests for the per-platform circuit breakers."""
+
+    def breaker(self, tripped=False):
+        connection = MagicMock()
+        connection.pipeline.return_value.__enter__.return_value.execute.return_value = [1, 1, int(tripped)]
+        return CircuitBreaker('youtube', connection=connection)
+
+    def test_platforms(self):
+        self.assertEqual(platform_of("https://youtu.be/abc"), "youtube")
+        self.assertEqual(platform_of("https://drive.google.com/file/d/abc/view"), "google_drive")
+        self.assertEqual(platform_of("https://CDN.example.com/a.mp4"), "host:cdn.example.com")
+
+    def test_only_platform_failures_count(self):
+        self.assertTrue(counts_against_platform(TransientNetworkError("x")))
+        self.assertTrue(counts_against_platform(RateLimitedError("x")))
+        self.assertFalse(counts_against_platform(PermanentSourceError("x")))
+        self.assertFalse(counts_against_platform(OriginBusyError("x")))
+
+    @override_settings(EXTRACTION_BREAKER_MIN_REQUESTS=20, EXTRACTION_BREAKER_FAILURE_RATE=0.5)
+    def test_trips_on_failure_rate(self):
+        breaker = self.breaker()
+        with patch.object(breaker, 'trip') as mock_trip:
+            with patch.object(breaker, 'window', return_value=(10, 10)):
+                breaker.record(success=False)
+            mock_trip.assert_not_called()
+
+            with patch.object(breaker, 'window', return_value=(20, 10)):
+                breaker.record(success=False)
+            mock_trip.assert_called_once()
+
+    def test_half_open_probe_outcome(self):
+        """A successful probe closes the breaker; a failed one opens it again."""
+        breaker = self.breaker(tripped=True)
+        with patch.object(breaker, 'close') as mock_close, patch.object(breaker, 'trip') as mock_trip:
+            breaker.record(success=True)
+            mock_close.assert_called_once()
+            breaker.record(success=False)
+            mock_trip.assert_called_once()
+
+    def test_open_breaker_turns_jobs_away(self):
+        breaker = self.breaker()
+        breaker.redis.pttl.return_value = 30_000
+        with self.assertRaises(PlatformUnavailableError) as ctx:
+            breaker.allow(1)
+        self.assertEqual(ctx.exception.retry_after, 30)
+
+    def run_task(self, extraction):
+        with tempfile.TemporaryDirectory() as root, \
+                patch('auddy_backend.extraction.tasks.SCRATCH_DIR', root), \
+                patch('auddy_backend.extraction.tasks.extraction_signature') as mock_signature, \
+                patch('auddy_backend.extraction.tasks.check_platform',
+                      side_effect=PlatformUnavailableError("youtube is failing", retry_after=30)):
+            try:
+                extract_audio.apply(args=(extraction.id,))
+            finally:
+                extraction.refresh_from_db()
+        return mock_signature
+
+    @override_settings(EXTRACTION_BREAKER_ON_OPEN='park')
+    def test_open_breaker_parks_job(self):
+        """A parked job waits for the breaker without spending an attempt."""
+        extraction = Extraction.objects.create(source_url="https://www.youtube.com/watch?v=abc")
+        mock_signature = self.run_task(extraction)
+
+        self.assertEqual(extraction.status, Extraction.Status.PENDING)
+        self.assertEqual(extraction.attempts, 0)
+        countdown = mock_signature.return_value.apply_async.call_args.kwargs['countdown']
+        self.assertTrue(30 <= countdown <= 60)
+
+    @override_settings(EXTRACTION_BREAKER_ON_OPEN='fail')
+    def test_open_breaker_fails_job(self):
+        extraction = Extraction.objects.create(source_url="https://www.youtube.com/watch?v=abc")
+        mock_signature = self.run_task(extraction)
+
+        self.assertEqual(extraction.status, Extraction.Status.FAILED)
+        self.assertIn("youtube is failing", extraction.error_message)
+        mock_signature.assert_not_called()
+
+
+class NegativeCacheTests(APITestCase):
+    """Tests for refusing sources that recently failed for good."""
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.url = reverse("api:extract-list")
+
+    def test_links_to_one_video_share_identity(self):
+        remember_bad_source("https://www.youtube.com/watch?v=abc&t=30", PermanentSourceError("Private video"))
+
+        for url in ("https://youtu.be/abc", "https://m.youtube.com/watch?v=abc", "https://youtube.com/shorts/abc"):
+            self.assertEqual(known_bad_source(url)["reason"], "Private video")
+        self.assertIsNone(known_bad_source("https://youtu.be/other"))
+
+    def test_only_source_failures_are_cached(self):
+        """Limits depend on the requested clip, and transient errors may clear up."""
+        remember_bad_source("https://example.com/long.mp4", LimitExceededError("Source is 300 minutes long"))
+        remember_bad_source("https://example.com/flaky.mp4", TransientNetworkError("Connection reset"))
+
+        self.assertIsNone(known_bad_source("https://example.com/long.mp4"))
+        self.assertIsNone(known_bad_source("https://example.com/flaky.mp4"))
+
+    @patch('auddy_backend.extraction.tasks.extract_from_video', side_effect=PermanentSourceError("HTTP 404"))
+    def test_worker_failure_refuses_later_requests(self, mock_extract):
+        """Once a worker finds a source gone, resubmitting it fails at once without queuing a task."""
+        extraction = Extraction.objects.create(source_url="https://example.com/gone.mp4")
+        with tempfile.TemporaryDirectory() as root, patch('auddy_backend.extraction.tasks.SCRATCH_DIR', root), \
+                patch('auddy_backend.extraction.tasks.preflight'):
+            extract_audio.apply(args=(extraction.id,))
+
+        with patch('auddy_backend.extraction.tasks.group') as mock_group:
+            response = self.client.post(self.url, {"source_url": "https://example.com/gone.mp4#t=5"}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("HTTP 404", str(response.data))
+        mock_group.assert_not_called()
+        self.assertEqual(Extraction.objects.count(), 1)
+
+
+class SourceKeyTests(TestCase):
+    """Tests for resolving submitted URLs to a canonical source key."""
+
+    def test_youtube_variants(self):
+        urls = [
+            "https://youtu.be/dQw4w9WgXcQ?t=30",
+            "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=30&list=PL123",
+            "https://m.youtube.com/watch?v=dQw4w9WgXcQ",
+            "https://music.youtube.com/watch?v=dQw4w9WgXcQ&feature=share",
+            "https://youtube.com/shorts/dQw4w9WgXcQ",
+            "https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ",
+        ]
+        for url in urls:
+            self.assertEqual(resolve_source(url), ("youtube", "dQw4w9WgXcQ"), url)
+        self.assertEqual(resolve_source("https://www.youtube.com/playlist?list=PL123").platform, "youtube_playlist")
+        self.assertFalse(is_youtube_url("https://notyoutube.com/watch?v=dQw4w9WgXcQ"))
+
+    def test_google_drive_variants(self):
+        urls = [
+            "https://drive.google.com/file/d/1AbC_d-9/view?usp=sharing",
+            "https://drive.google.com/open?id=1AbC_d-9",
+            "https://drive.google.com/uc?id=1AbC_d-9&export=download",
+            "https://docs.google.com/file/d/1AbC_d-9/edit",
+        ]
+        for url in urls:
+            self.assertEqual(resolve_source(url), ("google_drive", "1AbC_d-9"), url)
+
+    def test_direct_links_are_normalized(self):
+        self.assertEqual(
+            resolve_source("HTTPS://CDN.Example.com:443/a.mp4?b=2&a=1&utm_source=x#t=5"),
+            ("url", "cdn.example.com/a.mp4?a=1&b=2"),
+        )
+        self.assertNotEqual(
+            resolve_source("https://example.com/a.mp4"), resolve_source("https://example.com/b.mp4"),
+        )
+
+    def test_key_is_stored(self):
+        """Rows get their key whether created one by one or in bulk."""
+        extraction = Extraction.objects.create(source_url="https://youtu.be/dQw4w9WgXcQ")
+        self.assertEqual(extraction.source_key, "youtube:dQw4w9WgXcQ")
+
+        with patch('auddy_backend.extraction.tasks.group'):
+            _, extractions = ExtractionService.initialize_batch([{"source_url": "https://m.youtube.com/watch?v=xyz"}])
+        self.assertEqual(Extraction.objects.get(id=extractions[0].id).source_key, "youtube:xyz")
+
+
+class MetricsTests(TestCase):
+    """Tests for per-stage timing and the Prometheus endpoint."""
+
+    def sample(self, name, **labels):
+        from prometheus_client import REGISTRY
+
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_stage_timer(self):
+        """Each stage is observed once it ends, labeled by platform rather than URL."""
+        extraction = Extraction(source_url="https://youtu.be/abc", audio_format="flac")
+        labels = {'stage': 'download', 'platform': 'youtube', 'format': 'flac'}
+        before = self.sample('extraction_stage_duration_seconds_count', **labels)
+
+        timer = StageTimer(extraction)
+        timer.enter('download')
+        timer.downloaded(1000)
+        timer.enter('transcode')
+        timer.finish()
+
+        self.assertEqual(set(timer.durations), {'download', 'transcode'})
+        self.assertEqual(timer.bytes_in, 1000)
+        self.assertEqual(self.sample('extraction_stage_duration_seconds_count', **labels), before + 1)
+
+    @override_settings(EXTRACTION_METRICS_TOKEN="secret")
+    def test_scrape_endpoint(self):
+        url = reverse("metrics")
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        response = self.client.get(url, HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"extraction_stage_duration_seconds", response.content)
+
+
+class ExecutionProfileTests(TestCase):
+    """Tests for the execution profile kept on finished extractions."""
+
+    def run_task(self, extraction, **patches):
+        with tempfile.TemporaryDirectory() as root, \
+                patch('auddy_backend.extraction.tasks.SCRATCH_DIR', os.path.join(root, 'scratch')), \
+                patch('auddy_backend.extraction.tasks.EXTRACTION_DIR', os.path.join(root, 'final')), \
+                patch('auddy_backend.extraction.tasks.preflight'), \
+                patch('auddy_backend.extraction.tasks.resolve_duration', return_value=None), \
+                patch('auddy_backend.extraction.tasks.extract_from_video', **patches):
+            extract_audio.apply(args=(extraction.id,))
+        extraction.refresh_from_db()
+        return extraction.profile
+
+    def test_profile_written_at_finalize(self):
+        extraction = Extraction.objects.create(source_url="https://example.com/a.mp4")
+
+        def extract(extraction, scratch, timer, **kwargs):
+            timer.enter('transcode')
+            timer.note(encoder='libmp3lame', segments=4)
+            path = scratch.path_for('extracted_audio.mp3')
+            with open(path, 'wb') as f:
+                f.write(b'x' * 100)
+            return path
+
+        profile = self.run_task(extraction, side_effect=extract)
+
+        self.assertEqual(set(profile['stages']), {'resolve', 'transcode', 'finalize'})
+        self.assertEqual(profile['bytes_out'], 100)
+        self.assertEqual((profile['encoder'], profile['segments']), ('libmp3lame', 4))
+        self.assertEqual(profile['retries'], 0)
+        self.assertTrue(profile['worker'])
+
+    def test_profile_written_on_final_failure(self):
+        extraction = Extraction.objects.create(source_url="https://example.com/a.mp4")
+        profile = self.run_task(extraction, side_effect=PermanentSourceError("HTTP 404"))
+        self.assertEqual(profile['error_kind'], "permanent")
+        self.assertIsNone(profile['bytes_out'])
+
+
+class EtaTests(TestCase):
+    """Tests for completion ETA predictions."""
+
+    def model(self, overhead=None, rate=None, samples=None):
+        connection = MagicMock()
+        connection.hmget.return_value = [overhead, rate, samples]
+        return ThroughputModel('youtube', 'mp3', connection=connection)
+
+    @override_settings(EXTRACTION_ETA_PRIOR_OVERHEAD=10, EXTRACTION_ETA_PRIOR_RATE=0.1)
+    def test_priors_until_runs_are_recorded(self):
+        self.assertEqual(self.model().predict(600), 70)
+
+    @override_settings(EXTRACTION_ETA_LEARNING=True)
+    def test_learnt_rates(self):
+        self.assertEqual(self.model(b'5', b'0.5', b'3').predict(100), 55)
+
+    @override_settings(EXTRACTION_ETA_LEARNING=True, EXTRACTION_ETA_PRIOR_OVERHEAD=10, EXTRACTION_ETA_PRIOR_RATE=0.1)
+    def test_record_reports_prediction_error(self):
+        model = self.model()
+        error = model.record(overhead=10, work=40, seconds=100)
+        # Predicted 20s for a run that took 50s
+        self.assertAlmostEqual(error, 0.6)
+        args = model.redis.register_script.return_value.call_args.kwargs['args']
+        self.assertEqual(args[:2], [10, 0.4])
+
+    @override_settings(EXTRACTION_ETA_LEARNING=True)
+    def test_resumed_runs_not_recorded(self):
+        extraction = Extraction.objects.create(source_url="https://example.com/a.mp4", duration=100)
+        timer = StageTimer(extraction)
+        timer.durations = {'transcode': 5}
+        timer.note(resumed_from='downloaded')
+        with patch('auddy_backend.extraction.eta.model_for') as mock_model:
+            record_run(extraction, timer)
+        mock_model.assert_not_called()
+
+    @override_settings(EXTRACTION_ETA_PRIOR_OVERHEAD=10, EXTRACTION_ETA_PRIOR_RATE=0.1)
+    def test_queued_extraction_waits_for_those_ahead(self):
+        Extraction.objects.create(source_url="https://example.com/a.mp4", task_id="queued")
+        # Held back by its batch's concurrency cap, so not ahead of anyone
+        Extraction.objects.create(source_url="https://example.com/held.mp4")
+        extraction = Extraction.objects.create(source_url="https://example.com/b.mp4", duration=100, task_id="b")
+        with patch('auddy_backend.extraction.eta.get_backlog_snapshot', return_value=(2, 0.1)):
+            self.assertEqual(estimate_eta(extraction), 10 + 20)
+
+    @override_settings(EXTRACTION_ETA_PRIOR_OVERHEAD=10, EXTRACTION_ETA_PRIOR_RATE=0.1)
+    def test_list_shares_one_context(self):
+        """A whole batch is estimated with one query however many rows it has."""
+        from auddy_backend.extraction.api.serializers import ExtractionStatusSerializer
+
+        extractions = [
+            Extraction.objects.create(source_url=f"https://example.com/{i}.mp4", duration=100, task_id=f"task-{i}")
+            for i in range(5)
+        ]
+        with patch('auddy_backend.extraction.eta.get_backlog_snapshot', return_value=(5, 0.1)), \
+                self.assertNumQueries(1):
+            data = ExtractionStatusSerializer(
+                extractions, many=True, context={'eta': eta_context(extractions)},
+            ).data
+        self.assertEqual([row['eta_seconds'] for row in data], [20, 30, 40, 50, 60])
+
+    @override_settings(EXTRACTION_ETA_PRIOR_OVERHEAD=10, EXTRACTION_ETA_PRIOR_RATE=0.1)
+    def test_running_extraction_uses_progress(self):
+        extraction = Extraction.objects.create(
+            source_url="https://example.com/a.mp4", duration=100, status=Extraction.Status.PROCESSING,
+        )
+        self.assertEqual(estimate_eta(extraction), 20)
+        progress_reporter(extraction.id, lambda: None)(75)
+        self.assertEqual(estimate_eta(extraction), 5)
+
+        extraction.status = Extraction.Status.COMPLETED
+        self.assertIsNone(estimate_eta(extraction))
+
+
+class TracingTests(APITestCase):
+    """Tests for trace propagation from the API through Celery to subprocesses."""
+
+    TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+    def test_parse_traceparent(self):
+        context = parse_traceparent(self.TRACEPARENT)
+        self.assertEqual(context.trace_id, "4bf92f3577b34da6a3ce929d0e0e4736")
+        self.assertTrue(context.sampled)
+        self.assertEqual(context.traceparent, self.TRACEPARENT)
+        self.assertIsNone(parse_traceparent("00-xyz-00f067aa0ba902b7-01"))
+        self.assertIsNone(parse_traceparent(None))
+
+    def test_spans_nest(self):
+        previous = current_traceparent()
+        with span('outer') as outer:
+            with span('inner') as inner:
+                self.assertEqual(current_traceparent(), inner.context.traceparent)
+        self.assertEqual(inner.context.trace_id, outer.context.trace_id)
+        self.assertEqual(inner.parent_id, outer.context.span_id)
+        self.assertEqual(current_traceparent(), previous)
+
+    @patch('auddy_backend.extraction.tasks.group', side_effect=lambda signatures: MagicMock(tasks=list(signatures)))
+    @patch('auddy_backend.extraction.tasks.extraction_signature')
+    def test_create_hands_trace_to_task(self, mock_signature, mock_group):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("api:extract-list"),
+                {"source_url": "https://example.com/traced.mp4", "audio_format": "mp3"},
+                format="json",
+                HTTP_TRACEPARENT=self.TRACEPARENT,
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        traceparent = parse_traceparent(mock_signature.call_args.kwargs['traceparent'])
+        self.assertEqual(traceparent.trace_id, "4bf92f3577b34da6a3ce929d0e0e4736")
+
+    def test_task_stages_and_processes_join_trace(self):
+        extraction = Extraction.objects.create(source_url="https://example.com/a.mp4")
+
+        def extract(extraction, scratch, timer, **kwargs):
+            timer.enter('transcode')
+            run(['true'])
+            path = scratch.path_for('extracted_audio.mp3')
+            with open(path, 'wb') as f:
+                f.write(b'x')
+            return path
+
+        with tempfile.TemporaryDirectory() as root, \
+                override_settings(
+                    EXTRACTION_TRACE_EXPORTER='auddy_backend.extraction.tracing.FileExporter',
+                    EXTRACTION_TRACE_FILE=os.path.join(root, 'spans.jsonl'),
+                ), \
+                patch('auddy_backend.extraction.tasks.SCRATCH_DIR', os.path.join(root, 'scratch')), \
+                patch('auddy_backend.extraction.tasks.EXTRACTION_DIR', os.path.join(root, 'final')), \
+                patch('auddy_backend.extraction.tasks.preflight'), \
+                patch('auddy_backend.extraction.tasks.resolve_duration', return_value=None), \
+                patch('auddy_backend.extraction.tasks.extract_from_video', side_effect=extract):
+            get_exporter.cache_clear()
+            try:
+                extract_audio.apply(args=(extraction.id,), headers={'traceparent': self.TRACEPARENT})
+            finally:
+                get_exporter.cache_clear()
+            with open(os.path.join(root, 'spans.jsonl')) as f:
+                spans = {entry['name']: entry for entry in map(json.loads, f)}
+
+        task_span = spans.pop(f"task {extract_audio.name}")
+        self.assertEqual(set(spans), {'stage resolve', 'stage transcode', 'exec true', 'stage finalize'})
+        self.assertEqual(task_span['parent_id'], "00f067aa0ba902b7")
+        self.assertEqual({entry['trace_id'] for entry in spans.values()}, {"4bf92f3577b34da6a3ce929d0e0e4736"})
+        self.assertEqual(spans['stage transcode']['parent_id'], task_span['span_id'])
+        self.assertEqual(spans['exec true']['parent_id'], spans['stage transcode']['span_id'])
+
+
+class ProfilingTests(APITestCase):
+    """Tests for opt-in profiling of extraction runs."""
+
+    def test_sampler_records_running_stack(self):
+        profiler = SamplingProfiler(interval=0.001).start()
+        deadline = time.monotonic() + 0.1
+        while time.monotonic() < deadline:
+            pass
+        profiler.stop()
+        self.assertIn('test_sampler_records_running_stack', profiler.collapsed())
+
+    def test_hot_functions(self):
+        profile = TaskProfile(stacks="a;b 3\nc;b 2\nb;a 1", sample_count=6)
+        self.assertEqual(profile.hot_functions(), [('b', 5), ('a', 1)])
+
+    def run_task(self, extraction):
+        def extract(extraction, scratch, timer, **kwargs):
+            run(['true'])
+            path = scratch.path_for('extracted_audio.mp3')
+            with open(path, 'wb') as f:
+                f.write(b'x')
+            return path
+
+        with tempfile.TemporaryDirectory() as root, \
+                patch('auddy_backend.extraction.tasks.SCRATCH_DIR', os.path.join(root, 'scratch')), \
+                patch('auddy_backend.extraction.tasks.EXTRACTION_DIR', os.path.join(root, 'final')), \
+                patch('auddy_backend.extraction.tasks.preflight'), \
+                patch('auddy_backend.extraction.tasks.resolve_duration', return_value=None), \
+                patch('auddy_backend.extraction.tasks.extract_from_video', side_effect=extract):
+            extract_audio.apply(args=(extraction.id,))
+
+    @override_settings(EXTRACTION_PROFILING_SAMPLE_RATE=0)
+    def test_requested_profile_stored(self):
+        extraction = Extraction.objects.create(source_url="https://example.com/a.mp4", profile_requested=True)
+        self.run_task(extraction)
+
+        profile = extraction.task_profiles.get()
+        self.assertEqual((profile.trigger, profile.state), ('requested', 'SUCCESS'))
+        self.assertEqual(profile.subprocesses['true']['count'], 1)
+        self.assertGreaterEqual(profile.wall_time, profile.subprocess_time)
+
+    @override_settings(EXTRACTION_PROFILING_SAMPLE_RATE=0)
+    def test_runs_not_profiled_by_default(self):
+        extraction = Extraction.objects.create(source_url="https://example.com/a.mp4")
+        self.run_task(extraction)
+        self.assertFalse(extraction.task_profiles.exists())
+
+    def test_only_staff_request_profiles(self):
+        data = {"source_url": "https://example.com/profiled.mp4", "debug_profile": True}
+        response = self.client.post(reverse("api:extract-list"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(UserFactory(is_staff=True))
+        with patch('auddy_backend.extraction.services.submit_extractions'):
+            response = self.client.post(reverse("api:extract-list"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Extraction.objects.get(source_url=data["source_url"]).profile_requested)
@@ -0,0 +1,236 @@
+import re
+import json
+import time
+import random
+import socket
+import logging
+import secrets
+import threading
+from functools import lru_cache, wraps
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import NamedTuple
+
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# W3C Trace Context header, carried on HTTP requests and Celery messages alike
+TRACEPARENT_HEADER = 'traceparent'
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+current_span = ContextVar('current_span', default=None)
+# Spans of the tasks running in this process, ended by the task_postrun handler
+task_spans = {}
+
+
+class SpanContext(NamedTuple):
+    """The part of a span that crosses process boundaries."""
+
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+def parse_traceparent(value):
+    """Return the ``SpanContext`` a ``traceparent`` header carries, or None if it is missing or malformed."""
+    match = TRACEPARENT.match((value or '').strip().lower())
+    if not match or match.group(1) == '0' * 32 or match.group(2) == '0' * 16:
+        return None
+    return SpanContext(match.group(1), match.group(2), bool(int(match.group(3), 16) & 1))
+
+
+class Span:
+    """
+    One timed operation within a trace.
+
+    A span continues ``parent``, a ``SpanContext`` from this process or
+    another, or starts a new trace sampled at ``EXTRACTION_TRACE_SAMPLE_RATE``.
+    Sampled spans are handed to the configured exporter when they end.
+    """
+
+    def __init__(self, name, parent=None, attributes=None):
+        if parent is None:
+            sampled = random.random() < settings.EXTRACTION_TRACE_SAMPLE_RATE  # noqa: S311
+            parent_id, trace_id = None, secrets.token_hex(16)
+        else:
+            trace_id, parent_id, sampled = parent
+        self.name = name
+        self.context = SpanContext(trace_id, secrets.token_hex(8), sampled)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.status = 'ok'
+        self.started_at = time.time()
+        self.started = time.monotonic()
+        self.duration = None
+        self.token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, error):
+        self.status = 'error'
+        self.attributes['error'] = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.duration is not None:
+            return
+        self.duration = time.monotonic() - self.started
+        if self.context.sampled and (exporter := get_exporter()):
+            try:
+                exporter.export(self)
+            except Exception as e:
+                logger.warning(f"Unable to export span {self.name}: {str(e)}")
+
+    def as_dict(self):
+        return {
+            'trace_id': self.context.trace_id,
+            'span_id': self.context.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.started_at,
+            'duration': round(self.duration, 6) if self.duration is not None else None,
+            'status': self.status,
+            'host': socket.gethostname(),
+            'attributes': self.attributes,
+        }
+
+
+class ConsoleExporter:
+    """Log each span as one line of JSON, for local use."""
+
+    def export(self, span):
+        logger.info(f"span {json.dumps(span.as_dict(), default=str)}")
+
+
+class FileExporter:
+    """Append each span as a line of JSON to ``EXTRACTION_TRACE_FILE``, for tools that assemble traces."""
+
+    def __init__(self, path=None):
+        self.path = path or settings.EXTRACTION_TRACE_FILE
+        self.lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.as_dict(), default=str) + '\n'
+        with self.lock, open(self.path, 'a') as f:
+            f.write(line)
+
+
+@lru_cache(maxsize=None)
+def get_exporter():
+    """Return the exporter named by ``EXTRACTION_TRACE_EXPORTER``, or None when tracing is off."""
+    if not settings.EXTRACTION_TRACE_EXPORTER:
+        return None
+    return import_string(settings.EXTRACTION_TRACE_EXPORTER)()
+
+
+def start_span(name, parent=None, **attributes):
+    """
+    Start a span and make it current until :func:`end_span`.
+
+    Without ``parent`` the span is a child of the current one, if any. Spans
+    must be ended in the reverse order they were started.
+    """
+    span = Span(name, parent or (current.context if (current := current_span.get()) else None), attributes)
+    span.token = current_span.set(span)
+    return span
+
+
+def end_span(span):
+    span.end()
+    try:
+        current_span.reset(span.token)
+    except ValueError:
+        # Started in another context, such as a different thread's
+        pass
+
+
+@contextmanager
+def span(name, parent=None, **attributes):
+    """Run the block in a new span, marked failed if the block raises."""
+    current = start_span(name, parent, **attributes)
+    try:
+        yield current
+    except BaseException as e:
+        current.fail(e)
+        raise
+    finally:
+        end_span(current)
+
+
+def traced(name):
+    """Run a view in a span, continuing the trace of an incoming ``traceparent`` header."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            parent = parse_traceparent(request.headers.get(TRACEPARENT_HEADER))
+            with span(name, parent, method=request.method, path=request.path) as current:
+                response = view(self, request, *args, **kwargs)
+                current.set(status_code=response.status_code)
+                return response
+        return wrapper
+    return decorator
+
+
+def current_traceparent():
+    """Return the ``traceparent`` of the current span, to hand to work that continues the trace elsewhere."""
+    current = current_span.get()
+    return current.context.traceparent if current else None
+
+
+def trace_options(traceparent):
+    """Return ``apply_async`` options carrying ``traceparent`` to the task, if there is one."""
+    return {'headers': {TRACEPARENT_HEADER: traceparent}} if traceparent else {}
+
+
+def request_traceparent(request):
+    # Custom message headers become attributes of the task request, but stay
+    # under ``headers`` when the task is applied eagerly
+    return request.get(TRACEPARENT_HEADER) or (request.headers or {}).get(TRACEPARENT_HEADER)
+
+
+class TraceContextFilter(logging.Filter):
+    """Add the ``trace_id`` of the current span to log records, so logs of one trace can be found together."""
+
+    def filter(self, record):
+        current = current_span.get()
+        record.trace_id = current.context.trace_id if current else '-'
+        return True
+
+
+@before_task_publish.connect
+def inject_traceparent(headers=None, **kwargs):
+    """Carry the current trace into tasks published while it runs, including retries and re-dispatches."""
+    traceparent = current_traceparent()
+    if headers is not None and traceparent and not headers.get(TRACEPARENT_HEADER):
+        headers[TRACEPARENT_HEADER] = traceparent
+
+
+@task_prerun.connect
+def start_task_span(task_id=None, task=None, **kwargs):
+    """
+    Run a task in a span under the trace it was published in.
+
+    Tasks published outside any trace, such as periodic housekeeping, are
+    not traced.
+    """
+    parent = parse_traceparent(request_traceparent(task.request))
+    if parent is not None:
+        task_spans[task_id] = start_span(f"task {task.name}", parent, task_id=task_id, retries=task.request.retries)
+
+
+@task_postrun.connect
+def end_task_span(task_id=None, state=None, retval=None, **kwargs):
+    task_span = task_spans.pop(task_id, None)
+    if task_span is None:
+        return
+    task_span.set(state=state)
+    if state == 'FAILURE':
+        task_span.fail(retval)
+    end_span(task_span)
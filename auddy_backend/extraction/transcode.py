@@ -0,0 +1,325 @@
+import os
+import shutil
+import logging
+import threading
+import subprocess
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from contextvars import copy_context
+
+from django.conf import settings
+
+from auddy_backend.extraction.budget import probe_duration
+from auddy_backend.extraction.runner import run
+
+logger = logging.getLogger(__name__)
+
+# ffmpeg encoder options per output format
+ENCODER_ARGS = {
+    'mp3': ['-c:a', 'libmp3lame', '-q:a', '2'],
+    'aac': ['-c:a', 'aac', '-q:a', '2'],
+    'wav': ['-c:a', 'pcm_s16le'],
+    'flac': ['-c:a', 'flac'],
+    'ogg': ['-c:a', 'libvorbis', '-q:a', '5'],
+}
+
+# Formats that can be encoded as independent segments and joined at frame boundaries.
+# ``muxer`` writes bare frames we can cut, and ``args`` make every frame decodable
+# without bits borrowed from the previous one (the MP3 bit reservoir).
+SEGMENTABLE = {
+    'mp3': {'muxer': 'mp3', 'args': ['-reservoir', '0', '-write_xing', '0', '-id3v2_version', '0']},
+    'aac': {'muxer': 'adts', 'args': []},
+}
+# Frames encoded before and after each segment and then dropped, so the frames
+# either side of a join are computed from the real signal on both sides
+PREROLL_FRAMES = 4
+POSTROLL_FRAMES = 4
+# Seconds between progress reports of a parallel encode
+PROGRESS_INTERVAL = 1.0
+
+MPEG1_SAMPLE_RATES = (32000, 44100, 48000)
+MP3_BITRATES = {
+    3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],  # MPEG-1
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],      # MPEG-2
+    0: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],      # MPEG-2.5
+}
+MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def encoder_args(audio_format):
+    """Return the ffmpeg encoder options for ``audio_format``."""
+    return ENCODER_ARGS.get(audio_format, ['-c:a', audio_format])
+
+
+def encoder_name(audio_format):
+    """Return the name of the ffmpeg encoder used for ``audio_format``."""
+    return encoder_args(audio_format)[1]
+
+
+def clip_args(start=None, end=None):
+    """Return ffmpeg input options that seek to the ``start``..``end`` range in seconds, if any."""
+    args = []
+    if start:
+        args += ['-ss', f"{start:.3f}"]
+    if end is not None:
+        args += ['-t', f"{end - (start or 0):.3f}"]
+    return args
+
+
+def frame_size(audio_format, sample_rate):
+    """Return the number of samples per encoded frame."""
+    if audio_format == 'mp3':
+        return 1152 if sample_rate in MPEG1_SAMPLE_RATES else 576
+    return 1024
+
+
+def mp3_frames(data):
+    """Return ``(offset, length)`` of every MPEG audio Layer III frame in ``data``."""
+    frames = []
+    position = 0
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        position = 10 + size
+    while position + 4 <= len(data):
+        b1, b2 = data[position + 1], data[position + 2]
+        version, layer = (b1 >> 3) & 3, (b1 >> 1) & 3
+        bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+        if data[position] != 0xFF or b1 & 0xE0 != 0xE0 or version == 1 or layer != 1 \
+                or bitrate_index in (0, 15) or rate_index == 3:
+            position += 1
+            continue
+        bitrate = MP3_BITRATES[version][bitrate_index] * 1000
+        sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+        length = (144 if version == 3 else 72) * bitrate // sample_rate + ((b2 >> 1) & 1)
+        frames.append((position, length))
+        position += length
+    return frames
+
+
+def adts_frames(data):
+    """Return ``(offset, length)`` of every ADTS frame in ``data``."""
+    frames = []
+    position = 0
+    while position + 7 <= len(data):
+        if data[position] != 0xFF or data[position + 1] & 0xF6 != 0xF0:
+            position += 1
+            continue
+        length = ((data[position + 3] & 3) << 11) | (data[position + 4] << 3) | (data[position + 5] >> 5)
+        if length < 7:
+            position += 1
+            continue
+        frames.append((position, length))
+        position += length
+    return frames
+
+
+def plan_segments(total_samples, count, frame, preroll=PREROLL_FRAMES, postroll=POSTROLL_FRAMES):
+    """
+    Split ``total_samples`` into ``count`` segments on the frame grid of a single-pass encode.
+
+    Returns dicts with the input ``start`` and ``length`` in samples
+    (``length`` is None for the last segment, which runs to the end) and the
+    range of encoded frames to keep: ``keep_from`` and ``keep_count`` (None
+    for all remaining). Every boundary is a whole number of frames, so segment
+    ``k`` starts ``preroll`` frames early and dropping those frames lines its
+    output up exactly with where segment ``k - 1`` stopped.
+    """
+    total_frames = -(-total_samples // frame)
+    bounds = [0] + [round(k * total_frames / count) for k in range(1, count)] + [total_frames]
+    segments = []
+    for k in range(count):
+        first, last = bounds[k], bounds[k + 1]
+        lead = min(preroll, first)
+        start = (first - lead) * frame
+        final = k == count - 1
+        segments.append({
+            'start': start,
+            'length': None if final else (last + postroll) * frame - start,
+            'keep_from': lead,
+            'keep_count': None if final else last - first,
+        })
+    return segments
+
+
+def should_segment(audio_format, duration, workers=None):
+    """Return True when an encode of ``duration`` seconds is worth splitting across cores."""
+    workers = workers or settings.EXTRACTION_TRANSCODE_WORKERS or os.cpu_count() or 1
+    return (
+        audio_format in SEGMENTABLE
+        and workers > 1
+        and bool(duration)
+        and duration >= settings.EXTRACTION_PARALLEL_TRANSCODE_MIN_DURATION
+    )
+
+
+def probe_sample_rate(source):
+    """Return the sample rate of the first audio stream of ``source``, or None."""
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'a:0',
+        '-show_entries', 'stream=sample_rate',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        source,
+    ]
+    try:
+        return int(run(cmd, timeout=30).strip())
+    except (subprocess.SubprocessError, OSError, ValueError):
+        return None
+
+
+def thread_args():
+    """Return the ffmpeg option capping its threads, if a cap is configured."""
+    threads = settings.EXTRACTION_FFMPEG_THREADS
+    return ['-threads', str(threads)] if threads else []
+
+
+def transcode_serial(source, output_path, audio_format, start=None, end=None, duration=None,
+                     on_progress=None, should_cancel=None):
+    """Encode the audio of ``source`` with a single ffmpeg process."""
+    cmd = [
+        'ffmpeg',
+        *clip_args(start, end),
+        '-i', source,
+        '-vn',  # Disable video
+        *thread_args(),
+        *encoder_args(audio_format),
+        '-y',  # Overwrite output file
+        output_path,
+    ]
+    logger.info(f"Running FFmpeg: {' '.join(cmd)}")
+    run(cmd, duration=duration, on_progress=on_progress if duration else None, should_cancel=should_cancel)
+
+
+def transcode_parallel(source, output_path, audio_format, duration, start=None, workers=None,
+                       on_progress=None, should_cancel=None):
+    """
+    Encode ``duration`` seconds of ``source`` as segments on all cores and join them gaplessly.
+
+    Each segment is a separate single-threaded ffmpeg seeking straight to its
+    range, run from a thread pool (Celery's prefork children can't fork a
+    process pool of their own). Segments overlap by a few frames, are cut back
+    to whole frames on the grid of a one-pass encode, concatenated as raw
+    frames and remuxed so the container headers describe the whole file.
+    """
+    spec = SEGMENTABLE[audio_format]
+    workers = workers or settings.EXTRACTION_TRANSCODE_WORKERS or os.cpu_count() or 1
+    sample_rate = probe_sample_rate(source) or 44100
+    if audio_format == 'mp3' and sample_rate not in MPEG1_SAMPLE_RATES:
+        # Keep MP3 on a single frame size by resampling to an MPEG-1 rate
+        sample_rate = 44100
+    frame = frame_size(audio_format, sample_rate)
+    total = int(duration * sample_rate)
+    segments = plan_segments(total, workers, frame)
+    work_dir = f"{output_path}.parts"
+    os.makedirs(work_dir, exist_ok=True)
+    offset = start or 0
+    # Segments are about the same length, so overall progress is their mean
+    progress = [0.0] * len(segments)
+    # Set when the caller is interrupted (e.g. by a soft time limit) to stop the other segments
+    abort = threading.Event()
+
+    def stopped():
+        return abort.is_set() or bool(should_cancel and should_cancel())
+
+    def segment_progress(index):
+        def report(percent):
+            progress[index] = percent
+        return report
+
+    def encode(index):
+        segment = segments[index]
+        # Segments start on whole frames, so the encoder delay is the same in
+        # every segment and its frames fall on the grid of a one-pass encode
+        begin = offset + segment['start'] / sample_rate
+        cmd = ['ffmpeg', '-v', 'error', '-ss', f"{begin:.6f}"]
+        if segment['length'] is not None:
+            cmd += ['-t', f"{segment['length'] / sample_rate:.6f}"]
+        elif start is not None:
+            cmd += ['-t', f"{offset + duration - begin:.6f}"]
+        path = os.path.join(work_dir, f"{index:04d}.{spec['muxer']}")
+        cmd += [
+            '-i', source,
+            '-vn',
+            '-ar', str(sample_rate),
+            '-threads', '1',
+            *encoder_args(audio_format),
+            *spec['args'],
+            '-f', spec['muxer'],
+            '-y', path,
+        ]
+        run(
+            cmd,
+            duration=(segment['length'] or (total - segment['start'])) / sample_rate,
+            on_progress=segment_progress(index),
+            should_cancel=stopped,
+        )
+        return path
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Each segment runs in a copy of this context, so its spans join the current trace
+            futures = [pool.submit(copy_context().run, encode, index) for index in range(len(segments))]
+            try:
+                # Report from this thread, so callbacks never run on the pool's threads
+                pending = futures
+                while pending:
+                    _, pending = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_EXCEPTION)
+                    if on_progress:
+                        on_progress(sum(progress) / len(progress))
+                    failed = [future for future in futures if future.done() and future.exception()]
+                    if failed:
+                        failed[0].result()
+                paths = [future.result() for future in futures]
+            except BaseException:
+                abort.set()
+                raise
+
+        split = mp3_frames if audio_format == 'mp3' else adts_frames
+        joined = os.path.join(work_dir, f"joined.{spec['muxer']}")
+        with open(joined, 'wb') as out:
+            for path, segment in zip(paths, segments):
+                with open(path, 'rb') as f:
+                    data = f.read()
+                frames = split(data)[segment['keep_from']:]
+                if segment['keep_count'] is not None:
+                    frames = frames[:segment['keep_count']]
+                for position, length in frames:
+                    out.write(data[position:position + length])
+
+        # Remux so the headers (Xing frame count, seek table) cover the joined stream
+        remux = ['ffmpeg', '-v', 'error', '-i', joined, '-c', 'copy', '-y', output_path]
+        run(remux, should_cancel=should_cancel)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    logger.info(f"Encoded {duration:.0f}s of audio as {len(segments)} parallel segments")
+    return len(segments)
+
+
+def transcode(source, output_path, audio_format, start=None, end=None, duration=None,
+              on_progress=None, should_cancel=None):
+    """
+    Extract the audio of ``source`` (a path or URL) into ``output_path``.
+
+    Long inputs in a segmentable format are encoded in parallel across
+    ``EXTRACTION_TRANSCODE_WORKERS`` cores; everything else uses one ffmpeg.
+    ``duration`` is probed when not given. ``on_progress`` receives the
+    percentage encoded so far and ``should_cancel`` stops the encode, as in
+    :func:`~auddy_backend.extraction.runner.run`. Returns the number of
+    segments encoded, 1 for a single ffmpeg.
+    """
+    if end is not None:
+        duration = end - (start or 0)
+    elif not duration and (audio_format in SEGMENTABLE or on_progress):
+        total = probe_duration(source)
+        duration = total - (start or 0) if total else None
+    if audio_format in SEGMENTABLE and should_segment(audio_format, duration):
+        return transcode_parallel(
+            source, output_path, audio_format, duration, start=start,
+            on_progress=on_progress, should_cancel=should_cancel,
+        )
+    transcode_serial(
+        source, output_path, audio_format, start=start, end=end, duration=duration,
+        on_progress=on_progress, should_cancel=should_cancel,
+    )
+    return 1
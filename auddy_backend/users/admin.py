@@ -22,6 +22,7 @@ class UserAdmin(auth_admin.UserAdmin):
     fieldsets = (
         (None, {"fields": ("email", "password")}),
         (_("Personal info"), {"fields": ("name",)}),
+        (_("Subscription"), {"fields": ("plan",)}),
         (
             _("Permissions"),
             {
@@ -36,7 +37,7 @@ class UserAdmin(auth_admin.UserAdmin):
         ),
         (_("Important dates"), {"fields": ("last_login", "date_joined")}),
     )
-    list_display = ["email", "name", "is_superuser"]
+    list_display = ["email", "name", "plan", "is_superuser"]
     search_fields = ["name"]
     ordering = ["id"]
     add_fieldsets = (
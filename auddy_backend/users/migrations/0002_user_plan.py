@@ -0,0 +1,18 @@
+# Generated by Django 5.1.8 on 2026-10-19 07:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='plan',
+            field=models.CharField(choices=[('free', 'Free'), ('pro', 'Pro')], default='free', max_length=20, verbose_name='Plan'),
+        ),
+    ]
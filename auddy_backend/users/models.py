@@ -4,6 +4,7 @@ from typing import ClassVar
 from django.contrib.auth.models import AbstractUser
 from django.db.models import CharField
 from django.db.models import EmailField
+from django.db.models import TextChoices
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 
@@ -17,12 +18,18 @@ class User(AbstractUser):
     check forms.SignupForm and forms.SocialSignupForms accordingly.
     """
 
+    class Plan(TextChoices):
+        FREE = "free", _("Free")
+        PRO = "pro", _("Pro")
+
     # First and last name do not cover name patterns around the globe
     name = CharField(_("Name of User"), blank=True, max_length=255)
     first_name = None  # type: ignore[assignment]
     last_name = None  # type: ignore[assignment]
     email = EmailField(_("email address"), unique=True)
     username = None  # type: ignore[assignment]
+    # Paying plans get their extractions admitted first when the queue is backed up
+    plan = CharField(_("Plan"), max_length=20, choices=Plan.choices, default=Plan.FREE)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
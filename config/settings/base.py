@@ -2,6 +2,7 @@
 """Base settings to build other settings files upon."""
 
 import ssl
+import tempfile
 from pathlib import Path
 
 import environ
@@ -249,9 +250,13 @@ DJANGO_ADMIN_FORCE_ALLAUTH = env.bool("DJANGO_ADMIN_FORCE_ALLAUTH", default=Fals
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
+    "filters": {
+        # Tags records with the ID of the trace they were logged in
+        "trace": {"()": "auddy_backend.extraction.tracing.TraceContextFilter"},
+    },
     "formatters": {
         "verbose": {
-            "format": "%(levelname)s %(asctime)s %(module)s %(process)d %(thread)d %(message)s",
+            "format": "%(levelname)s %(asctime)s %(module)s %(process)d %(thread)d %(trace_id)s %(message)s",
         },
     },
     "handlers": {
@@ -259,6 +264,7 @@ LOGGING = {
             "level": "DEBUG",
             "class": "logging.StreamHandler",
             "formatter": "verbose",
+            "filters": ["trace"],
         },
     },
     "root": {"level": "INFO", "handlers": ["console"]},
@@ -299,8 +305,30 @@ CELERY_TASK_TIME_LIMIT = 5 * 60
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#task-soft-time-limit
 # TODO: set to whatever value is adequate in your circumstances
 CELERY_TASK_SOFT_TIME_LIMIT = 60
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#task-default-queue
+# Extractions of long media are routed to EXTRACTION_HEAVY_QUEUE instead.
+CELERY_TASK_DEFAULT_QUEUE = "celery"
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#worker-prefetch-multiplier
+# Heavy-queue workers set this to 1 so a long job never sits reserved behind another.
+CELERY_WORKER_PREFETCH_MULTIPLIER = env.int("CELERY_WORKER_PREFETCH_MULTIPLIER", default=4)
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#beat-scheduler
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#beat-schedule
+# The DatabaseScheduler syncs these entries into django_celery_beat on startup.
+CELERY_BEAT_SCHEDULE = {
+    "extraction-storage-lifecycle": {
+        "task": "auddy_backend.extraction.tasks.enforce_storage_lifecycle",
+        "schedule": env.int("EXTRACTION_LIFECYCLE_INTERVAL", default=15 * 60),
+    },
+    "extraction-stale-reaper": {
+        "task": "auddy_backend.extraction.tasks.reap_stale_extractions_task",
+        "schedule": env.int("EXTRACTION_REAPER_INTERVAL", default=5 * 60),
+    },
+    "extraction-scheduler-release": {
+        "task": "auddy_backend.extraction.tasks.release_scheduled_extractions",
+        "schedule": env.int("EXTRACTION_SCHEDULER_INTERVAL", default=15),
+    },
+}
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#worker-send-task-events
 CELERY_WORKER_SEND_TASK_EVENTS = True
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#std-setting-task_send_sent_event
@@ -368,3 +396,243 @@ SPECTACULAR_SETTINGS = {
 }
 # Your stuff...
 # ------------------------------------------------------------------------------
+
+# Extraction storage lifecycle
+# ------------------------------------------------------------------------------
+# Total bytes extraction files may occupy before LRU eviction kicks in
+EXTRACTION_STORAGE_BUDGET_BYTES = env.int("EXTRACTION_STORAGE_BUDGET_BYTES", default=20 * 1024**3)
+# Fraction of the budget eviction frees down to, so every run doesn't evict again
+EXTRACTION_STORAGE_LOW_WATERMARK = env.float("EXTRACTION_STORAGE_LOW_WATERMARK", default=0.9)
+# Seconds a file is kept after its last download (or completion)
+EXTRACTION_FILE_TTL = env.int("EXTRACTION_FILE_TTL", default=7 * 24 * 60 * 60)
+# Rows expired per transaction
+EXTRACTION_EVICTION_BATCH_SIZE = env.int("EXTRACTION_EVICTION_BATCH_SIZE", default=500)
+
+# Extraction reaper
+# ------------------------------------------------------------------------------
+# Root for per-task working directories, swept for leftovers by the reaper
+EXTRACTION_SCRATCH_DIR = env("EXTRACTION_SCRATCH_DIR", default=str(Path(tempfile.gettempdir()) / "auddy-scratch"))
+# Minimum seconds between heartbeat writes from a running extraction
+EXTRACTION_HEARTBEAT_INTERVAL = env.int("EXTRACTION_HEARTBEAT_INTERVAL", default=30)
+# Seconds without a heartbeat after which a PROCESSING extraction is considered dead, when no worker answers
+EXTRACTION_HEARTBEAT_TIMEOUT = env.int("EXTRACTION_HEARTBEAT_TIMEOUT", default=15 * 60)
+# Seconds a PROCESSING extraction may go unseen by every worker, or a dispatched PENDING one unseen
+# anywhere it could be queued, before it is reaped
+EXTRACTION_REAPER_GRACE = env.int("EXTRACTION_REAPER_GRACE", default=2 * 60)
+# Attempts after which a reaped extraction is failed instead of requeued
+EXTRACTION_REAPER_MAX_ATTEMPTS = env.int("EXTRACTION_REAPER_MAX_ATTEMPTS", default=3)
+# Minimum age in seconds before unreferenced scratch or output files are deleted
+EXTRACTION_ORPHAN_GRACE = env.int("EXTRACTION_ORPHAN_GRACE", default=60 * 60)
+
+# Extraction retries
+# ------------------------------------------------------------------------------
+# Base and cap in seconds for the jittered exponential backoff between retries
+EXTRACTION_RETRY_BACKOFF_BASE = env.int("EXTRACTION_RETRY_BACKOFF_BASE", default=10)
+EXTRACTION_RETRY_BACKOFF_MAX = env.int("EXTRACTION_RETRY_BACKOFF_MAX", default=10 * 60)
+# Longest wait in seconds granted to a source's Retry-After; keep it below the Redis broker's
+# visibility timeout (one hour by default), past which a waiting retry is delivered twice
+EXTRACTION_RETRY_AFTER_MAX = env.int("EXTRACTION_RETRY_AFTER_MAX", default=30 * 60)
+
+# Extraction checkpoints
+# ------------------------------------------------------------------------------
+# Seconds a stage checkpoint stays valid for resuming a retried extraction
+EXTRACTION_CHECKPOINT_TTL = env.int("EXTRACTION_CHECKPOINT_TTL", default=6 * 60 * 60)
+# Total bytes of scratch space; the reaper evicts the oldest idle checkpoints beyond it
+EXTRACTION_SCRATCH_BUDGET_BYTES = env.int("EXTRACTION_SCRATCH_BUDGET_BYTES", default=10 * 1024**3)
+
+# Extraction batches
+# ------------------------------------------------------------------------------
+# Maximum number of items accepted by POST /api/extract/batch/
+EXTRACTION_BATCH_MAX_ITEMS = env.int("EXTRACTION_BATCH_MAX_ITEMS", default=500)
+# Maximum number of playlist or channel entries queued from one submission
+EXTRACTION_PLAYLIST_MAX_ENTRIES = env.int("EXTRACTION_PLAYLIST_MAX_ENTRIES", default=500)
+# Entries of one playlist processed at the same time
+EXTRACTION_PLAYLIST_CONCURRENCY = env.int("EXTRACTION_PLAYLIST_CONCURRENCY", default=4)
+
+# Extraction time budgets
+# ------------------------------------------------------------------------------
+# Soft time limit of an extraction: base seconds plus this many seconds per second
+# of media, never below CELERY_TASK_SOFT_TIME_LIMIT
+EXTRACTION_TIME_BUDGET_BASE = env.int("EXTRACTION_TIME_BUDGET_BASE", default=30)
+EXTRACTION_TIME_BUDGET_PER_MEDIA_SECOND = env.float("EXTRACTION_TIME_BUDGET_PER_MEDIA_SECOND", default=0.25)
+# Upper bound in seconds for the soft time limit of a single extraction
+EXTRACTION_TIME_BUDGET_MAX = env.int("EXTRACTION_TIME_BUDGET_MAX", default=3 * 60 * 60)
+# Seconds between the soft and the hard time limit, for cleanup after SoftTimeLimitExceeded
+EXTRACTION_TIME_BUDGET_HARD_GRACE = env.int("EXTRACTION_TIME_BUDGET_HARD_GRACE", default=2 * 60)
+# Queue for long extractions, consumed by dedicated workers
+EXTRACTION_HEAVY_QUEUE = env("EXTRACTION_HEAVY_QUEUE", default="heavy")
+# Media at least this many seconds long is routed to the heavy queue
+EXTRACTION_HEAVY_DURATION_THRESHOLD = env.int("EXTRACTION_HEAVY_DURATION_THRESHOLD", default=20 * 60)
+
+# Extraction scheduler
+# ------------------------------------------------------------------------------
+# Hold extractions in per-user queues in Redis and release them in fair-share order
+EXTRACTION_SCHEDULER_ENABLED = env.bool("EXTRACTION_SCHEDULER_ENABLED", default=True)
+# Messages allowed to wait in the broker's extraction queues before work is held back
+EXTRACTION_SCHEDULER_BROKER_DEPTH = env.int("EXTRACTION_SCHEDULER_BROKER_DEPTH", default=8)
+# Expected cost in seconds of media for jobs of unknown duration, and the floor for known ones
+EXTRACTION_SCHEDULER_DEFAULT_COST = env.int("EXTRACTION_SCHEDULER_DEFAULT_COST", default=10 * 60)
+EXTRACTION_SCHEDULER_MIN_COST = env.int("EXTRACTION_SCHEDULER_MIN_COST", default=30)
+# Seconds of waiting each second of expected cost is worth when ordering one user's jobs
+EXTRACTION_SCHEDULER_AGING_FACTOR = env.float("EXTRACTION_SCHEDULER_AGING_FACTOR", default=0.1)
+# Queue wait samples kept per user for the p95, and seconds they live after the last release
+EXTRACTION_SCHEDULER_WAIT_SAMPLES = env.int("EXTRACTION_SCHEDULER_WAIT_SAMPLES", default=200)
+EXTRACTION_SCHEDULER_WAIT_TTL = env.int("EXTRACTION_SCHEDULER_WAIT_TTL", default=24 * 60 * 60)
+
+# Extraction admission control
+# ------------------------------------------------------------------------------
+# Refuse new extractions with 429/503 and Retry-After when the backlog is too large
+EXTRACTION_ADMISSION_ENABLED = env.bool("EXTRACTION_ADMISSION_ENABLED", default=True)
+# Longest backlog drain time in seconds each lane may join; paid plans are turned away last
+EXTRACTION_ADMISSION_LANES = {
+    "anonymous": env.int("EXTRACTION_ADMISSION_ANONYMOUS_MAX_DRAIN", default=5 * 60),
+    "free": env.int("EXTRACTION_ADMISSION_FREE_MAX_DRAIN", default=15 * 60),
+    "pro": env.int("EXTRACTION_ADMISSION_PRO_MAX_DRAIN", default=60 * 60),
+}
+# Queued or running extractions beyond which nobody is admitted
+EXTRACTION_ADMISSION_MAX_DEPTH = env.int("EXTRACTION_ADMISSION_MAX_DEPTH", default=5000)
+# Queued or running extractions a single user may have
+EXTRACTION_ADMISSION_MAX_PER_USER = env.int("EXTRACTION_ADMISSION_MAX_PER_USER", default=500)
+# Seconds of completions used to measure throughput, and its floor in extractions per minute
+EXTRACTION_ADMISSION_THROUGHPUT_WINDOW = env.int("EXTRACTION_ADMISSION_THROUGHPUT_WINDOW", default=10 * 60)
+EXTRACTION_ADMISSION_MIN_THROUGHPUT = env.float("EXTRACTION_ADMISSION_MIN_THROUGHPUT", default=6.0)
+# Seconds a backlog measurement is reused across requests
+EXTRACTION_ADMISSION_SNAPSHOT_TTL = env.int("EXTRACTION_ADMISSION_SNAPSHOT_TTL", default=5)
+
+# Extraction pre-flight
+# ------------------------------------------------------------------------------
+# Longest source (or clip) in seconds and largest source in bytes that will be extracted
+EXTRACTION_MAX_SOURCE_DURATION = env.int("EXTRACTION_MAX_SOURCE_DURATION", default=4 * 60 * 60)
+EXTRACTION_MAX_SOURCE_BYTES = env.int("EXTRACTION_MAX_SOURCE_BYTES", default=4 * 1024**3)
+# Check sources inside POST /api/extract/ so bad ones are rejected with 400 right away
+EXTRACTION_PREFLIGHT_ON_CREATE = env.bool("EXTRACTION_PREFLIGHT_ON_CREATE", default=True)
+# Let sources resolve to loopback, private or link-local addresses; only for local benchmarks and development
+EXTRACTION_PREFLIGHT_ALLOW_PRIVATE_HOSTS = env.bool("EXTRACTION_PREFLIGHT_ALLOW_PRIVATE_HOSTS", default=False)
+# Seconds to wait for a direct or Google Drive source to answer the pre-flight probe
+EXTRACTION_PREFLIGHT_TIMEOUT = env.int("EXTRACTION_PREFLIGHT_TIMEOUT", default=5)
+# Seconds a yt-dlp lookup is cached, so the worker reuses the one made at creation
+EXTRACTION_PREFLIGHT_CACHE_TTL = env.int("EXTRACTION_PREFLIGHT_CACHE_TTL", default=10 * 60)
+
+# Extraction transcoding
+# ------------------------------------------------------------------------------
+# ffmpeg processes one long MP3/AAC encode is split across; 0 uses every core
+EXTRACTION_TRANSCODE_WORKERS = env.int("EXTRACTION_TRANSCODE_WORKERS", default=0)
+# Media shorter than this many seconds is encoded in a single pass
+EXTRACTION_PARALLEL_TRANSCODE_MIN_DURATION = env.int("EXTRACTION_PARALLEL_TRANSCODE_MIN_DURATION", default=10 * 60)
+
+# Extraction subprocesses
+# ------------------------------------------------------------------------------
+# Threads one ffmpeg may use; 0 lets ffmpeg decide
+EXTRACTION_FFMPEG_THREADS = env.int("EXTRACTION_FFMPEG_THREADS", default=2)
+# Niceness of ffmpeg, ffprobe and curl processes, so the worker itself stays responsive
+EXTRACTION_PROCESS_NICE = env.int("EXTRACTION_PROCESS_NICE", default=10)
+# Address space in bytes and CPU seconds each subprocess may use; 0 disables the limit
+EXTRACTION_PROCESS_MAX_MEMORY = env.int("EXTRACTION_PROCESS_MAX_MEMORY", default=4 * 1024**3)
+EXTRACTION_PROCESS_MAX_CPU_SECONDS = env.int("EXTRACTION_PROCESS_MAX_CPU_SECONDS", default=4 * 60 * 60)
+# Lines of stderr kept from each subprocess for error reports
+EXTRACTION_PROCESS_STDERR_LINES = env.int("EXTRACTION_PROCESS_STDERR_LINES", default=200)
+# Seconds the last reported transcode percentage of an extraction is kept
+EXTRACTION_PROGRESS_TTL = env.int("EXTRACTION_PROGRESS_TTL", default=60 * 60)
+
+# Extraction cancellation
+# ------------------------------------------------------------------------------
+# Seconds the cancel flag of an extraction is kept for its worker to notice
+EXTRACTION_CANCEL_FLAG_TTL = env.int("EXTRACTION_CANCEL_FLAG_TTL", default=24 * 60 * 60)
+# Seconds between re-reads of a running extraction's row, which stops it even if its cancel flag was lost
+EXTRACTION_CANCEL_DB_CHECK_INTERVAL = env.float("EXTRACTION_CANCEL_DB_CHECK_INTERVAL", default=5.0)
+
+# Extraction download engine
+# ------------------------------------------------------------------------------
+# Leave whole-file HTTP and Google Drive downloads to the download engine
+# (manage.py run_download_engine), which must share EXTRACTION_SCRATCH_DIR with the workers
+EXTRACTION_ASYNC_DOWNLOADS = env.bool("EXTRACTION_ASYNC_DOWNLOADS", default=False)
+# Transfers one download engine process runs at once
+EXTRACTION_DOWNLOAD_ENGINE_CONCURRENCY = env.int("EXTRACTION_DOWNLOAD_ENGINE_CONCURRENCY", default=200)
+# Bytes buffered per transfer between the socket and the scratch file
+EXTRACTION_DOWNLOAD_ENGINE_CHUNK_SIZE = env.int("EXTRACTION_DOWNLOAD_ENGINE_CHUNK_SIZE", default=256 * 1024)
+# Seconds to connect, and to wait for the next bytes, before a transfer fails
+EXTRACTION_DOWNLOAD_ENGINE_CONNECT_TIMEOUT = env.int("EXTRACTION_DOWNLOAD_ENGINE_CONNECT_TIMEOUT", default=30)
+EXTRACTION_DOWNLOAD_ENGINE_READ_TIMEOUT = env.int("EXTRACTION_DOWNLOAD_ENGINE_READ_TIMEOUT", default=120)
+
+# Extraction origin limits
+# ------------------------------------------------------------------------------
+# Share per-origin connection, request rate and bandwidth limits across all workers through Redis
+EXTRACTION_ORIGIN_LIMITS_ENABLED = env.bool("EXTRACTION_ORIGIN_LIMITS_ENABLED", default=True)
+# Per origin (matched by domain suffix): concurrent connections, requests per second and burst,
+# and optionally total bytes per second; other hosts each get the 'default' limits
+EXTRACTION_ORIGIN_LIMITS = {
+    "youtube.com": {"concurrency": 40, "rate": 5, "burst": 20},
+    "googlevideo.com": {"concurrency": 40, "rate": 10, "burst": 40},
+    "drive.google.com": {"concurrency": 20, "rate": 2, "burst": 10},
+    "default": {"concurrency": 8, "rate": 4, "burst": 8},
+}
+# Seconds a connection slot is held without renewal before another worker may take it
+EXTRACTION_ORIGIN_LEASE_TTL = env.int("EXTRACTION_ORIGIN_LEASE_TTL", default=10 * 60)
+# Seconds a worker waits for a slot before retrying the extraction later
+EXTRACTION_ORIGIN_WAIT_TIMEOUT = env.int("EXTRACTION_ORIGIN_WAIT_TIMEOUT", default=60)
+
+# Extraction circuit breakers
+# ------------------------------------------------------------------------------
+# Stop sending extractions to a platform (YouTube, Google Drive, or one direct-link host) that keeps failing
+EXTRACTION_BREAKER_ENABLED = env.bool("EXTRACTION_BREAKER_ENABLED", default=True)
+# Seconds of outcomes the failure rate is computed over
+EXTRACTION_BREAKER_WINDOW = env.int("EXTRACTION_BREAKER_WINDOW", default=5 * 60)
+# Outcomes needed in the window, and the share of them failing, before the breaker opens
+EXTRACTION_BREAKER_MIN_REQUESTS = env.int("EXTRACTION_BREAKER_MIN_REQUESTS", default=20)
+EXTRACTION_BREAKER_FAILURE_RATE = env.float("EXTRACTION_BREAKER_FAILURE_RATE", default=0.5)
+# Seconds an open breaker turns jobs away before letting a single probe through
+EXTRACTION_BREAKER_COOLDOWN = env.int("EXTRACTION_BREAKER_COOLDOWN", default=2 * 60)
+# Seconds a probe may run before another job is allowed to probe instead
+EXTRACTION_BREAKER_PROBE_TIMEOUT = env.int("EXTRACTION_BREAKER_PROBE_TIMEOUT", default=15 * 60)
+# What happens to jobs turned away: 'park' re-queues them until the breaker closes, 'fail' fails them
+EXTRACTION_BREAKER_ON_OPEN = env("EXTRACTION_BREAKER_ON_OPEN", default="park")
+
+# Extraction negative cache
+# ------------------------------------------------------------------------------
+# Seconds a source that failed for good (private, removed, region-locked, DRM-protected)
+# is refused at submission without queuing a task; 0 disables the cache
+EXTRACTION_NEGATIVE_CACHE_TTL = env.int("EXTRACTION_NEGATIVE_CACHE_TTL", default=6 * 60 * 60)
+
+# Extraction metrics
+# ------------------------------------------------------------------------------
+# Port each Celery worker serves Prometheus metrics for all its pool processes on; 0 disables it.
+# Set PROMETHEUS_MULTIPROC_DIR for processes that fork (gunicorn, Celery prefork)
+EXTRACTION_METRICS_PORT = env.int("EXTRACTION_METRICS_PORT", default=0)
+# Bearer token required to scrape /metrics on the web processes; empty leaves it open
+EXTRACTION_METRICS_TOKEN = env("EXTRACTION_METRICS_TOKEN", default="")
+
+# Extraction ETA
+# ------------------------------------------------------------------------------
+# Learn how fast each platform and format runs from finished extractions, in Redis;
+# when off, estimates use the priors below
+EXTRACTION_ETA_LEARNING = env.bool("EXTRACTION_ETA_LEARNING", default=True)
+# Weight of each new run in the moving averages once the first few have been seen
+EXTRACTION_ETA_SMOOTHING = env.float("EXTRACTION_ETA_SMOOTHING", default=0.1)
+# Seconds of fixed overhead, and seconds per second of media, assumed before any run is recorded
+EXTRACTION_ETA_PRIOR_OVERHEAD = env.float("EXTRACTION_ETA_PRIOR_OVERHEAD", default=10)
+EXTRACTION_ETA_PRIOR_RATE = env.float("EXTRACTION_ETA_PRIOR_RATE", default=0.1)
+# Seconds a model is kept after its last update
+EXTRACTION_ETA_MODEL_TTL = env.int("EXTRACTION_ETA_MODEL_TTL", default=30 * 24 * 60 * 60)
+
+# Extraction tracing
+# ------------------------------------------------------------------------------
+# Dotted path of the class spans are exported with, such as
+# auddy_backend.extraction.tracing.ConsoleExporter or FileExporter; empty turns export off.
+# The trace context is propagated either way, from the API through Celery to ffmpeg
+EXTRACTION_TRACE_EXPORTER = env("EXTRACTION_TRACE_EXPORTER", default="")
+# File the FileExporter appends spans to, one JSON object per line
+EXTRACTION_TRACE_FILE = env(
+    "EXTRACTION_TRACE_FILE",
+    default=str(Path(tempfile.gettempdir()) / "extraction-traces.jsonl"),
+)
+# Share of new traces that are exported; incoming traces keep the caller's decision
+EXTRACTION_TRACE_SAMPLE_RATE = env.float("EXTRACTION_TRACE_SAMPLE_RATE", default=1.0)
+
+# Extraction profiling
+# ------------------------------------------------------------------------------
+# Share of extraction runs profiled with the sampling profiler, from 0 to 1; staff can
+# also ask for one extraction to be profiled with "debug_profile" on the create request
+EXTRACTION_PROFILING_SAMPLE_RATE = env.float("EXTRACTION_PROFILING_SAMPLE_RATE", default=0.0)
+# Seconds between stack samples, and the deepest stack recorded
+EXTRACTION_PROFILING_INTERVAL = env.float("EXTRACTION_PROFILING_INTERVAL", default=0.01)
+EXTRACTION_PROFILING_MAX_DEPTH = env.int("EXTRACTION_PROFILING_MAX_DEPTH", default=64)
@@ -81,3 +81,5 @@ INSTALLED_APPS += ["django_extensions"]
 CELERY_TASK_EAGER_PROPAGATES = True
 # Your stuff...
 # ------------------------------------------------------------------------------
+# Log spans of extraction traces to the console
+EXTRACTION_TRACE_EXPORTER = env("EXTRACTION_TRACE_EXPORTER", default="auddy_backend.extraction.tracing.ConsoleExporter")
@@ -145,9 +145,13 @@ ANYMAIL = {
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": True,
+    "filters": {
+        # Tags records with the ID of the trace they were logged in
+        "trace": {"()": "auddy_backend.extraction.tracing.TraceContextFilter"},
+    },
     "formatters": {
         "verbose": {
-            "format": "%(levelname)s %(asctime)s %(module)s %(process)d %(thread)d %(message)s",
+            "format": "%(levelname)s %(asctime)s %(module)s %(process)d %(thread)d %(trace_id)s %(message)s",
         },
     },
     "handlers": {
@@ -155,6 +159,7 @@ LOGGING = {
             "level": "DEBUG",
             "class": "logging.StreamHandler",
             "formatter": "verbose",
+            "filters": ["trace"],
         },
     },
     "root": {"level": "INFO", "handlers": ["console"]},
@@ -36,3 +36,13 @@ TEMPLATES[0]["OPTIONS"]["debug"] = True  # type: ignore[index]
 MEDIA_URL = "http://media.testserver/"
 # Your stuff...
 # ------------------------------------------------------------------------------
+# Dispatch extractions straight to Celery; the scheduler needs a Redis server
+EXTRACTION_SCHEDULER_ENABLED = False
+# Don't probe sources over the network when creating extractions
+EXTRACTION_PREFLIGHT_ON_CREATE = False
+# Origin limits need a Redis server
+EXTRACTION_ORIGIN_LIMITS_ENABLED = False
+# Circuit breakers need a Redis server
+EXTRACTION_BREAKER_ENABLED = False
+# Learnt ETA models need a Redis server
+EXTRACTION_ETA_LEARNING = False
@@ -11,6 +11,7 @@ from drf_spectacular.views import SpectacularSwaggerView
 from rest_framework.authtoken.views import obtain_auth_token
 
 from auddy_backend.extraction.api.views import ExtractionStatusView, ExtractionDownloadView
+from auddy_backend.extraction.metrics import metrics_view
 
 urlpatterns = [
     path("", TemplateView.as_view(template_name="pages/home.html"), name="home"),
@@ -25,7 +26,8 @@ urlpatterns = [
     path("users/", include("auddy_backend.users.urls", namespace="users")),
     path("accounts/", include("allauth.urls")),
     # Your stuff: custom urls includes go here
-    # ...
+    # Prometheus scrape endpoint
+    path("metrics", metrics_view, name="metrics"),
     # Media files
     *static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT),
 ]